@@ -1,11 +1,8 @@
 import os
 
 import geopandas as gpd
-import rasterio as rio
-from rasterio import DatasetReader
 
-# Read file using gpd.read_file()
-from tqdm import tqdm
+from utils import sampling
 
 
 def get_data_path() -> str:
@@ -14,18 +11,13 @@ def get_data_path() -> str:
 
 def extract_elevation_from_raster(path_to_points: str, path_raster: str) -> gpd.GeoDataFrame:
     points_to_intersect = gpd.read_file(path_to_points)
-    with rio.open(path_raster) as raster_to_intersect:
-        raster_to_intersect: DatasetReader
-        points_to_intersect["z_raster"] = 0.0
-        temp_raster = raster_to_intersect.read(1)
-
-        for ID, row in tqdm(points_to_intersect.iterrows()):
-            longitude = row["geometry"].x
-            latitude = row["geometry"].y
-            row_index, col_index = raster_to_intersect.index(longitude, latitude)
-            points_to_intersect.loc[ID, "z_raster"] = temp_raster[row_index, col_index]
-
-    return points_to_intersect
+    return sampling.extract_elevation_from_raster(points_to_intersect, path_raster)
+
+
+def extract_elevations_of_all_dsms(path_to_points: str, paths_to_dsms_per_column: dict[str, str]) -> gpd.GeoDataFrame:
+    # e.g. {"z_BF20_no": ..., "z_AF20_no": ..., "z_AF21": ...} as used in plots_for_comparison_gcp_and_dsms
+    points_to_intersect = gpd.read_file(path_to_points)
+    return sampling.extract_elevations_from_rasters(points_to_intersect, paths_to_dsms_per_column)
 
 
 def save_file_as_shp(path_to_points, path_to_raster, path_to_results):
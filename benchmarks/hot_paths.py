@@ -0,0 +1,195 @@
+import gc
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Callable, Iterable, Optional
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import LineString
+
+from benchmarks.synthetic_scene import (
+    SyntheticScene,
+    calculate_elevation_of_water_surface,
+    create_meandering_center_line_coordinates,
+    create_points_along_profile,
+    create_shoreline_points_with_elevation,
+    create_synthetic_scene,
+)
+from script_for_profile_creation import fit_a_line_to_the_points, merge_all_points_to_lines_that_are_close_enough
+from utils.sampling import extract_elevation_from_raster
+from water_surface_preparation.center_lines import CenterLineIndex
+from water_surface_preparation.filter import filter_outliers_from_elevation_points
+from water_surface_preparation.sampling import sample_points_along_line
+from water_surface_preparation.transects import calculate_transects, trim_intersecting_parts_of_transects
+
+# the densities of the pipeline: shoreline and center lines sampled every 2 m, transects of 45 m on both sides,
+# outliers filtered within 30 m
+SAMPLING_DISTANCE = 2.0
+LINE_LENGTH = 45
+BUFFER_DISTANCE = 45
+FILTER_BUFFER_DISTANCE = 30
+MAXIMAL_DEVIATION = 0.25
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    # creates the inputs for the given number of points in the given directory and returns the measured call
+    prepare: Callable[[str, int], Callable[[], Any]]
+
+
+@dataclass(frozen=True)
+class BenchmarkMeasurement:
+    benchmark: str
+    number_of_points: int
+    seconds: float
+    number_of_repetitions: int
+    peak_memory_in_megabytes: float
+
+
+def create_scene_for_number_of_points(directory: str, number_of_points: int) -> SyntheticScene:
+    # the river gets longer with the number of points, so the points are as dense as in the pipeline.
+    # both banks are sampled, so a river of length n gives about n shoreline points.
+    return create_synthetic_scene(
+        directory,
+        river_length=max(2_000.0, number_of_points * SAMPLING_DISTANCE / 2),
+        pixel_size=None,
+        number_of_gps_points=number_of_points,
+    )
+
+
+def create_center_line_points(number_of_points: int) -> gpd.GeoDataFrame:
+    # points along one center line with the elevation of the water surface, as they come out of the smoothing
+    coordinates = create_meandering_center_line_coordinates(number_of_points * SAMPLING_DISTANCE)
+    center_line = gpd.GeoDataFrame(geometry=[LineString(coordinates)], crs=2056)
+    points = sample_points_along_line(center_line, SAMPLING_DISTANCE).iloc[:number_of_points].copy()
+    points["z_interpolated"] = calculate_elevation_of_water_surface(points.geometry.x.values)
+    return points
+
+
+def prepare_sampling_along_line(directory: str, number_of_points: int) -> Callable[[], Any]:
+    scene = create_scene_for_number_of_points(directory, number_of_points)
+    return lambda: sample_points_along_line(scene.shoreline, SAMPLING_DISTANCE)
+
+
+def prepare_elevation_extraction(directory: str, number_of_points: int) -> Callable[[], Any]:
+    # one raster for all sizes, more points are sampled more densely along its shoreline
+    scene = create_synthetic_scene(directory)
+    total_length_of_shoreline = scene.shoreline.length.sum()
+    points = sample_points_along_line(scene.shoreline, total_length_of_shoreline / number_of_points)
+    return lambda: extract_elevation_from_raster(points, path_to_raster=scene.path_to_raster)
+
+
+def prepare_outlier_filtering(directory: str, number_of_points: int) -> Callable[[], Any]:
+    points = create_shoreline_points_with_elevation(
+        create_scene_for_number_of_points(directory, number_of_points), SAMPLING_DISTANCE
+    )
+    return lambda: filter_outliers_from_elevation_points(points, FILTER_BUFFER_DISTANCE, MAXIMAL_DEVIATION)
+
+
+def prepare_assignment_to_center_lines(directory: str, number_of_points: int) -> Callable[[], Any]:
+    scene = create_scene_for_number_of_points(directory, number_of_points)
+    points = create_shoreline_points_with_elevation(scene, SAMPLING_DISTANCE)
+    # building the index is part of the assignment, the pipeline builds it once per scenario
+    return lambda: CenterLineIndex(scene.center_lines, BUFFER_DISTANCE).assign_points(points)
+
+
+def prepare_transect_calculation(directory: str, number_of_points: int) -> Callable[[], Any]:
+    points = create_center_line_points(number_of_points)
+    return lambda: calculate_transects(points, LINE_LENGTH)
+
+
+def prepare_trimming_of_transects(directory: str, number_of_points: int) -> Callable[[], Any]:
+    # every repetition trims its own copy of the untrimmed lengths, copying two arrays is negligible against trimming
+    transects = calculate_transects(create_center_line_points(number_of_points), LINE_LENGTH)
+    return lambda: trim_intersecting_parts_of_transects(
+        replace(transects, left_lengths=transects.left_lengths.copy(), right_lengths=transects.right_lengths.copy())
+    )
+
+
+def prepare_merging_of_points_to_lines(directory: str, number_of_points: int) -> Callable[[], Any]:
+    gps_points = create_scene_for_number_of_points(directory, number_of_points).gps_points
+    return lambda: merge_all_points_to_lines_that_are_close_enough(gps_points)
+
+
+def prepare_fitting_of_line(directory: str, number_of_points: int) -> Callable[[], Any]:
+    coordinates = create_points_along_profile(number_of_points)
+    return lambda: fit_a_line_to_the_points(coordinates[:, 0], coordinates[:, 1], segment_length=100)
+
+
+all_benchmarks = [
+    Benchmark("sample_points_along_line", prepare_sampling_along_line),
+    Benchmark("extract_elevation_from_raster", prepare_elevation_extraction),
+    Benchmark("filter_outliers_from_elevation_points", prepare_outlier_filtering),
+    Benchmark("assign_points_to_center_lines", prepare_assignment_to_center_lines),
+    Benchmark("calculate_transects", prepare_transect_calculation),
+    Benchmark("trim_intersecting_parts_of_transects", prepare_trimming_of_transects),
+    Benchmark("merge_all_points_to_lines_that_are_close_enough", prepare_merging_of_points_to_lines),
+    Benchmark("fit_a_line_to_the_points", prepare_fitting_of_line),
+]
+
+
+def measure_call(
+    call: Callable[[], Any], minimal_total_seconds: float = 0.5, maximal_number_of_repetitions: int = 5
+) -> tuple[float, int, float]:
+    # the best time of repeated calls, repeated until minimal_total_seconds are spent. the peak memory is taken from
+    # one more call under tracemalloc, as tracing slows the calls down. numpy reports its buffers to tracemalloc.
+    times = []
+    while len(times) < maximal_number_of_repetitions and (not times or sum(times) < minimal_total_seconds):
+        gc.collect()
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        call()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), len(times), peak_memory / 1024**2
+
+
+def run_benchmarks(
+    directory: str,
+    numbers_of_points: Iterable[int],
+    benchmarks: Iterable[Benchmark] = tuple(all_benchmarks),
+    maximal_seconds_per_call: Optional[float] = 120.0,
+) -> pd.DataFrame:
+    # the sizes of a benchmark are measured in increasing order. once a call takes longer than
+    # maximal_seconds_per_call, the larger sizes of this benchmark are skipped.
+    measurements = []
+    for benchmark in benchmarks:
+        for number_of_points in sorted(numbers_of_points):
+            call = benchmark.prepare(directory, number_of_points)
+            seconds, number_of_repetitions, peak_memory = measure_call(call)
+            del call
+            measurements.append(
+                BenchmarkMeasurement(benchmark.name, number_of_points, seconds, number_of_repetitions, peak_memory)
+            )
+            print(f"{benchmark.name} with {number_of_points} points: {seconds:.4f} s, {peak_memory:.1f} MB")
+            if maximal_seconds_per_call is not None and seconds > maximal_seconds_per_call:
+                print(f"{benchmark.name}: larger sizes are skipped")
+                break
+    return pd.DataFrame([asdict(measurement) for measurement in measurements])
+
+
+def compare_with_baseline(
+    measurements: pd.DataFrame, baseline: pd.DataFrame, tolerated_slowdown: float = 1.2
+) -> pd.DataFrame:
+    # ratios above one are slower or larger than the baseline. sizes without baseline get NaN ratios.
+    comparison = measurements.merge(
+        baseline[["benchmark", "number_of_points", "seconds", "peak_memory_in_megabytes"]],
+        on=["benchmark", "number_of_points"],
+        how="left",
+        suffixes=("", "_of_baseline"),
+    )
+    comparison["ratio_of_seconds"] = comparison["seconds"] / comparison["seconds_of_baseline"]
+    comparison["ratio_of_peak_memory"] = (
+        comparison["peak_memory_in_megabytes"] / comparison["peak_memory_in_megabytes_of_baseline"]
+    )
+    comparison["is_regression"] = (comparison["ratio_of_seconds"] > tolerated_slowdown) | (
+        comparison["ratio_of_peak_memory"] > tolerated_slowdown
+    )
+    return comparison
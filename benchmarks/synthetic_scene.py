@@ -0,0 +1,264 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+import rasterio as rio
+from affine import Affine
+from rasterio.crs import CRS
+from shapely.geometry import LineString, Polygon
+
+from water_surface_preparation.data_classes.enums import ShoreTypes
+from water_surface_preparation.sampling import sample_points_along_line
+
+# the scene lies in the swiss LV95 coordinate system, like the real data
+ORIGIN_OF_SCENE = (2_600_000.0, 1_200_000.0)
+NODATA_VALUE = -9999.0
+
+
+@dataclass(frozen=True)
+class SyntheticScene:
+    center_lines: list[gpd.GeoDataFrame]
+    shoreline: gpd.GeoDataFrame
+    water_mask: gpd.GeoDataFrame
+    gps_points: gpd.GeoDataFrame
+    path_to_raster: Optional[str]
+    river_width: float
+    meander_amplitude: float
+    meander_wavelength: float
+    seed: int
+
+
+def calculate_elevation_of_water_surface(x: np.ndarray) -> np.ndarray:
+    # the water surface falls along the valley, 3 m per kilometre
+    return 580.0 - 0.003 * (np.asarray(x) - ORIGIN_OF_SCENE[0])
+
+
+def calculate_meander_offset(x: np.ndarray, meander_amplitude: float, meander_wavelength: float) -> np.ndarray:
+    # two superposed sine waves, so the meanders are not all alike
+    relative_x = np.asarray(x) - ORIGIN_OF_SCENE[0]
+    return meander_amplitude * (
+        np.sin(2 * np.pi * relative_x / meander_wavelength)
+        + 0.3 * np.sin(2 * np.pi * relative_x / (0.37 * meander_wavelength))
+    )
+
+
+def create_meandering_center_line_coordinates(
+    river_length: float, meander_amplitude: float = 60.0, meander_wavelength: float = 800.0, vertex_spacing: float = 5.0
+) -> np.ndarray:
+    x = ORIGIN_OF_SCENE[0] + np.arange(0.0, river_length + vertex_spacing, vertex_spacing)
+    y = ORIGIN_OF_SCENE[1] + calculate_meander_offset(x, meander_amplitude, meander_wavelength)
+    return np.column_stack([x, y])
+
+
+def offset_coordinates(coordinates: np.ndarray, distance: float) -> np.ndarray:
+    # moves every vertex along the normal of the line, positive distances to the left
+    directions = np.gradient(coordinates, axis=0)
+    directions /= np.hypot(directions[:, 0], directions[:, 1])[:, None]
+    normals = np.column_stack([-directions[:, 1], directions[:, 0]])
+    return coordinates + distance * normals
+
+
+def split_coordinates_into_pieces(coordinates: np.ndarray, number_of_pieces: int) -> list[np.ndarray]:
+    # consecutive pieces share their end vertex
+    boundaries = np.linspace(0, len(coordinates) - 1, number_of_pieces + 1).astype(int)
+    return [coordinates[start : stop + 1] for start, stop in zip(boundaries[:-1], boundaries[1:])]
+
+
+def create_shoreline(
+    center_line_coordinates: np.ndarray, river_width: float, length_of_shore_segments: float, seed: int
+) -> gpd.GeoDataFrame:
+    # both banks cut into segments of random shore type, about two thirds of them are open shore
+    random_generator = np.random.default_rng(seed)
+    geometries, shore_types = [], []
+    for side in (1, -1):
+        bank = offset_coordinates(center_line_coordinates, side * river_width / 2)
+        bank_length = np.hypot(*np.diff(bank, axis=0).T).sum()
+        number_of_segments = max(1, int(round(bank_length / length_of_shore_segments)))
+        for segment in split_coordinates_into_pieces(bank, number_of_segments):
+            geometries.append(LineString(segment))
+            shore_types.append(
+                random_generator.choice(
+                    [shore_type.value for shore_type in ShoreTypes], p=[0.65, 0.25, 0.1]
+                ).item()
+            )
+    return gpd.GeoDataFrame({"shore_type": shore_types}, geometry=geometries, crs=2056)
+
+
+def create_water_mask(center_line_coordinates: np.ndarray, river_width: float) -> gpd.GeoDataFrame:
+    left_bank = offset_coordinates(center_line_coordinates, river_width / 2)
+    right_bank = offset_coordinates(center_line_coordinates, -river_width / 2)
+    return gpd.GeoDataFrame(geometry=[Polygon(np.concatenate([left_bank, right_bank[::-1]]))], crs=2056)
+
+
+def calculate_terrain_elevations(
+    x: np.ndarray, y: np.ndarray, river_width: float, meander_amplitude: float, meander_wavelength: float
+) -> np.ndarray:
+    # a parabolic river bed below the water surface and banks rising with 10 % beside it. the distance to the center
+    # line is approximated by the vertical offset to the meandering line, which is good enough for a synthetic scene
+    distance_to_center_line = np.abs(
+        y - ORIGIN_OF_SCENE[1] - calculate_meander_offset(x, meander_amplitude, meander_wavelength)
+    )
+    relative_distance = distance_to_center_line / (river_width / 2)
+    depth_below_water_surface = 1.5 * (1 - np.minimum(relative_distance, 1) ** 2)
+    height_of_bank = 0.1 * np.maximum(distance_to_center_line - river_width / 2, 0)
+    return calculate_elevation_of_water_surface(x) - depth_below_water_surface + height_of_bank
+
+
+def write_digital_surface_model(
+    path_to_raster: str,
+    bounds: tuple[float, float, float, float],
+    pixel_size: float,
+    river_width: float,
+    meander_amplitude: float,
+    meander_wavelength: float,
+    seed: int,
+    rows_per_block: int = 256,
+) -> None:
+    # terrain plus gaussian noise, about 0.5 % outliers of several metres and a few holes of nodata.
+    # written in blocks of rows, so large rasters do not have to fit into memory.
+    random_generator = np.random.default_rng(seed)
+    minimal_x, minimal_y, maximal_x, maximal_y = bounds
+    width = int(np.ceil((maximal_x - minimal_x) / pixel_size))
+    height = int(np.ceil((maximal_y - minimal_y) / pixel_size))
+    transform = Affine(pixel_size, 0.0, minimal_x, 0.0, -pixel_size, maximal_y)
+    centers_of_holes = random_generator.uniform((minimal_x, minimal_y), (maximal_x, maximal_y), size=(5, 2))
+    with rio.open(
+        path_to_raster,
+        "w",
+        driver="GTiff",
+        width=width,
+        height=height,
+        count=1,
+        dtype="float32",
+        crs=CRS.from_epsg(2056),
+        transform=transform,
+        nodata=NODATA_VALUE,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        compress="deflate",
+    ) as raster:
+        x_of_columns = minimal_x + (np.arange(width) + 0.5) * pixel_size
+        for first_row in range(0, height, rows_per_block):
+            number_of_rows = min(rows_per_block, height - first_row)
+            y_of_rows = maximal_y - (first_row + np.arange(number_of_rows) + 0.5) * pixel_size
+            x, y = np.meshgrid(x_of_columns, y_of_rows)
+            elevations = calculate_terrain_elevations(x, y, river_width, meander_amplitude, meander_wavelength)
+            elevations += random_generator.normal(0, 0.05, elevations.shape)
+            are_outliers = random_generator.random(elevations.shape) < 0.005
+            elevations[are_outliers] += random_generator.choice([-1, 1], are_outliers.sum()) * random_generator.uniform(
+                1, 5, are_outliers.sum()
+            )
+            for center_x, center_y in centers_of_holes:
+                elevations[np.hypot(x - center_x, y - center_y) < 8 * pixel_size] = NODATA_VALUE
+            raster.write(elevations.astype(np.float32), 1, window=((first_row, first_row + number_of_rows), (0, width)))
+
+
+def create_gps_transects(
+    center_line_coordinates: np.ndarray,
+    river_width: float,
+    number_of_points: int,
+    point_spacing: float = 1.0,
+    seed: int = 0,
+) -> gpd.GeoDataFrame:
+    # surveyed cross sections perpendicular to the river, evenly spread along it. the points of one cross section are
+    # closer than 4 m to each other, the cross sections are further apart, as in the real surveys.
+    random_generator = np.random.default_rng(seed)
+    number_of_points_per_transect = max(2, int(river_width / point_spacing))
+    number_of_transects = max(1, int(np.ceil(number_of_points / number_of_points_per_transect)))
+    vertex_indices = np.linspace(0, len(center_line_coordinates) - 1, number_of_transects + 2).astype(int)[1:-1]
+    offsets_across = np.linspace(-river_width / 2, river_width / 2, number_of_points_per_transect)
+    directions = np.gradient(center_line_coordinates, axis=0)[vertex_indices]
+    directions /= np.hypot(directions[:, 0], directions[:, 1])[:, None]
+    normals = np.column_stack([-directions[:, 1], directions[:, 0]])
+    coordinates = center_line_coordinates[vertex_indices, None, :] + offsets_across[None, :, None] * normals[:, None, :]
+    coordinates = coordinates.reshape(-1, 2)[:number_of_points]
+    coordinates += random_generator.normal(0, 0.1, coordinates.shape)
+    water_surface_elevations = calculate_elevation_of_water_surface(coordinates[:, 0])
+    relative_distances = np.abs(np.tile(offsets_across, number_of_transects)[:number_of_points]) / (river_width / 2)
+    bed_elevations = water_surface_elevations - 1.5 * (1 - relative_distances**2)
+    return gpd.GeoDataFrame(
+        {
+            "H": bed_elevations + random_generator.normal(0, 0.03, len(coordinates)),
+            "WSE__m_": water_surface_elevations + random_generator.normal(0, 0.01, len(coordinates)),
+        },
+        geometry=gpd.points_from_xy(coordinates[:, 0], coordinates[:, 1]),
+        crs=2056,
+    )
+
+
+def create_synthetic_scene(
+    directory: str,
+    river_length: float = 5_000.0,
+    river_width: float = 40.0,
+    number_of_center_lines: int = 3,
+    meander_amplitude: float = 60.0,
+    meander_wavelength: float = 800.0,
+    pixel_size: Optional[float] = 0.5,
+    number_of_gps_points: int = 2_000,
+    seed: int = 0,
+) -> SyntheticScene:
+    # the same arguments always give the same scene. the raster is only written if it does not exist yet, a scene
+    # without pixel size has no raster.
+    center_line_coordinates = create_meandering_center_line_coordinates(
+        river_length, meander_amplitude, meander_wavelength
+    )
+    center_lines = [
+        gpd.GeoDataFrame(geometry=[LineString(piece)], crs=2056)
+        for piece in split_coordinates_into_pieces(center_line_coordinates, number_of_center_lines)
+    ]
+    margin = 4 * river_width
+    bounds = (
+        center_line_coordinates[:, 0].min() - margin,
+        center_line_coordinates[:, 1].min() - margin,
+        center_line_coordinates[:, 0].max() + margin,
+        center_line_coordinates[:, 1].max() + margin,
+    )
+    path_to_raster = None
+    if pixel_size is not None:
+        os.makedirs(directory, exist_ok=True)
+        path_to_raster = os.path.join(
+            directory, f"dsm_{int(river_length)}m_{int(river_width)}m_{pixel_size}px_seed{seed}.tif"
+        )
+        if not os.path.exists(path_to_raster):
+            write_digital_surface_model(
+                path_to_raster, bounds, pixel_size, river_width, meander_amplitude, meander_wavelength, seed
+            )
+    return SyntheticScene(
+        center_lines=center_lines,
+        shoreline=create_shoreline(center_line_coordinates, river_width, length_of_shore_segments=150.0, seed=seed),
+        water_mask=create_water_mask(center_line_coordinates, river_width),
+        gps_points=create_gps_transects(center_line_coordinates, river_width, number_of_gps_points, seed=seed),
+        path_to_raster=path_to_raster,
+        river_width=river_width,
+        meander_amplitude=meander_amplitude,
+        meander_wavelength=meander_wavelength,
+        seed=seed,
+    )
+
+
+def create_shoreline_points_with_elevation(scene: SyntheticScene, sampling_distance: float) -> gpd.GeoDataFrame:
+    # points along the shoreline with the elevations the raster of the scene would give them, without reading it
+    random_generator = np.random.default_rng(scene.seed)
+    points = sample_points_along_line(scene.shoreline, sampling_distance)
+    x, y = points.geometry.x.values, points.geometry.y.values
+    elevations = calculate_terrain_elevations(
+        x, y, scene.river_width, scene.meander_amplitude, scene.meander_wavelength
+    )
+    elevations += random_generator.normal(0, 0.05, len(elevations))
+    are_outliers = random_generator.random(len(elevations)) < 0.005
+    elevations[are_outliers] += random_generator.uniform(1, 5, are_outliers.sum())
+    points["z_raster"] = elevations
+    return points
+
+
+def create_points_along_profile(number_of_points: int, profile_length: float = 100.0, seed: int = 0) -> np.ndarray:
+    # scattered points of one surveyed cross section, as x and y columns
+    random_generator = np.random.default_rng(seed)
+    distances_along = np.sort(random_generator.uniform(0, profile_length, number_of_points))
+    angle = random_generator.uniform(0, np.pi)
+    x = ORIGIN_OF_SCENE[0] + distances_along * np.cos(angle) + random_generator.normal(0, 0.5, number_of_points)
+    y = ORIGIN_OF_SCENE[1] + distances_along * np.sin(angle) + random_generator.normal(0, 0.5, number_of_points)
+    return np.column_stack([x, y])
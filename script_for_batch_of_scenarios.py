@@ -0,0 +1,199 @@
+import dataclasses
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+
+import pandas as pd
+
+from script_for_water_surface_preparation import (
+    create_all_parameters,
+    export_intermediates,
+    get_all_paths_for_one_scenario,
+    interpolate_elevations_along_shoreline,
+    names_of_intermediate_layers,
+    prepare_points_of_one_scenario,
+    process_one_center_line,
+)
+from utils.intermediates import IntermediateStore
+from utils.loading import configure_loading_cache
+from utils.plot_dispatcher import configure_shared_plot_dispatcher, get_shared_plot_dispatcher
+from utils.raster_cache import configure_shared_raster_reader
+from utils.stage_cache import StageCache
+from utils.task_graph import Task, create_local_task, create_task, run_task_graph
+from water_surface_preparation.data_classes.enums import ExecutorMode, Scenario
+from water_surface_preparation.data_classes.parameters import ParametersForOneProcess
+from water_surface_preparation.data_classes.points_per_line import (
+    OrderedProjectedPointsPerCenterLine,
+    PointsPerCenterline,
+)
+
+
+@dataclass(frozen=True)
+class TimedResult:
+    value: Any
+    seconds: float
+    finished_at: float
+
+
+def measure_time(function: Callable[[], Any]) -> TimedResult:
+    # the figures of the task are finished before it counts as done, so none is lost when its worker stops
+    start = time.perf_counter()
+    value = function()
+    get_shared_plot_dispatcher().wait_for_all()
+    return TimedResult(value=value, seconds=time.perf_counter() - start, finished_at=time.time())
+
+
+def initialize_worker_for_scenarios(parameters: ParametersForOneProcess) -> None:
+    configure_shared_raster_reader(parameters.raster_block_cache_size_in_megabytes)
+    configure_shared_plot_dispatcher(parameters.plot_mode, parameters.maximal_number_of_plot_workers)
+    configure_loading_cache(parameters.loading_cache_directory)
+
+
+def prepare_scenario(parameters: ParametersForOneProcess) -> TimedResult:
+    paths = get_all_paths_for_one_scenario(parameters.demanded_scenario)
+    stage_cache = StageCache(parameters.stage_cache_directory, parameters.stage_cache_size_in_megabytes)
+    return measure_time(lambda: prepare_points_of_one_scenario(parameters, paths, stage_cache))
+
+
+def select_points_of_center_line(
+    prepared_scenario: TimedResult, i: int
+) -> tuple[PointsPerCenterline, OrderedProjectedPointsPerCenterLine]:
+    # runs locally, so every center line task gets the points of its center line and not those of the whole scenario
+    points_of_scenario = prepared_scenario.value
+    return points_of_scenario.shoreline_points_per_center_line[i], points_of_scenario.gps_points_per_line[i]
+
+
+def process_center_line_of_scenario(
+    points_of_center_line: tuple[PointsPerCenterline, OrderedProjectedPointsPerCenterLine],
+    i: int,
+    parameters: ParametersForOneProcess,
+) -> TimedResult:
+    line_matched_with_shore_points, line_matched_with_gps_points = points_of_center_line
+    return measure_time(
+        lambda: process_one_center_line(i, line_matched_with_shore_points, line_matched_with_gps_points, parameters)
+    )
+
+
+def finish_scenario(
+    prepared_scenario: TimedResult, parameters: ParametersForOneProcess, *processed_center_lines: TimedResult
+) -> TimedResult:
+    def interpolate_and_write_shoreline() -> int:
+        all_shore_line_points_with_elevation = interpolate_elevations_along_shoreline(
+            prepared_scenario.value, [result.value for result in processed_center_lines], parameters
+        )
+        intermediate_store = IntermediateStore(parameters.intermediates_directory)
+        intermediate_store.write(
+            all_shore_line_points_with_elevation, "interpolated_shore_line_points", parameters.demanded_scenario.value
+        )
+        if parameters.export_format is not None:
+            export_intermediates(
+                intermediate_store, parameters.demanded_scenario, parameters.export_format, parameters.output_directory
+            )
+        return len(all_shore_line_points_with_elevation.index)
+
+    timed_result = measure_time(interpolate_and_write_shoreline)
+    # only the timings are sent back, the results of the scenario are on disk
+    return TimedResult(
+        value={
+            "scenario": parameters.demanded_scenario.value,
+            "number_of_shoreline_points": timed_result.value,
+            "preparation_seconds": prepared_scenario.seconds,
+            "center_lines_seconds": sum(result.seconds for result in processed_center_lines),
+            "slowest_center_line_seconds": max((result.seconds for result in processed_center_lines), default=0.0),
+            "shoreline_seconds": timed_result.seconds,
+        },
+        seconds=timed_result.seconds,
+        finished_at=timed_result.finished_at,
+    )
+
+
+def create_tasks_for_one_scenario(parameters: ParametersForOneProcess) -> Task:
+    prepared_scenario = create_task(prepare_scenario, parameters)
+    number_of_center_lines = len(get_all_paths_for_one_scenario(parameters.demanded_scenario).paths_to_centerlines)
+    processed_center_lines = [
+        create_task(
+            process_center_line_of_scenario,
+            create_local_task(select_points_of_center_line, prepared_scenario, i),
+            i,
+            parameters,
+        )
+        for i in range(number_of_center_lines)
+    ]
+    return create_task(finish_scenario, prepared_scenario, parameters, *processed_center_lines)
+
+
+def remove_intermediates_of_earlier_runs(parameters: ParametersForOneProcess) -> None:
+    intermediate_store = IntermediateStore(parameters.intermediates_directory)
+    for layer_name in names_of_intermediate_layers:
+        intermediate_store.remove(layer_name, parameters.demanded_scenario.value)
+
+
+def make_absolute_if_given(path: Optional[str]) -> Optional[str]:
+    return os.path.abspath(path) if path is not None else None
+
+
+def run_scenarios(
+    scenarios: Iterable[Scenario],
+    base_parameters: ParametersForOneProcess,
+    output_root: str,
+    maximal_number_of_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    # the preparation and every center line of all scenarios are tasks on one shared pool of worker processes.
+    # the stage and loading cache directories are shared by all scenarios, so inputs common to several scenarios are
+    # computed and parsed once. every scenario writes its outputs into <output_root>/<scenario>/out.
+    output_root = os.path.abspath(output_root)
+    base_parameters = dataclasses.replace(
+        base_parameters,
+        stage_cache_directory=make_absolute_if_given(base_parameters.stage_cache_directory),
+        loading_cache_directory=make_absolute_if_given(base_parameters.loading_cache_directory),
+        executor_mode=ExecutorMode.serial,
+    )
+    parameters_per_scenario = []
+    for scenario in scenarios:
+        output_directory = os.path.join(output_root, scenario.value, "out")
+        os.makedirs(output_directory, exist_ok=True)
+        parameters_per_scenario.append(
+            dataclasses.replace(
+                base_parameters,
+                demanded_scenario=scenario,
+                output_directory=output_directory,
+                intermediates_directory=os.path.join(output_directory, "intermediates"),
+            )
+        )
+        remove_intermediates_of_earlier_runs(parameters_per_scenario[-1])
+    final_tasks = [create_tasks_for_one_scenario(parameters) for parameters in parameters_per_scenario]
+
+    start = time.time()
+    if maximal_number_of_workers is None:
+        initialize_worker_for_scenarios(base_parameters)
+        results_per_key = run_task_graph(final_tasks)
+        get_shared_plot_dispatcher().close()
+    else:
+        with ProcessPoolExecutor(
+            max_workers=maximal_number_of_workers,
+            initializer=initialize_worker_for_scenarios,
+            initargs=(base_parameters,),
+        ) as process_pool:
+            results_per_key = run_task_graph(final_tasks, process_pool)
+
+    rows = []
+    for task in final_tasks:
+        timed_result = results_per_key[task.key]
+        rows.append({**timed_result.value, "wall_seconds": timed_result.finished_at - start})
+    return pd.DataFrame(rows)
+
+
+def main():
+    output_root = "batch_of_scenarios"
+    timing_summary = run_scenarios(
+        list(Scenario), create_all_parameters(), output_root, maximal_number_of_workers=os.cpu_count()
+    )
+    print(timing_summary.to_string(index=False))
+    print(f"all scenarios finished after {timing_summary['wall_seconds'].max():.1f} s")
+    timing_summary.to_csv(os.path.join(output_root, "timing_summary.csv"), index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+
+import pandas as pd
+
+from benchmarks.hot_paths import compare_with_baseline, run_benchmarks
+
+# the baseline is written by the first run and only replaced if asked for
+PATH_TO_BASELINE = os.path.join("benchmarks", "baseline.csv")
+DIRECTORY_OF_SYNTHETIC_SCENES = os.path.join("out", "synthetic_scenes")
+
+
+def main(update_baseline: bool = False):
+    measurements = run_benchmarks(DIRECTORY_OF_SYNTHETIC_SCENES, [1_000, 10_000, 100_000, 1_000_000])
+    os.makedirs("out", exist_ok=True)
+    measurements.to_csv(os.path.join("out", "hot_path_benchmarks.csv"), index=False)
+    if update_baseline or not os.path.exists(PATH_TO_BASELINE):
+        measurements.to_csv(PATH_TO_BASELINE, index=False)
+        print(measurements.to_string(index=False))
+        print(f"baseline written to {PATH_TO_BASELINE}")
+        return
+    comparison = compare_with_baseline(measurements, pd.read_csv(PATH_TO_BASELINE))
+    print(comparison.to_string(index=False, float_format="{:.3f}".format))
+    regressions = comparison[comparison["is_regression"]]
+    if len(regressions.index) > 0:
+        print(f"{len(regressions.index)} measurements are slower or larger than the baseline:")
+        print(regressions[["benchmark", "number_of_points", "ratio_of_seconds", "ratio_of_peak_memory"]].to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import dataclasses
+import os
+from dataclasses import dataclass
+from itertools import product
+from typing import Any, Mapping, Optional, Sequence
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from utils import T
+from utils.linear_referencing import extract_coordinates
+from utils.loading import configure_loading_cache
+from utils.stage_cache import StageCache
+from utils.task_graph import Task, create_local_task, create_task, run_task_graph
+from script_for_water_surface_preparation import (
+    assign_gps_points_to_center_lines,
+    assign_shore_points_to_center_lines,
+    calculate_transects_along_center_line,
+    create_all_parameters,
+    extract_elevation_of_points,
+    filter_points_with_elevation,
+    get_all_paths_for_one_scenario,
+    interpolate_elevations_along_shoreline_of_one_center_line,
+    interpolate_smoothed_elevations_along_center_line,
+    load_all_center_lines,
+    load_shoreline,
+    order_gps_points_along_center_lines,
+    sample_and_assign_points_along_shoreline,
+    sample_points_along_open_shore,
+    select_shoreline_of_types,
+)
+from water_surface_preparation.data_classes.enums import ShoreTypes
+from water_surface_preparation.data_classes.parameters import ParametersForOneProcess, ParametersForSmoothing
+from water_surface_preparation.data_classes.points_per_line import (
+    OrderedProjectedPointsPerCenterLine,
+    PointsPerCenterline,
+    TransectsAndPointsPerCenterLine,
+)
+
+# every stage is computed once per distinct input by the task graph, so the stages of the sweep are not cached on disk.
+# the same cache is passed to all tasks, so it does not tell apart tasks that are equal otherwise
+stage_cache_of_sweep = StageCache(None)
+
+
+@dataclass(frozen=True)
+class ResidualsPerCenterLine:
+    # elevation minus the elevation of the gps shore points
+    residuals_along_center_line: np.ndarray
+    residuals_along_shoreline: np.ndarray
+
+
+def create_parameter_grid(
+    base_parameters: ParametersForOneProcess, values_per_field: Mapping[str, Sequence[Any]]
+) -> list[ParametersForOneProcess]:
+    # every combination of the given values, nested fields are named with a dot,
+    # e.g. "parameters_to_filter_sampling_points.maximal_deviation"
+    grid = []
+    for values in product(*values_per_field.values()):
+        parameters = base_parameters
+        for field_name, value in zip(values_per_field.keys(), values):
+            parameters = replace_field(parameters, field_name.split("."), value)
+        grid.append(parameters)
+    return grid
+
+
+def replace_field(parameters: Any, field_names: list[str], value: Any) -> Any:
+    if len(field_names) > 1:
+        value = replace_field(getattr(parameters, field_names[0]), field_names[1:], value)
+    return dataclasses.replace(parameters, **{field_names[0]: value})
+
+
+def select_result_of_center_line(results_per_center_line: Sequence[T], i: int) -> T:
+    # runs locally, so the tasks of a center line only get the results of their center line
+    return results_per_center_line[i]
+
+
+def process_center_line(
+    line_matched_with_shore_points: PointsPerCenterline,
+    frac: float,
+    parameters_for_smoothing: ParametersForSmoothing,
+    sampling_distance: int,
+    line_length: int,
+) -> TransectsAndPointsPerCenterLine:
+    # process_one_center_line without the intermediates and the figures
+    _, interpolated_points = interpolate_smoothed_elevations_along_center_line(
+        line_matched_with_shore_points, frac, parameters_for_smoothing, sampling_distance, stage_cache_of_sweep
+    )
+    _, transects = calculate_transects_along_center_line(
+        interpolated_points.projected_points, line_length, stage_cache_of_sweep
+    )
+    return TransectsAndPointsPerCenterLine(transects=transects, interpolated_points=interpolated_points)
+
+
+def calculate_residuals_against_gps_points(
+    line_matched_with_gps_points: OrderedProjectedPointsPerCenterLine,
+    results_of_center_line: TransectsAndPointsPerCenterLine,
+    shore_line_points_with_elevation: gpd.GeoDataFrame,
+) -> ResidualsPerCenterLine:
+    # the interpolated water surface along the center line at the chainage of each gps point and the elevation of
+    # the closest interpolated shoreline point, both compared to the elevation of the gps point
+    gps_points = line_matched_with_gps_points.projected_points
+    if len(gps_points.index) == 0:
+        return ResidualsPerCenterLine(np.empty(0), np.empty(0))
+    gps_elevations = gps_points["z_raster"].values.astype(float)
+    interpolated_points = results_of_center_line.interpolated_points.projected_points
+    elevations_along_center_line = np.interp(
+        gps_points["distance"].values, interpolated_points["distance"].values, interpolated_points["z_interpolated"]
+    )
+    has_elevation = np.isfinite(shore_line_points_with_elevation["z_interpolated"].values)
+    elevations_along_shoreline = np.full(len(gps_elevations), np.nan)
+    if has_elevation.any():
+        shoreline_with_elevation = shore_line_points_with_elevation[has_elevation]
+        gps_coordinates = np.column_stack([gps_points["x_gps"].values, gps_points["y_gps"].values])
+        _, closest_points = cKDTree(extract_coordinates(shoreline_with_elevation.geometry)).query(gps_coordinates)
+        elevations_along_shoreline = shoreline_with_elevation["z_interpolated"].values[closest_points]
+    return ResidualsPerCenterLine(
+        residuals_along_center_line=elevations_along_center_line - gps_elevations,
+        residuals_along_shoreline=elevations_along_shoreline - gps_elevations,
+    )
+
+
+def create_tasks_for_one_configuration(parameters: ParametersForOneProcess) -> list[Task]:
+    # one task per stage of prepare_points_of_one_scenario, process_one_center_line and
+    # interpolate_elevations_along_shoreline. stages only get the parameters they depend on, so configurations that
+    # share them share the results of these stages. the parts of the shoreline and the points of a center line are
+    # selected locally, so every stage is sent only the part it works on.
+    paths = get_all_paths_for_one_scenario(parameters.demanded_scenario)
+    shoreline = create_task(load_shoreline, paths.path_to_shoreline)
+    center_lines = create_task(load_all_center_lines, tuple(paths.paths_to_centerlines))
+    open_shore_shoreline = create_local_task(select_shoreline_of_types, shoreline, (ShoreTypes.open_shore,))
+    open_or_covered_shoreline = create_local_task(
+        select_shoreline_of_types, shoreline, (ShoreTypes.open_shore, ShoreTypes.covered)
+    )
+    points_without_elevation = create_task(
+        sample_points_along_open_shore, open_shore_shoreline, parameters.sampling_distance, stage_cache_of_sweep
+    )
+    points_with_elevation = create_task(
+        extract_elevation_of_points,
+        points_without_elevation,
+        paths.path_to_raster,
+        parameters.raster_interpolation,
+        stage_cache_of_sweep,
+    )
+    filtered_points_with_elevation = create_task(
+        filter_points_with_elevation,
+        points_with_elevation,
+        parameters.parameters_to_filter_sampling_points,
+        stage_cache_of_sweep,
+    )
+    shoreline_points_per_center_line = create_task(
+        assign_shore_points_to_center_lines,
+        filtered_points_with_elevation,
+        paths.path_to_additional_points,
+        center_lines,
+        parameters.buffer_distance,
+        stage_cache_of_sweep,
+    )
+    points_along_shoreline_per_center_line = create_task(
+        sample_and_assign_points_along_shoreline,
+        open_or_covered_shoreline,
+        center_lines,
+        parameters.sampling_distance,
+        parameters.buffer_distance,
+        stage_cache_of_sweep,
+    )
+    gps_points_per_line = create_task(
+        order_gps_points_along_center_lines,
+        create_task(
+            assign_gps_points_to_center_lines,
+            paths.path_to_gps_points,
+            center_lines,
+            parameters.buffer_distance,
+            stage_cache_of_sweep,
+        ),
+    )
+
+    residual_tasks = []
+    for i in range(len(paths.paths_to_centerlines)):
+        results_of_center_line = create_task(
+            process_center_line,
+            create_local_task(select_result_of_center_line, shoreline_points_per_center_line, i),
+            parameters.frac,
+            parameters.parameters_for_smoothing,
+            parameters.sampling_distance,
+            parameters.line_length,
+        )
+        shore_line_points_with_elevation = create_task(
+            interpolate_elevations_along_shoreline_of_one_center_line,
+            create_local_task(select_result_of_center_line, points_along_shoreline_per_center_line, i),
+            results_of_center_line,
+            parameters.sampling_distance,
+            parameters.buffer_distance,
+            parameters.parameters_to_assign_elevation_to_points,
+        )
+        residual_tasks.append(
+            create_task(
+                calculate_residuals_against_gps_points,
+                create_local_task(select_result_of_center_line, gps_points_per_line, i),
+                results_of_center_line,
+                shore_line_points_with_elevation,
+            )
+        )
+    return residual_tasks
+
+
+def summarize_residuals(residuals: np.ndarray, prefix: str) -> dict[str, float]:
+    residuals = residuals[np.isfinite(residuals)]
+    if len(residuals) == 0:
+        return {f"{prefix}_number_of_points": 0}
+    return {
+        f"{prefix}_number_of_points": len(residuals),
+        f"{prefix}_mean_residual": residuals.mean(),
+        f"{prefix}_rmse": np.sqrt(np.mean(residuals**2)),
+        f"{prefix}_maximal_absolute_residual": np.abs(residuals).max(),
+    }
+
+
+def run_parameter_sweep(
+    grid: Sequence[ParametersForOneProcess],
+    swept_fields: Sequence[str],
+    maximal_number_of_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    # one row per configuration with the swept parameters and the residuals against the gps shore points
+    tasks_per_configuration = [create_tasks_for_one_configuration(parameters) for parameters in grid]
+    all_tasks = [task for tasks in tasks_per_configuration for task in tasks]
+    results_per_key = run_task_graph(all_tasks, maximal_number_of_workers=maximal_number_of_workers)
+
+    rows = []
+    for parameters, tasks in zip(grid, tasks_per_configuration):
+        residuals_per_center_line = [results_per_key[task.key] for task in tasks]
+        row = {"scenario": parameters.demanded_scenario.value}
+        for field_name in swept_fields:
+            value = parameters
+            for name in field_name.split("."):
+                value = getattr(value, name)
+            row[field_name] = value.value if hasattr(value, "value") else value
+        row.update(
+            summarize_residuals(
+                np.concatenate([residuals.residuals_along_center_line for residuals in residuals_per_center_line]),
+                "center_line",
+            )
+        )
+        row.update(
+            summarize_residuals(
+                np.concatenate([residuals.residuals_along_shoreline for residuals in residuals_per_center_line]),
+                "shoreline",
+            )
+        )
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    values_per_field = {
+        "sampling_distance": [2, 4],
+        "buffer_distance": [45],
+        "frac": [0.1, 0.2, 0.3],
+        "line_length": [30, 45],
+        "parameters_to_filter_sampling_points.maximal_deviation": [0.25, 0.5],
+    }
+    base_parameters = create_all_parameters()
+    configure_loading_cache(base_parameters.loading_cache_directory)
+    grid = create_parameter_grid(base_parameters, values_per_field)
+    comparison = run_parameter_sweep(grid, list(values_per_field.keys()), maximal_number_of_workers=os.cpu_count())
+    print(comparison.to_string(index=False))
+    comparison.to_csv("out\\parameter_sweep.csv", index=False)
+
+
+if __name__ == "__main__":
+    main()
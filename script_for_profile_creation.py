@@ -1,5 +1,5 @@
 import pickle
-from typing import Iterable, Union
+from typing import Iterable, Optional, Union
 
 import geopandas
 import geopandas as gpd
@@ -19,6 +19,8 @@ from profile_creation.containers import (
     ProjectedPointsPerProfileLine,
     OrderedProjectedGpsPointsPerProfileLine,
 )
+from utils.instrumentation import measure_stage, start_run_report
+from utils.linear_referencing import LineSegments, extract_coordinates
 from utils.loading import load_data_with_crs_2056
 from utils.sampling import extract_elevation_from_raster
 
@@ -134,12 +136,9 @@ def project_matched_points_on_profile_line(
 ) -> ProjectedPointsPerProfileLine:
     projected_points = matched_points_per_profile_line.gps_points.copy()
     if len(matched_points_per_profile_line.gps_points.index) > 0:
-        projected_points["geometry"] = projected_points.apply(
-            lambda row: matched_points_per_profile_line.profile_line.interpolate(
-                matched_points_per_profile_line.profile_line.project(row.geometry)
-            ),
-            axis=1,
-        )
+        profile_line_segments = LineSegments.from_line(matched_points_per_profile_line.profile_line)
+        snapped_coordinates = profile_line_segments.snap(extract_coordinates(projected_points.geometry))
+        projected_points["geometry"] = gpd.points_from_xy(*snapped_coordinates.T, crs=projected_points.crs)
     return ProjectedPointsPerProfileLine(projected_points, matched_points_per_profile_line.profile_line)
 
     # Calculate distance to origin: order_points_from_line_origin_on
@@ -151,10 +150,10 @@ def order_gps_points_from_line_origin_on(
     projected_gps_points_on_profile_line: ProjectedPointsPerProfileLine,
 ) -> OrderedProjectedGpsPointsPerProfileLine:
     projected_gps_points_on_profile_line.projected_gps_points.reset_index(inplace=True)
-    projected_gps_points_on_profile_line.projected_gps_points["distance"] = np.nan
-    for index, row in projected_gps_points_on_profile_line.projected_gps_points.iterrows():
-        distance = projected_gps_points_on_profile_line.profile_line.project(row.geometry)
-        projected_gps_points_on_profile_line.projected_gps_points.loc[index, "distance"] = distance
+    profile_line_segments = LineSegments.from_line(projected_gps_points_on_profile_line.profile_line)
+    projected_gps_points_on_profile_line.projected_gps_points["distance"] = profile_line_segments.project(
+        extract_coordinates(projected_gps_points_on_profile_line.projected_gps_points.geometry)
+    )
 
     ordered_points = projected_gps_points_on_profile_line.projected_gps_points.sort_values(by="distance").reset_index(
         drop=True
@@ -174,17 +173,32 @@ def filter_points_with_less_than_zero_elevation(points: GeoDataFrame) -> GeoData
 def main():
     scenario_id = BeforeOrAfterFloodScenario.bf_2020
     tin_nr = "TIN20"  # bf=TIN20, af=TIN18
+    # time and memory of every stage are written to this json file and/or printed, stages are only measured if one of
+    # both is asked for. the report used to be written to river_profiles_from_bathymetry\\run_report_<scenario>.json
+    path_to_run_report: Optional[str] = None
+    print_run_report = False
     paths = create_paths(scenario_id)
-    gps_points = load_data_with_crs_2056(paths.path_to_gps_points)
-    water_mask = load_data_with_crs_2056(paths.path_to_water_mask)
-
-    gps_points_with_elevation = filter_points_with_less_than_zero_elevation(
-        extract_elevation_from_raster(path_to_raster=paths.path_to_raster, points_to_intersect=gps_points)
+    run_report = start_run_report(
+        f"profile_creation_{scenario_id.value}",
+        is_enabled=path_to_run_report is not None or print_run_report,
     )
+    with measure_stage("loading") as stage:
+        gps_points = stage.record_output(load_data_with_crs_2056(paths.path_to_gps_points))
+        water_mask = load_data_with_crs_2056(paths.path_to_water_mask)
+
+    with measure_stage("elevation_extraction_and_filtering", gps_points) as stage:
+        gps_points_with_elevation = filter_points_with_less_than_zero_elevation(
+            extract_elevation_from_raster(path_to_raster=paths.path_to_raster, points_to_intersect=gps_points)
+        )
+        stage.record_output(gps_points_with_elevation)
 
     prepared_gps_points_with_elevation = rename_z_raster_column(gps_points_with_elevation, scenario_id)
 
-    indices_of_points_per_line = merge_all_points_to_lines_that_are_close_enough(prepared_gps_points_with_elevation)
+    with measure_stage("merging_points_to_lines", prepared_gps_points_with_elevation) as stage:
+        indices_of_points_per_line = merge_all_points_to_lines_that_are_close_enough(
+            prepared_gps_points_with_elevation
+        )
+        stage.record_output(indices_of_points_per_line)
     figure = Figure()
     for group_id, group_of_points in enumerate(indices_of_points_per_line):
         points_per_line = GeoDataFrame(geometry=[], crs=gps_points.crs)
@@ -194,7 +208,8 @@ def main():
         x = list(points_per_line.geometry.apply(lambda point: point.x))
         y = list(points_per_line.geometry.apply(lambda point: point.y))
         z = points_per_line[create_z_column_name(scenario_id)]
-        fitted_line = fit_a_line_to_the_points(x, y, segment_length=100)
+        with measure_stage(f"fitting_line_{group_id}", points_per_line):
+            fitted_line = fit_a_line_to_the_points(x, y, segment_length=100)
         assert fitted_line.length > 0
         fitted_line_with_geometry = geopandas.GeoDataFrame(geometry=[fitted_line], crs=gps_points.crs)
         clipped_profile_lines: gpd.GeoDataFrame = gpd.clip(fitted_line_with_geometry, water_mask, keep_geom_type=True)
@@ -231,10 +246,13 @@ def main():
             # combine in one class
 
             gps_points_with_profile_line = PointsPerProfile(points_per_line, candidate_line)
-            projected_gps_points_on_profile_line = project_matched_points_on_profile_line(gps_points_with_profile_line)
-            ordered_gps_points_on_profile_line = order_gps_points_from_line_origin_on(
-                projected_gps_points_on_profile_line
-            )
+            with measure_stage(f"projecting_and_ordering_{group_id}_{line_id}", points_per_line):
+                projected_gps_points_on_profile_line = project_matched_points_on_profile_line(
+                    gps_points_with_profile_line
+                )
+                ordered_gps_points_on_profile_line = order_gps_points_from_line_origin_on(
+                    projected_gps_points_on_profile_line
+                )
             none_of_the_points_on_the_line = (
                 ordered_gps_points_on_profile_line.projected_gps_points["distance"].sum() == 0
             )
@@ -269,7 +287,13 @@ def main():
 
     print("mean st. error:", prepared_gps_points_with_elevation[f"{scenario_id.value}-GPS"].mean())
 
-    fit_a_regression_line_to_modelled_and_simulated_elevations(prepared_gps_points_with_elevation, scenario_id)
+    with measure_stage("regression", prepared_gps_points_with_elevation):
+        fit_a_regression_line_to_modelled_and_simulated_elevations(prepared_gps_points_with_elevation, scenario_id)
+
+    if path_to_run_report is not None:
+        run_report.write_json(path_to_run_report)
+    if print_run_report:
+        run_report.print_table()
 
 
 def fit_a_regression_line_to_modelled_and_simulated_elevations(
@@ -0,0 +1,23 @@
+from profile_creation.containers import BeforeOrAfterFloodScenario
+from script_for_profile_creation import create_paths
+from script_for_water_surface_preparation import get_all_paths_for_one_scenario
+from utils.raster_sidecar import convert_raster_to_memory_mapped_sidecar, load_memory_mapped_sidecar_if_fresh
+from water_surface_preparation.data_classes.enums import Scenario
+
+
+def collect_all_raster_paths() -> list[str]:
+    paths_to_rasters = [get_all_paths_for_one_scenario(scenario).path_to_raster for scenario in Scenario]
+    paths_to_rasters += [create_paths(scenario).path_to_raster for scenario in BeforeOrAfterFloodScenario]
+    return list(dict.fromkeys(paths_to_rasters))
+
+
+def main():
+    for path_to_raster in collect_all_raster_paths():
+        if load_memory_mapped_sidecar_if_fresh(path_to_raster) is not None:
+            print(f"sidecar for {path_to_raster} is up to date")
+            continue
+        print(f"created sidecar {convert_raster_to_memory_mapped_sidecar(path_to_raster)}")
+
+
+if __name__ == "__main__":
+    main()
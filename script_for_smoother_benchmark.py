@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from water_surface_preparation.data_classes.enums import SmoothingMethod
+from water_surface_preparation.data_classes.parameters import ParametersForSmoothing
+from water_surface_preparation.smoothing import smooth_elevations
+
+
+def create_synthetic_profile(number_of_points: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    # unevenly spaced points along a sloped, slightly meandering water surface with noise and some outliers
+    random_generator = np.random.default_rng(seed)
+    chainages = np.cumsum(random_generator.exponential(2.0, number_of_points))
+    elevations = 580 - 0.005 * chainages + 0.2 * np.sin(chainages / 150)
+    elevations += random_generator.normal(0, 0.05, number_of_points)
+    are_outliers = random_generator.random(number_of_points) < 0.02
+    elevations[are_outliers] += random_generator.normal(0, 1.0, are_outliers.sum())
+    return chainages, elevations
+
+
+def benchmark_smoothers(numbers_of_points: list[int], frac: float) -> pd.DataFrame:
+    results = []
+    for number_of_points in numbers_of_points:
+        chainages, elevations = create_synthetic_profile(number_of_points)
+        smoothed_elevations_per_method = {}
+        for method in SmoothingMethod:
+            start = time.perf_counter()
+            smoothed_elevations_per_method[method] = smooth_elevations(
+                chainages, elevations, frac, ParametersForSmoothing(method=method)
+            )
+            runtime = time.perf_counter() - start
+            deviations = smoothed_elevations_per_method[method] - smoothed_elevations_per_method[SmoothingMethod.lowess]
+            results.append(
+                {
+                    "number_of_points": number_of_points,
+                    "method": method.value,
+                    "runtime_in_seconds": runtime,
+                    "maximal_deviation_from_lowess": np.abs(deviations).max(),
+                    "rms_deviation_from_lowess": np.sqrt(np.mean(deviations**2)),
+                }
+            )
+            print(results[-1])
+    return pd.DataFrame(results)
+
+
+def main():
+    results = benchmark_smoothers([1_000, 10_000, 30_000], frac=0.2)
+    print(results.to_string(index=False))
+    results.to_csv("smoother_benchmark.csv", index=False)
+
+
+if __name__ == "__main__":
+    main()
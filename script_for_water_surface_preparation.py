@@ -1,17 +1,27 @@
-from typing import Sequence, Iterable
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, Sequence
 
 import geopandas as gpd
 import numpy as np
+import pandas as pd
 import shapely
 from shapely import ops
 from shapely.geometry import MultiPoint, Point, LineString, MultiLineString
 
-from script_for_profile_creation import filter_points_with_less_than_zero_elevation
-from utils.loading import load_data_with_crs_2056
+from utils.intermediates import ExportFormat, IntermediateStore
+from utils.instrumentation import measure_stage, measured, start_run_report
+from utils.linear_referencing import LineSegments, extract_coordinates
+from utils.loading import configure_loading_cache, load_data_with_crs_2056
+from utils.plot_dispatcher import PlotJob, PlotMode, configure_shared_plot_dispatcher, get_shared_plot_dispatcher
+from utils.raster_cache import configure_shared_raster_reader
 from utils.sampling import extract_elevation_from_raster
-from water_surface_preparation.data_classes.enums import Scenario, ShoreTypes
+from utils.stage_cache import SourceFile, StageCache
+from water_surface_preparation.center_lines import CenterLineIndex
+from water_surface_preparation.data_classes.enums import ExecutorMode, InterpolationMode, Scenario, ShoreTypes
 from water_surface_preparation.data_classes.parameters import (
     ParametersForOneProcess,
+    ParametersForSmoothing,
     ParametersToAssignElevationToPoints,
     ParametersToFilterSamplingPoints,
 )
@@ -20,9 +30,13 @@ from water_surface_preparation.data_classes.points_per_line import (
     ProjectedPointsPerCenterLine,
     OrderedProjectedPointsPerCenterLine,
     ProcessedPointsPerCenterLine,
+    PointsOfOneScenario,
     PointsPerCenterline,
+    TransectSet,
+    TransectsAndPointsPerCenterLine,
 )
-from water_surface_preparation.filter import filter_outliers_from_elevation_points
+from water_surface_preparation.filter import filter_sampling_points
+from water_surface_preparation.interpolation import interpolate_elevation_from_nearest_points
 from water_surface_preparation.plotting import (
     debug_plot,
     create_plot_for_transect_lines,
@@ -30,7 +44,17 @@ from water_surface_preparation.plotting import (
     plot_interpolated_vs_smooth_and_raster_elevation,
 )
 from water_surface_preparation.sampling import sample_points_along_line
-from water_surface_preparation.smoothing import smooth_elevations_along_line, apply_rolling_window_smoothing
+from water_surface_preparation.smoothing import smooth_elevations_along_line
+from water_surface_preparation.streaming import (
+    ChunkOfCenterLine,
+    FinishedPointsOfChunk,
+    MemoryCeiling,
+    calculate_frac_of_chunk,
+    calculate_overlap_of_chunks,
+    clip_lines_to_region,
+    select_points_within_bounds,
+    split_center_line_into_chunks,
+)
 from water_surface_preparation.transects import (
     calculate_transects,
     trim_intersecting_parts_of_transects,
@@ -38,23 +62,6 @@ from water_surface_preparation.transects import (
 )
 
 
-def interpolate_elevation_from_nearest_points(
-    shoreline_points_per_center_line: PointsPerCenterline,
-    transect_points_with_elevation: gpd.GeoDataFrame,
-    buffer_distance: float,
-) -> gpd.GeoDataFrame:
-    elevation_per_point = []
-    for point in shoreline_points_per_center_line.points.geometry:
-        point: Point
-        buffer = point.buffer(buffer_distance)
-        intersects = transect_points_with_elevation.intersects(buffer)
-        elevation_per_point.append(transect_points_with_elevation.loc[intersects, "z_interpolated"].mean())
-
-    return gpd.GeoDataFrame(
-        {"z_interpolated": elevation_per_point}, geometry=shoreline_points_per_center_line.points.geometry
-    )
-
-
 def get_all_paths_for_one_scenario(demanded_scenario: Scenario) -> PathsForOneProcess:
     if demanded_scenario == Scenario.af_2021:
         return PathsForOneProcess(
@@ -158,10 +165,10 @@ def order_points_from_line_origin_on(
     projected_points_by_center_line: ProjectedPointsPerCenterLine,
 ) -> OrderedProjectedPointsPerCenterLine:
     projected_points_by_center_line.projected_points.reset_index(inplace=True)
-    projected_points_by_center_line.projected_points["distance"] = np.nan
-    for index, row in projected_points_by_center_line.projected_points.iterrows():
-        distance = projected_points_by_center_line.center_line.project(row.geometry).values[0]
-        projected_points_by_center_line.projected_points.loc[index, "distance"] = distance
+    center_line_segments = LineSegments.from_line(projected_points_by_center_line.center_line.geometry[0])
+    projected_points_by_center_line.projected_points["distance"] = center_line_segments.project(
+        extract_coordinates(projected_points_by_center_line.projected_points.geometry)
+    )
 
     ordered_points = projected_points_by_center_line.projected_points.sort_values(by="distance").reset_index(drop=True)
     return OrderedProjectedPointsPerCenterLine(
@@ -181,6 +188,29 @@ def interpolate_elevation(
     return points_to_add_elevation
 
 
+def order_gps_points_along_center_lines(
+    gps_points_per_center_line: Sequence[PointsPerCenterline],
+) -> list[OrderedProjectedPointsPerCenterLine]:
+    gps_points_per_line = []
+    for line_matched_with_gps_points in gps_points_per_center_line:
+        are_there_any_gps_points = len(line_matched_with_gps_points.points.index) > 0
+        if are_there_any_gps_points:
+            projected_points = project_matched_points_on_center_line(line_matched_with_gps_points)
+            # the position of the gps points on the shore is kept for the comparison with the interpolated shoreline
+            gps_coordinates = extract_coordinates(line_matched_with_gps_points.points.geometry)
+            projected_points.projected_points["x_gps"] = gps_coordinates[:, 0]
+            projected_points.projected_points["y_gps"] = gps_coordinates[:, 1]
+            ordered_gps_points = order_points_from_line_origin_on(projected_points)
+            gps_points_per_line.append(ordered_gps_points)
+        else:
+            gps_points_per_line.append(
+                OrderedProjectedPointsPerCenterLine(
+                    line_matched_with_gps_points.points, line_matched_with_gps_points.center_line
+                )
+            )
+    return gps_points_per_line
+
+
 def create_all_parameters() -> ParametersForOneProcess:
     return ParametersForOneProcess(
         sampling_distance=2,
@@ -188,6 +218,13 @@ def create_all_parameters() -> ParametersForOneProcess:
         buffer_distance=45,
         line_length=45,
         frac=0.2,
+        # stage results are cached on disk with e.g. stage_cache_directory=os.path.join("out", "stage_cache")
+        # parsed input layers are cached with e.g. loading_cache_directory=os.path.join("out", "loading_cache")
+        # stages are measured and reported with e.g. path_to_run_report=os.path.join("out", "run_report.json") and/or
+        # print_run_report=True
+        plot_mode=PlotMode.background,
+        export_format=ExportFormat.shapefile,
+        maximal_number_of_plot_workers=2,
         parameters_to_assign_elevation_to_points=ParametersToAssignElevationToPoints(buffer_distance=6),
         parameters_to_filter_sampling_points=ParametersToFilterSamplingPoints(
             buffer_distance=30, maximal_deviation=0.25
@@ -195,162 +232,634 @@ def create_all_parameters() -> ParametersForOneProcess:
     )
 
 
-def main():
-    parameters = create_all_parameters()
-    paths = get_all_paths_for_one_scenario(parameters.demanded_scenario)
-    smoothen_with_lowess_ = True
-    shoreline = load_data_with_crs_2056(paths.path_to_shoreline)
-    debug_plot(shoreline, "shoreline")
-
-    open_shore_shoreline = shoreline[shoreline["shore_type"] == ShoreTypes.open_shore.value]
-
-    points_without_elevation = sample_points_along_line(
-        open_shore_shoreline, sampling_distance=parameters.sampling_distance
+def interpolate_smoothed_elevations_along_center_line(
+    line_matched_with_shore_points: PointsPerCenterline,
+    frac: float,
+    parameters_for_smoothing: ParametersForSmoothing,
+    sampling_distance: float,
+    stage_cache: StageCache,
+) -> tuple[ProcessedPointsPerCenterLine, ProcessedPointsPerCenterLine]:
+    # returns the smoothed shore points and the points along the center line with the interpolated elevation
+    processed_center_points = stage_cache.get_or_compute(
+        "smoothing",
+        lambda: smooth_elevations_along_line(
+            order_points_from_line_origin_on(project_matched_points_on_center_line(line_matched_with_shore_points)),
+            frac,
+            parameters_for_smoothing,
+        ),
+        line_matched_with_shore_points,
+        frac,
+        parameters_for_smoothing,
     )
-    points_with_elevation = extract_elevation_from_raster(points_without_elevation, path_to_raster=paths.path_to_raster)
-    filtered_points_with_elevation = filter_outliers_from_elevation_points(
-        points_with_elevation,
-        parameters.parameters_to_filter_sampling_points.buffer_distance,
-        parameters.parameters_to_filter_sampling_points.maximal_deviation,
+
+    points_along_center_line = sample_points_along_line(line_matched_with_shore_points.center_line, sampling_distance)
+    points_along_center_line_with_center_line = ProjectedPointsPerCenterLine(
+        points_along_center_line, line_matched_with_shore_points.center_line
     )
-    filtered_points_with_elevation.to_file(f"{parameters.demanded_scenario.value}_filtered_open_dsm_points.shp")
-    filtered_points_with_elevation_and_additional_points = append_additional_points_if_available(
-        filtered_points_with_elevation, paths
+    points_along_center_line_ordered = order_points_from_line_origin_on(points_along_center_line_with_center_line)
+    points_with_elevation = interpolate_elevation(
+        points_along_center_line_ordered.projected_points, processed_center_points.projected_points
     )
-    center_lines = load_all_center_lines(paths.paths_to_centerlines)
-    shoreline_points_per_center_line = assign_points_to_center_lines(
-        center_lines,
-        filtered_points_with_elevation_and_additional_points,
-        parameters.buffer_distance,
-        does_have_z_raster=True,
+    interpolated_points_along_center_line_with_center_line = ProcessedPointsPerCenterLine(
+        points_with_elevation, line_matched_with_shore_points.center_line
     )
-    gps_points_per_line = []
-    if paths.path_to_gps_points is not None:
-        gps_points = load_data_with_crs_2056(paths.path_to_gps_points)
-        gps_points_per_center_line = assign_points_to_center_lines(
-            center_lines, gps_points, parameters.buffer_distance, does_have_z_raster=True
-        )
-        for i, line_matched_with_gps_points in enumerate(gps_points_per_center_line):
-            are_there_any_gps_points = len(line_matched_with_gps_points.points.index) > 0
-            if are_there_any_gps_points:
-                debug_plot(line_matched_with_gps_points.points, f"line_matched_with_gps_points{i}")
-                projected_points = project_matched_points_on_center_line(line_matched_with_gps_points)
-                ordered_gps_points = order_points_from_line_origin_on(projected_points)
-                gps_points_per_line.append(ordered_gps_points)
-            else:
-                gps_points_per_line.append(
-                    OrderedProjectedPointsPerCenterLine(
-                        line_matched_with_gps_points.points, line_matched_with_gps_points.center_line
-                    )
-                )
-    else:
-        gps_points_per_line.append(OrderedProjectedPointsPerCenterLine(gpd.GeoDataFrame(), gpd.GeoDataFrame()))
-    transects_per_line = []
-    for i, (line_matched_with_shore_points, line_matched_with_gps_points) in enumerate(
-        zip(shoreline_points_per_center_line, gps_points_per_line)
-    ):
-        debug_plot(line_matched_with_shore_points.points, f"line_matched_with_shore_points.points{i}")
-        debug_plot(line_matched_with_shore_points.center_line, f"line_matched_with_points_center_line{i}")
-        # line_matched_with_shore_points.points.to_file(f"out\\shore_points_per_{i}_th_center_line.shp")
-        projected_points = project_matched_points_on_center_line(line_matched_with_shore_points)
-        ordered_projected_points = order_points_from_line_origin_on(projected_points)
-        if smoothen_with_lowess_:
-            processed_center_points = smooth_elevations_along_line(ordered_projected_points, parameters.frac)
-        else:
-            processed_center_points = apply_rolling_window_smoothing(ordered_projected_points)
-
-        points_along_center_line = sample_points_along_line(
-            line_matched_with_shore_points.center_line, parameters.sampling_distance
+    return processed_center_points, interpolated_points_along_center_line_with_center_line
+
+
+def calculate_transects_along_center_line(
+    points_along_center_line: gpd.GeoDataFrame, line_length: int, stage_cache: StageCache
+) -> tuple[TransectSet, TransectSet]:
+    # returns the transects and the transects with their intersecting parts trimmed
+    with measure_stage("transects", points_along_center_line) as stage:
+        transect_lines_and_points = stage_cache.get_or_compute(
+            "transects",
+            lambda: calculate_transects(points_along_center_line, line_length),
+            points_along_center_line,
+            line_length,
         )
-        points_along_center_line_with_center_line = ProjectedPointsPerCenterLine(
-            points_along_center_line, line_matched_with_shore_points.center_line
+        stage.record_output(transect_lines_and_points)
+    with measure_stage("trimming", transect_lines_and_points) as stage:
+        transect_lines_and_points_free_of_intersections = stage_cache.get_or_compute(
+            "trimming",
+            lambda: trim_intersecting_parts_of_transects(transect_lines_and_points),
+            transect_lines_and_points,
         )
-        points_along_center_line_ordered = order_points_from_line_origin_on(points_along_center_line_with_center_line)
-        points_with_elevation = interpolate_elevation(
-            points_along_center_line_ordered.projected_points, processed_center_points.projected_points
+        stage.record_output(transect_lines_and_points_free_of_intersections)
+    return transect_lines_and_points, transect_lines_and_points_free_of_intersections
+
+
+def process_one_center_line(
+    i: int,
+    line_matched_with_shore_points: PointsPerCenterline,
+    line_matched_with_gps_points: OrderedProjectedPointsPerCenterLine,
+    parameters: ParametersForOneProcess,
+) -> TransectsAndPointsPerCenterLine:
+    stage_cache = StageCache(parameters.stage_cache_directory, parameters.stage_cache_size_in_megabytes)
+    debug_plot(
+        line_matched_with_shore_points.points,
+        f"line_matched_with_shore_points.points{i}",
+        parameters.output_directory,
+    )
+    debug_plot(
+        line_matched_with_shore_points.center_line,
+        f"line_matched_with_points_center_line{i}",
+        parameters.output_directory,
+    )
+    # line_matched_with_shore_points.points.to_file(f"out\\shore_points_per_{i}_th_center_line.shp")
+    with measure_stage("smoothing_and_interpolation", line_matched_with_shore_points.points) as stage:
+        processed_center_points, interpolated_points_along_center_line_with_center_line = (
+            interpolate_smoothed_elevations_along_center_line(
+                line_matched_with_shore_points,
+                parameters.frac,
+                parameters.parameters_for_smoothing,
+                parameters.sampling_distance,
+                stage_cache,
+            )
         )
-        interpolated_points_along_center_line_with_center_line = ProcessedPointsPerCenterLine(
-            points_with_elevation, line_matched_with_shore_points.center_line
+        stage.record_output(interpolated_points_along_center_line_with_center_line.projected_points)
+    IntermediateStore(parameters.intermediates_directory).write(
+        interpolated_points_along_center_line_with_center_line.projected_points,
+        "points_along_center_lines",
+        parameters.demanded_scenario.value,
+        center_line_id=i,
+    )
+
+    transect_lines_and_points, transect_lines_and_points_free_of_intersections = calculate_transects_along_center_line(
+        interpolated_points_along_center_line_with_center_line.projected_points, parameters.line_length, stage_cache
+    )
+    create_plot_for_transect_lines(transect_lines_and_points, i, parameters.output_directory)
+    create_plot_for_transect_lines(
+        transect_lines_and_points_free_of_intersections, 100 - i, parameters.output_directory
+    )
+
+    are_there_any_gps_points = len(line_matched_with_gps_points.projected_points.index) > 0
+    plot_smooth_vs_raster_elevation(
+        i,
+        processed_center_points,
+        interpolated_points_along_center_line_with_center_line,
+        line_matched_with_gps_points.projected_points if are_there_any_gps_points else None,
+        parameters.output_directory,
+    )
+    plot_interpolated_vs_smooth_and_raster_elevation(
+        i,
+        interpolated_points_along_center_line_with_center_line,
+        processed_center_points,
+        parameters.output_directory,
+    )
+    return TransectsAndPointsPerCenterLine(
+        transects=transect_lines_and_points_free_of_intersections,
+        interpolated_points=interpolated_points_along_center_line_with_center_line,
+    )
+
+
+def process_all_center_lines(
+    shoreline_points_per_center_line: Sequence[PointsPerCenterline],
+    gps_points_per_line: Sequence[OrderedProjectedPointsPerCenterLine],
+    parameters: ParametersForOneProcess,
+) -> list[TransectsAndPointsPerCenterLine]:
+    # results are returned in the order of the center lines, whatever the executor mode
+    arguments_per_center_line = [
+        (i, line_matched_with_shore_points, line_matched_with_gps_points, parameters)
+        for i, (line_matched_with_shore_points, line_matched_with_gps_points) in enumerate(
+            zip(shoreline_points_per_center_line, gps_points_per_line)
         )
-        interpolated_points_along_center_line_with_center_line.projected_points.to_file(
-            f"out\\points_along_{i}_th_center_line.shp"
+    ]
+    if parameters.executor_mode == ExecutorMode.serial or len(arguments_per_center_line) < 2:
+        return [process_one_center_line(*arguments) for arguments in arguments_per_center_line]
+    # every worker process has its own raster block cache. the figures of the workers are rendered by the plot
+    # dispatcher of this process, so they do not hold up the workers.
+    with ProcessPoolExecutor(
+        max_workers=parameters.maximal_number_of_workers,
+        initializer=initialize_worker_for_center_lines,
+        initargs=(parameters.raster_block_cache_size_in_megabytes, get_shared_plot_dispatcher().mode),
+    ) as executor:
+        results_per_center_line = []
+        for result, plot_jobs in executor.map(
+            process_one_center_line_and_collect_plot_jobs, *zip(*arguments_per_center_line)
+        ):
+            get_shared_plot_dispatcher().submit_jobs(plot_jobs)
+            results_per_center_line.append(result)
+        return results_per_center_line
+
+
+def initialize_worker_for_center_lines(raster_block_cache_size_in_megabytes: int, plot_mode: PlotMode) -> None:
+    configure_shared_raster_reader(raster_block_cache_size_in_megabytes)
+    configure_shared_plot_dispatcher(plot_mode)
+
+
+def process_one_center_line_and_collect_plot_jobs(*arguments) -> tuple[TransectsAndPointsPerCenterLine, list[PlotJob]]:
+    with get_shared_plot_dispatcher().collect_jobs() as plot_jobs:
+        result = process_one_center_line(*arguments)
+    return result, plot_jobs
+
+
+def load_shoreline(path_to_shoreline: str) -> gpd.GeoDataFrame:
+    return load_data_with_crs_2056(path_to_shoreline, columns=["shore_type"])
+
+
+def select_shoreline_of_types(shoreline: gpd.GeoDataFrame, shore_types: Sequence[ShoreTypes]) -> gpd.GeoDataFrame:
+    return shoreline[shoreline["shore_type"].isin([shore_type.value for shore_type in shore_types])]
+
+
+def sample_points_along_open_shore(
+    open_shore_shoreline: gpd.GeoDataFrame, sampling_distance: float, stage_cache: StageCache
+) -> gpd.GeoDataFrame:
+    with measure_stage("sampling", open_shore_shoreline) as stage:
+        return stage.record_output(
+            stage_cache.get_or_compute(
+                "sampling",
+                lambda: sample_points_along_line(open_shore_shoreline, sampling_distance=sampling_distance),
+                open_shore_shoreline,
+                sampling_distance,
+            )
         )
 
-        transect_lines_and_points = calculate_transects(
-            interpolated_points_along_center_line_with_center_line.projected_points, parameters.line_length
+
+def extract_elevation_of_points(
+    points_without_elevation: gpd.GeoDataFrame,
+    path_to_raster: str,
+    raster_interpolation: InterpolationMode,
+    stage_cache: StageCache,
+) -> gpd.GeoDataFrame:
+    with measure_stage("elevation_extraction", points_without_elevation) as stage:
+        return stage.record_output(
+            stage_cache.get_or_compute(
+                "elevation_extraction",
+                lambda: extract_elevation_from_raster(
+                    points_without_elevation, path_to_raster=path_to_raster, interpolation=raster_interpolation
+                ),
+                points_without_elevation,
+                SourceFile(path_to_raster),
+                raster_interpolation,
+            )
         )
-        create_plot_for_transect_lines(transect_lines_and_points, i)
 
-        transect_lines_and_points_free_of_intersections = trim_intersecting_parts_of_transects(
-            transect_lines_and_points
+
+def filter_points_with_elevation(
+    points_with_elevation: gpd.GeoDataFrame,
+    parameters_to_filter_sampling_points: ParametersToFilterSamplingPoints,
+    stage_cache: StageCache,
+) -> gpd.GeoDataFrame:
+    with measure_stage("filtering", points_with_elevation) as stage:
+        return stage.record_output(
+            stage_cache.get_or_compute(
+                "filtering",
+                lambda: filter_sampling_points(points_with_elevation, parameters_to_filter_sampling_points),
+                points_with_elevation,
+                parameters_to_filter_sampling_points,
+            )
         )
-        transects_per_line.append(transect_lines_and_points_free_of_intersections)
-        create_plot_for_transect_lines(transect_lines_and_points_free_of_intersections, 100 - i)
 
-        # add Dsm points on center line for the center line plot
-        interpolated_points_along_center_line_with_dsm_value = extract_elevation_from_raster(
-            interpolated_points_along_center_line_with_center_line.projected_points, path_to_raster=paths.path_to_raster
+
+def assign_points_to_center_lines_with_cache(
+    points: gpd.GeoDataFrame, center_lines: Sequence[gpd.GeoDataFrame], buffer_distance: float, stage_cache: StageCache
+) -> list[PointsPerCenterline]:
+    return stage_cache.get_or_compute(
+        "assignment",
+        lambda: assign_points_to_center_lines(center_lines, points, buffer_distance),
+        points,
+        center_lines,
+        buffer_distance,
+    )
+
+
+def assign_shore_points_to_center_lines(
+    filtered_points_with_elevation: gpd.GeoDataFrame,
+    path_to_additional_points: Optional[str],
+    center_lines: Sequence[gpd.GeoDataFrame],
+    buffer_distance: float,
+    stage_cache: StageCache,
+) -> list[PointsPerCenterline]:
+    # points outside of the buffers around the center lines are never assigned, so they are not loaded at all
+    filtered_points_with_elevation_and_additional_points = append_additional_points_if_available(
+        filtered_points_with_elevation,
+        path_to_additional_points,
+        calculate_bounds_of_buffered_center_lines(center_lines, buffer_distance),
+    )
+    with measure_stage("assignment", filtered_points_with_elevation_and_additional_points) as stage:
+        return stage.record_output(
+            assign_points_to_center_lines_with_cache(
+                filtered_points_with_elevation_and_additional_points, center_lines, buffer_distance, stage_cache
+            )
         )
-        filtered_interpolated_points_along_center_line_with_dsm_value = filter_points_with_less_than_zero_elevation(
-            interpolated_points_along_center_line_with_dsm_value
+
+
+def assign_gps_points_to_center_lines(
+    path_to_gps_points: Optional[str],
+    center_lines: Sequence[gpd.GeoDataFrame],
+    buffer_distance: float,
+    stage_cache: StageCache,
+) -> list[PointsPerCenterline]:
+    if path_to_gps_points is None:
+        return [PointsPerCenterline(gpd.GeoDataFrame(geometry=[]), center_line) for center_line in center_lines]
+    gps_points = load_data_with_crs_2056(
+        path_to_gps_points,
+        columns=["z_raster"],
+        bbox=calculate_bounds_of_buffered_center_lines(center_lines, buffer_distance),
+    )
+    return assign_points_to_center_lines_with_cache(gps_points, center_lines, buffer_distance, stage_cache)
+
+
+def sample_and_assign_points_along_shoreline(
+    open_or_covered_shoreline: gpd.GeoDataFrame,
+    center_lines: Sequence[gpd.GeoDataFrame],
+    sampling_distance: float,
+    buffer_distance: float,
+    stage_cache: StageCache,
+) -> list[PointsPerCenterline]:
+    with measure_stage("shoreline_sampling_and_assignment", open_or_covered_shoreline) as stage:
+        points_along_shoreline = sample_points_along_line(open_or_covered_shoreline, sampling_distance)
+        return stage.record_output(
+            assign_points_to_center_lines_with_cache(points_along_shoreline, center_lines, buffer_distance, stage_cache)
         )
 
-        are_there_any_gps_points = len(line_matched_with_gps_points.projected_points.index) > 0
-        if are_there_any_gps_points:
-            plot_smooth_vs_raster_elevation(
-                i,
-                processed_center_points,
-                interpolated_points_along_center_line_with_center_line,
-                filtered_interpolated_points_along_center_line_with_dsm_value,
-                line_matched_with_gps_points.projected_points,
-            )
-        else:
-            plot_smooth_vs_raster_elevation(
-                i,
-                processed_center_points,
-                interpolated_points_along_center_line_with_center_line,
-                filtered_interpolated_points_along_center_line_with_dsm_value,
-                None,
-            )
-        plot_interpolated_vs_smooth_and_raster_elevation(
-            i, interpolated_points_along_center_line_with_center_line, processed_center_points
+
+def prepare_points_of_one_scenario(
+    parameters: ParametersForOneProcess, paths: PathsForOneProcess, stage_cache: StageCache
+) -> PointsOfOneScenario:
+    with measure_stage("loading_shoreline") as stage:
+        shoreline = stage.record_output(load_shoreline(paths.path_to_shoreline))
+    debug_plot(shoreline, "shoreline", parameters.output_directory)
+
+    open_shore_shoreline = select_shoreline_of_types(shoreline, [ShoreTypes.open_shore])
+    points_without_elevation = sample_points_along_open_shore(
+        open_shore_shoreline, parameters.sampling_distance, stage_cache
+    )
+    points_with_elevation = extract_elevation_of_points(
+        points_without_elevation, paths.path_to_raster, parameters.raster_interpolation, stage_cache
+    )
+    filtered_points_with_elevation = filter_points_with_elevation(
+        points_with_elevation, parameters.parameters_to_filter_sampling_points, stage_cache
+    )
+    IntermediateStore(parameters.intermediates_directory).write(
+        filtered_points_with_elevation, "filtered_open_dsm_points", parameters.demanded_scenario.value
+    )
+    with measure_stage("loading_center_lines") as stage:
+        center_lines = stage.record_output(load_all_center_lines(paths.paths_to_centerlines))
+    shoreline_points_per_center_line = assign_shore_points_to_center_lines(
+        filtered_points_with_elevation,
+        paths.path_to_additional_points,
+        center_lines,
+        parameters.buffer_distance,
+        stage_cache,
+    )
+    with measure_stage("gps_points") as stage:
+        gps_points_per_center_line = assign_gps_points_to_center_lines(
+            paths.path_to_gps_points, center_lines, parameters.buffer_distance, stage_cache
         )
+        gps_points_per_line = stage.record_output(order_gps_points_along_center_lines(gps_points_per_center_line))
+    for i, line_matched_with_gps_points in enumerate(gps_points_per_center_line):
+        if len(line_matched_with_gps_points.points.index) > 0:
+            debug_plot(
+                line_matched_with_gps_points.points,
+                f"line_matched_with_gps_points{i}",
+                parameters.output_directory,
+            )
+
+    open_or_covered_shoreline = select_shoreline_of_types(shoreline, [ShoreTypes.open_shore, ShoreTypes.covered])
+    points_along_shoreline_per_center_line = sample_and_assign_points_along_shoreline(
+        open_or_covered_shoreline, center_lines, parameters.sampling_distance, parameters.buffer_distance, stage_cache
+    )
+    debug_plot(open_shore_shoreline, "open_shore_shoreline", parameters.output_directory)
+    debug_plot(open_or_covered_shoreline, "open_or_covered_shoreline", parameters.output_directory)
+    return PointsOfOneScenario(
+        shoreline=shoreline,
+        shoreline_points_per_center_line=shoreline_points_per_center_line,
+        gps_points_per_line=gps_points_per_line,
+        points_along_shoreline_per_center_line=points_along_shoreline_per_center_line,
+    )
 
-    open_or_covered_shoreline = shoreline.loc[
-        (shoreline["shore_type"] == ShoreTypes.open_shore.value) | (shoreline["shore_type"] == ShoreTypes.covered.value)
-    ]
 
-    points_along_shoreline = sample_points_along_line(open_or_covered_shoreline, parameters.sampling_distance)
-    shoreline_points_per_center_line = assign_points_to_center_lines(
-        center_lines, points_along_shoreline, parameters.buffer_distance
+def interpolate_elevations_along_shoreline_of_one_center_line(
+    points_along_shoreline: PointsPerCenterline,
+    results_of_center_line: TransectsAndPointsPerCenterLine,
+    sampling_distance: float,
+    buffer_distance: float,
+    parameters_to_assign_elevation_to_points: ParametersToAssignElevationToPoints,
+) -> gpd.GeoDataFrame:
+    # for each point on shoreline, interpolate elevation from transects
+    transect_points_with_elevation = sample_points_for_along_all_transects(
+        results_of_center_line.transects, sampling_distance
+    )
+    return interpolate_elevation_from_nearest_points(
+        points_along_shoreline,
+        transect_points_with_elevation,
+        buffer_distance,
+        aggregation=parameters_to_assign_elevation_to_points.aggregation,
+        number_of_nearest_points=parameters_to_assign_elevation_to_points.number_of_nearest_points,
+        inverse_distance_power=parameters_to_assign_elevation_to_points.inverse_distance_power,
     )
 
-    all_shore_line_points_with_elevation = gpd.GeoDataFrame(crs=shoreline.crs)
-    for shoreline_points_per_center_line, transects_per_center_line in zip(
-        shoreline_points_per_center_line, transects_per_line
+
+@measured("shoreline_interpolation")
+def interpolate_elevations_along_shoreline(
+    points_of_scenario: PointsOfOneScenario,
+    results_per_center_line: Sequence[TransectsAndPointsPerCenterLine],
+    parameters: ParametersForOneProcess,
+) -> gpd.GeoDataFrame:
+    all_shore_line_points_with_elevation = gpd.GeoDataFrame(crs=points_of_scenario.shoreline.crs)
+    for points_along_shoreline, results_of_center_line in zip(
+        points_of_scenario.points_along_shoreline_per_center_line, results_per_center_line
     ):
-        transect_points_with_elevation = sample_points_for_along_all_transects(
-            transects_per_center_line, parameters.sampling_distance
+        shore_line_points_with_elevation = interpolate_elevations_along_shoreline_of_one_center_line(
+            points_along_shoreline,
+            results_of_center_line,
+            parameters.sampling_distance,
+            parameters.buffer_distance,
+            parameters.parameters_to_assign_elevation_to_points,
         )
-        shore_line_points_with_elevation = interpolate_elevation_from_nearest_points(
-            shoreline_points_per_center_line, transect_points_with_elevation, parameters.buffer_distance
-        )
-        # for each point on shoreline, interpolate elevation from transects
         all_shore_line_points_with_elevation = all_shore_line_points_with_elevation.append(
             shore_line_points_with_elevation
         )
     # all_shore_line_points_with_elevation.to_file(
     #    f"out\\interpolated_shore_line_points_{parameters.demanded_scenario.value}.shp"
     # )
+    debug_plot(
+        all_shore_line_points_with_elevation, "all_shore_line_points_with_elevation", parameters.output_directory
+    )
+    return all_shore_line_points_with_elevation
 
-    debug_plot(open_shore_shoreline, "open_shore_shoreline")
-    debug_plot(open_or_covered_shoreline, "open_or_covered_shoreline")
-    debug_plot(all_shore_line_points_with_elevation, "all_shore_line_points_with_elevation")
 
+def select_points_of_chunk(
+    points: gpd.GeoDataFrame,
+    chunk: ChunkOfCenterLine,
+    center_line_index: CenterLineIndex,
+    segments_of_center_line: LineSegments,
+) -> tuple[gpd.GeoDataFrame, np.ndarray]:
+    # the points assigned to the center line of the chunk within its chainages with overlap, and their chainages
+    points_of_center_line = center_line_index.assign_points(points)[chunk.center_line_id].points
+    chainages = segments_of_center_line.project(extract_coordinates(points_of_center_line.geometry))
+    is_in_chunk = (chainages >= chunk.start_chainage_with_overlap) & (chainages <= chunk.end_chainage_with_overlap)
+    return points_of_center_line[is_in_chunk].reset_index(drop=True), chainages[is_in_chunk]
+
+
+def process_one_chunk_of_center_line(
+    chunk: ChunkOfCenterLine,
+    shoreline: gpd.GeoDataFrame,
+    additional_points: Optional[gpd.GeoDataFrame],
+    center_line_index: CenterLineIndex,
+    segments_of_center_line: LineSegments,
+    parameters: ParametersForOneProcess,
+    path_to_raster: str,
+) -> FinishedPointsOfChunk:
+    # the steps of prepare_points_of_one_scenario, process_one_center_line and interpolate_elevations_along_shoreline
+    # for the part of the shoreline around one chunk of a center line
+    shoreline_of_chunk = clip_lines_to_region(shoreline, chunk.region)
+    open_shore_shoreline = select_shoreline_of_types(shoreline_of_chunk, [ShoreTypes.open_shore])
+    points_with_elevation = extract_elevation_from_raster(
+        sample_points_along_line(open_shore_shoreline, parameters.sampling_distance),
+        path_to_raster=path_to_raster,
+        interpolation=parameters.raster_interpolation,
+    )
+    filtered_points, chainages_of_filtered_points = select_points_of_chunk(
+        filter_sampling_points(points_with_elevation, parameters.parameters_to_filter_sampling_points),
+        chunk,
+        center_line_index,
+        segments_of_center_line,
+    )
+    points_to_smooth = filtered_points
+    additional_points_of_chunk = select_points_within_bounds(additional_points, chunk.region)
+    if additional_points_of_chunk is not None and len(additional_points_of_chunk.index) > 0:
+        additional_points_of_chunk, _ = select_points_of_chunk(
+            additional_points_of_chunk, chunk, center_line_index, segments_of_center_line
+        )
+        points_to_smooth = gpd.GeoDataFrame(
+            pd.concat([filtered_points, additional_points_of_chunk], ignore_index=True), crs=filtered_points.crs
+        )
 
-def append_additional_points_if_available(filtered_points_with_elevation, paths):
-    if paths.path_to_additional_points is not None:
-        additional_points = load_data_with_crs_2056(paths.path_to_additional_points)
+    open_or_covered_shoreline = select_shoreline_of_types(
+        shoreline_of_chunk, [ShoreTypes.open_shore, ShoreTypes.covered]
+    )
+    shore_points, chainages_of_shore_points = select_points_of_chunk(
+        sample_points_along_line(open_or_covered_shoreline, parameters.sampling_distance),
+        chunk,
+        center_line_index,
+        segments_of_center_line,
+    )
+    shore_points = shore_points[chunk.is_in_core(chainages_of_shore_points)].reset_index(drop=True)
+    core_of_filtered_points = filtered_points[chunk.is_in_core(chainages_of_filtered_points)].reset_index(drop=True)
+    if not np.isfinite(points_to_smooth["z_raster"].values.astype(float)).any():
+        # without any elevation around the chunk there is nothing to smooth, its shore points stay without elevation
+        return FinishedPointsOfChunk(
+            filtered_points=core_of_filtered_points,
+            points_along_center_line=gpd.GeoDataFrame(geometry=[], crs=shore_points.crs),
+            shore_points_with_elevation=gpd.GeoDataFrame(
+                {"z_interpolated": np.full(len(shore_points.index), np.nan)},
+                geometry=shore_points.geometry.values,
+                crs=shore_points.crs,
+            ),
+        )
+
+    frac_of_chunk = calculate_frac_of_chunk(
+        parameters.parameters_for_smoothing,
+        parameters.sampling_distance,
+        chunk.end_chainage_with_overlap - chunk.start_chainage_with_overlap,
+    )
+    _, interpolated_points_along_center_line_with_center_line = interpolate_smoothed_elevations_along_center_line(
+        PointsPerCenterline(points_to_smooth, chunk.center_line),
+        frac_of_chunk,
+        parameters.parameters_for_smoothing,
+        parameters.sampling_distance,
+        StageCache(None),
+    )
+    points_along_center_line = interpolated_points_along_center_line_with_center_line.projected_points
+    transects = trim_intersecting_parts_of_transects(
+        calculate_transects(points_along_center_line, parameters.line_length)
+    )
+    shore_points_with_elevation = interpolate_elevations_along_shoreline_of_one_center_line(
+        PointsPerCenterline(shore_points, chunk.center_line),
+        TransectsAndPointsPerCenterLine(transects, interpolated_points_along_center_line_with_center_line),
+        parameters.sampling_distance,
+        parameters.buffer_distance,
+        parameters.parameters_to_assign_elevation_to_points,
+    )
+
+    # the chainages along the part of the center line are turned into chainages along the whole center line. the
+    # core is selected by the sampled chainages, as the projected ones are off by rounding errors at its ends
+    points_along_center_line["distance"] += chunk.start_chainage_with_overlap
+    points_along_center_line["chainage"] += chunk.start_chainage_with_overlap
+    is_in_core = chunk.is_in_core(points_along_center_line["chainage"].values)
+    return FinishedPointsOfChunk(
+        filtered_points=core_of_filtered_points,
+        points_along_center_line=points_along_center_line[is_in_core].reset_index(drop=True),
+        shore_points_with_elevation=shore_points_with_elevation,
+    )
+
+
+def stream_shore_points_of_one_scenario(
+    parameters: ParametersForOneProcess, paths: PathsForOneProcess, intermediate_store: IntermediateStore
+) -> None:
+    # center line by center line and chunk by chunk. the finished points of a chunk are written right away, so only
+    # the shoreline, the center lines and the points around one chunk are held in memory. figures are not rendered
+    scenario = parameters.demanded_scenario.value
+    # fails before anything is loaded if the smoothing window is not given in metres
+    overlap = calculate_overlap_of_chunks(parameters)
+    with measure_stage("loading") as stage:
+        shoreline = load_shoreline(paths.path_to_shoreline)
+        center_lines = load_all_center_lines(paths.paths_to_centerlines)
+        additional_points = None
+        if paths.path_to_additional_points is not None:
+            additional_points = load_data_with_crs_2056(
+                paths.path_to_additional_points,
+                columns=["z_raster"],
+                bbox=calculate_bounds_of_buffered_center_lines(center_lines, parameters.buffer_distance),
+            )
+        stage.record_output(shoreline)
+    center_line_index = CenterLineIndex(center_lines, parameters.buffer_distance)
+    memory_ceiling = MemoryCeiling(parameters.parameters_for_streaming)
+    for i, center_line in enumerate(center_lines):
+        segments_of_center_line = LineSegments.from_line(center_line.geometry.iloc[0])
+        with measure_stage(f"center_line_{i}") as stage, intermediate_store.open_writer(
+            "filtered_open_dsm_points", scenario, center_line_id=i
+        ) as filtered_points_writer, intermediate_store.open_writer(
+            "points_along_center_lines", scenario, center_line_id=i
+        ) as points_along_center_line_writer, intermediate_store.open_writer(
+            "interpolated_shore_line_points", scenario, center_line_id=i
+        ) as shore_points_writer:
+            for chunk in split_center_line_into_chunks(
+                center_line,
+                i,
+                memory_ceiling,
+                overlap,
+                parameters.sampling_distance,
+                parameters.buffer_distance,
+            ):
+                finished_points = process_one_chunk_of_center_line(
+                    chunk,
+                    shoreline,
+                    additional_points,
+                    center_line_index,
+                    segments_of_center_line,
+                    parameters,
+                    paths.path_to_raster,
+                )
+                filtered_points_writer.write(finished_points.filtered_points)
+                points_along_center_line_writer.write(finished_points.points_along_center_line)
+                shore_points_writer.write(finished_points.shore_points_with_elevation)
+                del finished_points
+                memory_ceiling.check_after_chunk()
+            stage.record_output(number_of_rows=shore_points_writer.number_of_rows)
+        print(f"center line {i}: {shore_points_writer.number_of_rows} shore points written")
+
+
+def main():
+    parameters = create_all_parameters()
+    paths = get_all_paths_for_one_scenario(parameters.demanded_scenario)
+    run_report = start_run_report(
+        f"water_surface_preparation_{parameters.demanded_scenario.value}",
+        is_enabled=parameters.path_to_run_report is not None or parameters.print_run_report,
+        trace_memory=parameters.trace_memory_of_stages,
+    )
+    raster_reader = configure_shared_raster_reader(parameters.raster_block_cache_size_in_megabytes)
+    plot_dispatcher = configure_shared_plot_dispatcher(parameters.plot_mode, parameters.maximal_number_of_plot_workers)
+    configure_loading_cache(parameters.loading_cache_directory)
+    intermediate_store = IntermediateStore(parameters.intermediates_directory)
+    for layer_name in names_of_intermediate_layers:
+        intermediate_store.remove(layer_name, parameters.demanded_scenario.value)
+    if parameters.parameters_for_streaming is not None:
+        with measure_stage("streaming"):
+            stream_shore_points_of_one_scenario(parameters, paths, intermediate_store)
+    else:
+        stage_cache = StageCache(parameters.stage_cache_directory, parameters.stage_cache_size_in_megabytes)
+        with measure_stage("preparation"):
+            points_of_scenario = prepare_points_of_one_scenario(parameters, paths, stage_cache)
+        # center lines processed in worker processes are measured as a whole only
+        with measure_stage("center_lines", points_of_scenario.shoreline_points_per_center_line) as stage:
+            results_per_center_line = process_all_center_lines(
+                points_of_scenario.shoreline_points_per_center_line,
+                points_of_scenario.gps_points_per_line,
+                parameters,
+            )
+            stage.record_output(results_per_center_line)
+        all_shore_line_points_with_elevation = interpolate_elevations_along_shoreline(
+            points_of_scenario, results_per_center_line, parameters
+        )
+        intermediate_store.write(
+            all_shore_line_points_with_elevation, "interpolated_shore_line_points", parameters.demanded_scenario.value
+        )
+    if parameters.export_format is not None:
+        with measure_stage("export"):
+            export_intermediates(
+                intermediate_store,
+                parameters.demanded_scenario,
+                parameters.export_format,
+                parameters.output_directory,
+            )
+    print(f"raster block cache: {raster_reader.statistics()}")
+    with measure_stage("waiting_for_figures"):
+        plot_dispatcher.close()
+    if parameters.path_to_run_report is not None:
+        run_report.write_json(parameters.path_to_run_report)
+    if parameters.print_run_report:
+        run_report.print_table()
+
+
+names_of_intermediate_layers = (
+    "filtered_open_dsm_points",
+    "points_along_center_lines",
+    "interpolated_shore_line_points",
+)
+
+
+def export_intermediates(
+    intermediate_store: IntermediateStore, scenario: Scenario, export_format: ExportFormat, output_directory: str
+) -> None:
+    for layer_name in names_of_intermediate_layers:
+        intermediate_store.export(
+            layer_name,
+            os.path.join(output_directory, f"{layer_name}_{scenario.value}.{export_format.value}"),
+            export_format,
+            scenario.value,
+        )
+
+
+def append_additional_points_if_available(
+    filtered_points_with_elevation,
+    path_to_additional_points: Optional[str],
+    bbox: Optional[tuple[float, float, float, float]] = None,
+):
+    if path_to_additional_points is not None:
+        additional_points = load_data_with_crs_2056(path_to_additional_points, columns=["z_raster"], bbox=bbox)
         filtered_points_with_elevation_and_additional_points = filtered_points_with_elevation.append(additional_points)
     else:
         filtered_points_with_elevation_and_additional_points = filtered_points_with_elevation
@@ -358,7 +867,7 @@ def append_additional_points_if_available(filtered_points_with_elevation, paths)
 
 
 def load_all_center_lines(paths_to_center_lines: Iterable[str]) -> list[gpd.GeoDataFrame]:
-    center_lines = [load_data_with_crs_2056(path) for path in paths_to_center_lines]
+    center_lines = [load_data_with_crs_2056(path, columns=[]) for path in paths_to_center_lines]
     merged_center_lines = []
     for center_line in center_lines:
         merged_lines = ops.linemerge([geom for geom in center_line.geometry])
@@ -369,6 +878,18 @@ def load_all_center_lines(paths_to_center_lines: Iterable[str]) -> list[gpd.GeoD
     return merged_center_lines
 
 
+def calculate_bounds_of_buffered_center_lines(
+    center_lines: Sequence[gpd.GeoDataFrame], buffer_distance: float
+) -> tuple[float, float, float, float]:
+    bounds = np.array([center_line.total_bounds for center_line in center_lines])
+    return (
+        bounds[:, 0].min() - buffer_distance,
+        bounds[:, 1].min() - buffer_distance,
+        bounds[:, 2].max() + buffer_distance,
+        bounds[:, 3].max() + buffer_distance,
+    )
+
+
 def __join_a_line(multiline_string: MultiLineString) -> LineString:
     coordinates = [list(i.coords) for i in multiline_string]
     return shapely.geometry.LineString([coordinate for sublist in coordinates for coordinate in sublist])
@@ -378,46 +899,8 @@ def assign_points_to_center_lines(
     center_lines: Sequence[gpd.GeoDataFrame],
     points: gpd.GeoDataFrame,
     buffer_distance: float,
-    does_have_z_raster: bool = False,
 ) -> list[PointsPerCenterline]:
-    matched_points_per_line = {i: [] for i in range(len(center_lines))}
-    elevation_of_matched_points_per_line = {i: [] for i in range(len(center_lines))}
-
-    buffered_lines = []
-    for line in center_lines:
-        buffered_lines.append(line.buffer(buffer_distance, cap_style=2))
-
-    for index, row in points.iterrows():
-        distances = []
-        if isinstance(row.geometry, Point):
-            for line, buffer in zip((center_line.geometry[0] for center_line in center_lines), buffered_lines):
-                assert isinstance(line, LineString)
-                if buffer.intersects(row.geometry).any():
-                    distances.append(row.geometry.distance(line))
-                else:
-                    distances.append(np.inf)
-            this_point_is_outside_of_all_buffers = np.min(distances) >= np.inf
-            if this_point_is_outside_of_all_buffers:
-                continue
-            matching_index: int = np.argmin(distances)  # noqa
-            matched_points_per_line[matching_index].append(row.geometry)
-            # TODO: check input dataframe with points if there is a z_raster column. Get rid of does have z_raster parameter.
-            z_raster = row["z_raster"] if does_have_z_raster else np.nan
-            elevation_of_matched_points_per_line[matching_index].append(z_raster)
-
-    converted_points = [
-        gpd.GeoDataFrame(
-            {"z_raster": elevation_of_matched_points_per_line[key], "geometry": matched_points_per_line[key]},
-            crs=center_lines[0].crs,
-        )
-        for key in matched_points_per_line.keys()
-    ]
-
-    points_per_center_lines = [
-        PointsPerCenterline(points=points, center_line=center_line)
-        for center_line, points in zip(center_lines, converted_points)
-    ]
-    return points_per_center_lines
+    return CenterLineIndex(center_lines, buffer_distance).assign_points(points)
 
 
 def project_matched_points_on_center_line(
@@ -425,12 +908,9 @@ def project_matched_points_on_center_line(
 ) -> ProjectedPointsPerCenterLine:
     projected_points = matched_points_per_center_line.points.copy()
     if len(matched_points_per_center_line.points.index) > 0:
-        projected_points["geometry"] = projected_points.apply(
-            lambda row: matched_points_per_center_line.center_line.interpolate(
-                matched_points_per_center_line.center_line.project(row.geometry)
-            ),
-            axis=1,
-        )
+        center_line_segments = LineSegments.from_line(matched_points_per_center_line.center_line.geometry[0])
+        snapped_coordinates = center_line_segments.snap(extract_coordinates(projected_points.geometry))
+        projected_points["geometry"] = gpd.points_from_xy(*snapped_coordinates.T, crs=projected_points.crs)
     return ProjectedPointsPerCenterLine(projected_points, matched_points_per_center_line.center_line)
 
 
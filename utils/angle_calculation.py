@@ -1,5 +1,6 @@
 import math
 
+import numpy as np
 from shapely.geometry import Point
 
 
@@ -7,3 +8,9 @@ def angle_between_two_points(pt1: Point, pt2: Point) -> float:
     x_diff = pt2.x - pt1.x
     y_diff = pt2.y - pt1.y
     return math.degrees(math.atan2(y_diff, x_diff))
+
+
+def angles_between_points(
+    first_x: np.ndarray, first_y: np.ndarray, second_x: np.ndarray, second_y: np.ndarray
+) -> np.ndarray:
+    return np.degrees(np.arctan2(np.asarray(second_y) - first_y, np.asarray(second_x) - first_x))
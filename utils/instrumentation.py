@@ -0,0 +1,227 @@
+import ctypes
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields, is_dataclass
+from functools import wraps
+from typing import Any, Callable, ContextManager, Iterator, Optional
+
+import pandas as pd
+
+from utils import T
+
+
+def query_memory_counters_of_windows_process() -> Optional[Any]:
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", ctypes.c_ulong),
+            ("PageFaultCount", ctypes.c_ulong),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def measure_peak_resident_memory_in_megabytes() -> Optional[float]:
+    # peak resident set size of the process so far, None if the platform does not tell
+    if sys.platform == "win32":
+        counters = query_memory_counters_of_windows_process()
+        return counters.PeakWorkingSetSize / 1024**2 if counters is not None else None
+    try:
+        import resource
+    except ImportError:
+        return None
+    # linux reports kilobytes, macos bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def measure_resident_memory_in_megabytes() -> Optional[float]:
+    # current resident set size of the process, None if the platform does not tell
+    if sys.platform == "win32":
+        counters = query_memory_counters_of_windows_process()
+        return counters.WorkingSetSize / 1024**2 if counters is not None else None
+    try:
+        with open("/proc/self/statm") as statm_file:
+            number_of_resident_pages = int(statm_file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return number_of_resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def count_rows(value: Any) -> Optional[int]:
+    # rows of data frames, summed over lists of them or over the data frames held by a data class
+    if isinstance(value, (str, bytes)):
+        return None
+    if isinstance(value, pd.DataFrame):
+        return len(value.index)
+    if isinstance(value, (list, tuple)):
+        counts = [count_rows(element) for element in value]
+        if counts and all(count is not None for count in counts):
+            return sum(counts)
+        return len(value)
+    if is_dataclass(value) and not isinstance(value, type):
+        for field in fields(value):
+            if isinstance(getattr(value, field.name), pd.DataFrame):
+                return len(getattr(value, field.name).index)
+    if hasattr(value, "__len__"):
+        return len(value)
+    return None
+
+
+@dataclass(frozen=True)
+class StageMeasurement:
+    name: str
+    depth: int
+    wall_seconds: float
+    cpu_seconds: float
+    peak_resident_memory_in_megabytes: Optional[float]
+    increase_of_peak_resident_memory_in_megabytes: Optional[float]
+    peak_traced_memory_in_megabytes: Optional[float]
+    number_of_input_rows: Optional[int]
+    number_of_output_rows: Optional[int]
+
+
+class StageRecorder:
+    def __init__(self):
+        self.number_of_output_rows: Optional[int] = None
+
+    def record_output(self, value: T = None, number_of_rows: Optional[int] = None) -> T:
+        # the rows are counted from the value, unless their number is given, e.g. for rows written instead of kept
+        self.number_of_output_rows = count_rows(value) if number_of_rows is None else number_of_rows
+        return value
+
+
+class RunReport:
+    # collects one measurement per stage of a run. a disabled report measures nothing, so the stages cost only a
+    # function call. traced memory (tracemalloc) slows python allocations down and has to be asked for explicitly.
+    def __init__(self, run_name: str, is_enabled: bool = True, trace_memory: bool = False):
+        self.run_name = run_name
+        self.is_enabled = is_enabled
+        self.trace_memory = trace_memory and is_enabled
+        # measurements are in the order in which the stages started, nested stages follow the enclosing one
+        self.measurements: list[Optional[StageMeasurement]] = []
+        self._depth = 0
+        # absolute traced peaks of the open stages, innermost last. tracemalloc has one peak for the whole process,
+        # which every stage resets when it starts, so the peaks seen so far are kept for the enclosing stages
+        self._traced_peaks_of_open_stages: list[int] = []
+        self._started_at = time.time()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, *inputs: Any) -> Iterator[StageRecorder]:
+        recorder = StageRecorder()
+        if not self.is_enabled:
+            yield recorder
+            return
+        number_of_input_rows = sum(count_rows(value) or 0 for value in inputs) if inputs else None
+        peak_memory_before = measure_peak_resident_memory_in_megabytes()
+        if self.trace_memory:
+            traced_memory_before, traced_peak_so_far = tracemalloc.get_traced_memory()
+            if self._traced_peaks_of_open_stages:
+                self._traced_peaks_of_open_stages[-1] = max(self._traced_peaks_of_open_stages[-1], traced_peak_so_far)
+            self._traced_peaks_of_open_stages.append(traced_memory_before)
+            tracemalloc.reset_peak()
+        index_of_measurement = len(self.measurements)
+        self.measurements.append(None)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        self._depth += 1
+        try:
+            yield recorder
+        finally:
+            self._depth -= 1
+            wall_seconds, cpu_seconds = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            peak_traced_memory = None
+            if self.trace_memory:
+                _, traced_peak_since_reset = tracemalloc.get_traced_memory()
+                traced_memory_peak = max(self._traced_peaks_of_open_stages.pop(), traced_peak_since_reset)
+                if self._traced_peaks_of_open_stages:
+                    self._traced_peaks_of_open_stages[-1] = max(
+                        self._traced_peaks_of_open_stages[-1], traced_memory_peak
+                    )
+                peak_traced_memory = (traced_memory_peak - traced_memory_before) / 1024**2
+            peak_memory_after = measure_peak_resident_memory_in_megabytes()
+            self.measurements[index_of_measurement] = StageMeasurement(
+                name=name,
+                depth=self._depth,
+                wall_seconds=wall_seconds,
+                cpu_seconds=cpu_seconds,
+                peak_resident_memory_in_megabytes=peak_memory_after,
+                increase_of_peak_resident_memory_in_megabytes=(
+                    peak_memory_after - peak_memory_before if peak_memory_after is not None else None
+                ),
+                peak_traced_memory_in_megabytes=peak_traced_memory,
+                number_of_input_rows=number_of_input_rows,
+                number_of_output_rows=recorder.number_of_output_rows,
+            )
+
+    def to_data_frame(self) -> pd.DataFrame:
+        return pd.DataFrame([asdict(measurement) for measurement in self.measurements if measurement is not None])
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "run_name": self.run_name,
+            "started_at": self._started_at,
+            "stages": [asdict(measurement) for measurement in self.measurements if measurement is not None],
+        }
+
+    def write_json(self, path_to_report: str) -> None:
+        if not self.is_enabled:
+            return
+        with open(path_to_report, "w") as report_file:
+            json.dump(self.to_dict(), report_file, indent=2)
+
+    def print_table(self) -> None:
+        if not self.is_enabled or not self.measurements:
+            return
+        table = self.to_data_frame()
+        # the nesting of the stages is shown by indenting their names
+        table["name"] = ["  " * depth + name for depth, name in zip(table["depth"], table["name"])]
+        print(table.drop(columns="depth").to_string(index=False, float_format="{:.3f}".format))
+
+
+_current_run_report = RunReport("disabled", is_enabled=False)
+
+
+def start_run_report(run_name: str, is_enabled: bool = True, trace_memory: bool = False) -> RunReport:
+    global _current_run_report
+    _current_run_report = RunReport(run_name, is_enabled, trace_memory)
+    return _current_run_report
+
+
+def get_current_run_report() -> RunReport:
+    return _current_run_report
+
+
+def measure_stage(name: str, *inputs: Any) -> ContextManager[StageRecorder]:
+    # measures the stage in the report of the current run, the input rows are counted from the given inputs
+    return _current_run_report.stage(name, *inputs)
+
+
+def measured(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    # decorator, the input rows are counted from the positional arguments and the output rows from the result
+    def decorate(function: Callable[..., T]) -> Callable[..., T]:
+        @wraps(function)
+        def measured_function(*arguments, **keyword_arguments) -> T:
+            with measure_stage(name, *arguments) as recorder:
+                return recorder.record_output(function(*arguments, **keyword_arguments))
+
+        return measured_function
+
+    return decorate
@@ -0,0 +1,285 @@
+import glob
+import json
+import os
+from enum import Enum
+from typing import Optional, Sequence, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+class ExportFormat(Enum):
+    shapefile = "shp"
+    geopackage = "gpkg"
+
+
+drivers_per_export_format = {ExportFormat.shapefile: "ESRI Shapefile", ExportFormat.geopackage: "GPKG"}
+
+# well known binary of a two dimensional point: byte order (1 for little endian), geometry type (1), x and y.
+# points are encoded and decoded with numpy, as shapely converts one geometry at a time.
+wkb_point_dtype = np.dtype([("byte_order", "u1"), ("geometry_type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+
+
+def extract_coordinates_of_two_dimensional_points(geometries: gpd.GeoSeries) -> Optional[np.ndarray]:
+    # x and y columns in one pass over the geometries, None if they are not all two dimensional points
+    if len(geometries) == 0 or not (geometries.geom_type == "Point").all():
+        return None
+    coordinates = np.array([point.coords[0] for point in geometries.values])
+    return coordinates if coordinates.ndim == 2 and coordinates.shape[1] == 2 else None
+
+
+def encode_points_as_wkb(x: np.ndarray, y: np.ndarray) -> pa.Array:
+    encoded_points = np.empty(len(x), dtype=wkb_point_dtype)
+    encoded_points["byte_order"] = 1
+    encoded_points["geometry_type"] = 1
+    encoded_points["x"] = x
+    encoded_points["y"] = y
+    offsets = np.arange(len(x) + 1, dtype=np.int32) * wkb_point_dtype.itemsize
+    return pa.Array.from_buffers(
+        pa.binary(), len(x), [None, pa.py_buffer(offsets), pa.py_buffer(encoded_points.tobytes())]
+    )
+
+
+def decode_points_from_wkb(encoded_geometries: pa.ChunkedArray) -> Optional[np.ndarray]:
+    # x and y columns, None if there is anything else than two dimensional points in little endian byte order
+    encoded_geometries = encoded_geometries.combine_chunks()
+    if encoded_geometries.null_count > 0 or not pa.types.is_binary(encoded_geometries.type):
+        return None
+    _, offsets_buffer, values_buffer = encoded_geometries.buffers()
+    offsets = np.frombuffer(
+        offsets_buffer, dtype=np.int32, count=len(encoded_geometries) + 1, offset=4 * encoded_geometries.offset
+    )
+    if not np.all(np.diff(offsets) == wkb_point_dtype.itemsize):
+        return None
+    decoded_points = np.frombuffer(
+        values_buffer, dtype=wkb_point_dtype, count=len(encoded_geometries), offset=int(offsets[0])
+    )
+    if not np.all((decoded_points["byte_order"] == 1) & (decoded_points["geometry_type"] == 1)):
+        return None
+    return np.column_stack([decoded_points["x"], decoded_points["y"]])
+
+
+def create_geo_metadata(
+    points: gpd.GeoDataFrame, bounds: Optional[list[float]], geometry_type: Union[str, list[str]] = "Point"
+) -> bytes:
+    # GeoParquet metadata of version 0.1.0, which older and newer geopandas versions read. the bbox is optional
+    metadata_of_geometry_column = {
+        "encoding": "WKB",
+        "crs": points.crs.to_wkt() if points.crs is not None else None,
+        "geometry_type": geometry_type,
+    }
+    if bounds is not None:
+        metadata_of_geometry_column["bbox"] = bounds
+    return json.dumps(
+        {
+            "primary_column": points.geometry.name,
+            "columns": {points.geometry.name: metadata_of_geometry_column},
+            "version": "0.1.0",
+            "schema_version": "0.1.0",
+            "creator": {"library": "geopandas", "version": gpd.__version__},
+        }
+    ).encode()
+
+
+def write_geo_parquet(points: gpd.GeoDataFrame, path: str, compression: str) -> None:
+    coordinates = extract_coordinates_of_two_dimensional_points(points.geometry)
+    if coordinates is None:
+        points.to_parquet(path, index=False, compression=compression)
+        return
+    x, y = coordinates[:, 0], coordinates[:, 1]
+    bounds = [float(x.min()), float(y.min()), float(x.max()), float(y.max())]
+    pq.write_table(convert_points_to_table(points, coordinates, bounds), path, compression=compression)
+
+
+def convert_points_to_table(
+    points: gpd.GeoDataFrame, coordinates: Optional[np.ndarray], bounds: Optional[list[float]]
+) -> pa.Table:
+    # without the coordinates of two dimensional points, every geometry is encoded by shapely on its own
+    table = pa.Table.from_pandas(pd.DataFrame(points.drop(columns=points.geometry.name)), preserve_index=False)
+    if coordinates is not None:
+        encoded_geometries, geometry_type = encode_points_as_wkb(coordinates[:, 0], coordinates[:, 1]), "Point"
+    else:
+        encoded_geometries = pa.array(
+            [geometry.wkb if geometry is not None else None for geometry in points.geometry.values], pa.binary()
+        )
+        geometry_type = sorted(points.geom_type.dropna().unique())
+    table = table.append_column(points.geometry.name, encoded_geometries)
+    geo_metadata = create_geo_metadata(points, bounds, geometry_type)
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b"geo": geo_metadata})
+
+
+def read_geo_parquet(path: str, columns: Optional[Sequence[str]] = None) -> gpd.GeoDataFrame:
+    # only the given columns are read, the geometry column is always among them
+    geo_metadata = json.loads(pq.read_schema(path).metadata[b"geo"])
+    geometry_name = geo_metadata["primary_column"]
+    if columns is not None:
+        columns = list(columns) + ([geometry_name] if geometry_name not in columns else [])
+    table = pq.read_table(path, columns=columns)
+    coordinates = decode_points_from_wkb(table.column(geometry_name))
+    if coordinates is None:
+        return gpd.read_parquet(path, columns=columns)
+    points = table.drop([geometry_name]).to_pandas()
+    points[geometry_name] = gpd.points_from_xy(coordinates[:, 0], coordinates[:, 1])
+    return gpd.GeoDataFrame(points, geometry=geometry_name, crs=geo_metadata["columns"][geometry_name]["crs"])
+
+
+class GeoParquetPartitionWriter:
+    # appends batches of points to one partition, every batch as its own row group, so a layer is written without
+    # ever holding all of its points. the partition is only published when the writer is closed without error.
+    # the batches have to have the columns and types of the first one.
+    def __init__(self, path_to_partition: str, compression: str):
+        self.path_to_partition = path_to_partition
+        self.compression = compression
+        self.number_of_rows = 0
+        self._temporary_path_to_partition = f"{path_to_partition}.{os.getpid()}.part"
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._empty_points: Optional[gpd.GeoDataFrame] = None
+
+    def write(self, points: gpd.GeoDataFrame) -> None:
+        if self._empty_points is None:
+            self._empty_points = points.iloc[:0]
+        if len(points.index) == 0:
+            return
+        # the bounds of all batches are not known before the last one, the bbox is left out
+        table = convert_points_to_table(
+            points, extract_coordinates_of_two_dimensional_points(points.geometry), bounds=None
+        )
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path_to_partition), exist_ok=True)
+            self._writer = pq.ParquetWriter(
+                self._temporary_path_to_partition, table.schema, compression=self.compression
+            )
+        self._writer.write_table(table.cast(self._writer.schema))
+        self.number_of_rows += len(points.index)
+
+    def close(self) -> None:
+        # a partition without any point is written like an empty layer of the store, one without any batch not at all
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self._empty_points is not None:
+            os.makedirs(os.path.dirname(self.path_to_partition), exist_ok=True)
+            write_geo_parquet(self._empty_points, self._temporary_path_to_partition, self.compression)
+        else:
+            return
+        os.replace(self._temporary_path_to_partition, self.path_to_partition)
+
+    def discard(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self._temporary_path_to_partition):
+            os.remove(self._temporary_path_to_partition)
+
+    def __enter__(self) -> "GeoParquetPartitionWriter":
+        return self
+
+    def __exit__(self, exception_type, exception, traceback) -> None:
+        if exception_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class IntermediateStore:
+    # intermediate layers are written as compressed GeoParquet (geometries as WKB), one dataset per layer that is
+    # partitioned by scenario and center line like a hive table: <layer>/scenario=<s>/centerline=<i>/part.parquet.
+    # the partitions are added as columns when read. shapefiles or geopackages are only written by export.
+    def __init__(self, directory: str, compression: str = "zstd"):
+        self.directory = directory
+        self.compression = compression
+
+    def create_path_of_partition(self, layer_name: str, scenario: str, center_line_id: Optional[int] = None) -> str:
+        path_of_partition = os.path.join(self.directory, layer_name, f"scenario={scenario}")
+        if center_line_id is not None:
+            path_of_partition = os.path.join(path_of_partition, f"centerline={center_line_id}")
+        return os.path.join(path_of_partition, "part.parquet")
+
+    def write(
+        self, points: gpd.GeoDataFrame, layer_name: str, scenario: str, center_line_id: Optional[int] = None
+    ) -> str:
+        path_to_partition = self.create_path_of_partition(layer_name, scenario, center_line_id)
+        os.makedirs(os.path.dirname(path_to_partition), exist_ok=True)
+        # written to a temporary file first, so readers never see a partial partition
+        temporary_path_to_partition = f"{path_to_partition}.{os.getpid()}.part"
+        write_geo_parquet(points, temporary_path_to_partition, self.compression)
+        os.replace(temporary_path_to_partition, path_to_partition)
+        return path_to_partition
+
+    def open_writer(
+        self, layer_name: str, scenario: str, center_line_id: Optional[int] = None
+    ) -> GeoParquetPartitionWriter:
+        return GeoParquetPartitionWriter(
+            self.create_path_of_partition(layer_name, scenario, center_line_id), self.compression
+        )
+
+    def remove(self, layer_name: str, scenario: str) -> None:
+        # partitions of an earlier run, which may be partitioned differently, are not read together with new ones
+        for path_to_partition in self.find_partitions(layer_name, scenario):
+            os.remove(path_to_partition)
+
+    def find_partitions(
+        self, layer_name: str, scenario: Optional[str] = None, center_line_id: Optional[int] = None
+    ) -> list[str]:
+        pattern = os.path.join(
+            self.directory,
+            layer_name,
+            f"scenario={'*' if scenario is None else scenario}",
+            "**",
+            "part.parquet",
+        )
+        paths_to_partitions = sorted(glob.glob(pattern, recursive=True))
+        if center_line_id is not None:
+            paths_to_partitions = [
+                path for path in paths_to_partitions if f"centerline={center_line_id}" in path.split(os.sep)
+            ]
+        return paths_to_partitions
+
+    def read(
+        self,
+        layer_name: str,
+        scenario: Optional[str] = None,
+        center_line_id: Optional[int] = None,
+        columns: Optional[Sequence[str]] = None,
+    ) -> gpd.GeoDataFrame:
+        partitions = [
+            self.read_partition(path_to_partition, columns)
+            for path_to_partition in self.find_partitions(layer_name, scenario, center_line_id)
+        ]
+        if not partitions:
+            raise FileNotFoundError(f"no partitions of {layer_name} in {self.directory}")
+        return gpd.GeoDataFrame(pd.concat(partitions, ignore_index=True), crs=partitions[0].crs)
+
+    @staticmethod
+    def read_partition(path_to_partition: str, columns: Optional[Sequence[str]] = None) -> gpd.GeoDataFrame:
+        partition = read_geo_parquet(path_to_partition, columns)
+        for directory_name in path_to_partition.split(os.sep):
+            if "=" in directory_name:
+                key, value = directory_name.split("=", 1)
+                partition[key] = int(value) if key == "centerline" else value
+        return partition
+
+    def export(
+        self,
+        layer_name: str,
+        path_to_export: str,
+        export_format: ExportFormat = ExportFormat.geopackage,
+        scenario: Optional[str] = None,
+    ) -> None:
+        # partition by partition, so the export holds the points of one partition at most. empty partitions are
+        # skipped, they may have fewer columns than the others (e.g. a center line without any elevation) and the
+        # partitions are appended to one layer
+        paths_to_partitions = self.find_partitions(layer_name, scenario)
+        if not paths_to_partitions:
+            raise FileNotFoundError(f"no partitions of {layer_name} in {self.directory}")
+        is_first_partition = True
+        for path_to_partition in paths_to_partitions:
+            if pq.ParquetFile(path_to_partition).metadata.num_rows == 0:
+                continue
+            self.read_partition(path_to_partition).to_file(
+                path_to_export, driver=drivers_per_export_format[export_format], mode="w" if is_first_partition else "a"
+            )
+            is_first_partition = False
@@ -0,0 +1,139 @@
+from dataclasses import dataclass
+from itertools import chain
+
+import geopandas as gpd
+import numpy as np
+from scipy.spatial import cKDTree
+from shapely.geometry import LineString
+
+
+def extract_coordinates(points: gpd.GeoSeries) -> np.ndarray:
+    return np.column_stack([points.x.values, points.y.values]) if len(points) > 0 else np.empty((0, 2))
+
+
+@dataclass(frozen=True)
+class LineSegments:
+    start_coordinates: np.ndarray
+    vectors: np.ndarray
+    lengths: np.ndarray
+    start_chainages: np.ndarray
+    midpoint_tree: cKDTree
+    half_of_longest_length: float
+
+    @classmethod
+    def from_line(cls, line: LineString) -> "LineSegments":
+        coordinates = np.asarray(line.coords)[:, :2]
+        vectors = np.diff(coordinates, axis=0)
+        lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+        return cls(
+            start_coordinates=coordinates[:-1],
+            vectors=vectors,
+            lengths=lengths,
+            start_chainages=np.concatenate([[0.0], np.cumsum(lengths)[:-1]]),
+            midpoint_tree=cKDTree(coordinates[:-1] + vectors / 2),
+            half_of_longest_length=lengths.max() / 2 if len(lengths) > 0 else 0.0,
+        )
+
+    @property
+    def number_of_segments(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def length(self) -> float:
+        return float(self.start_chainages[-1] + self.lengths[-1]) if self.number_of_segments > 0 else 0.0
+
+    def find_candidate_pairs(
+        self, coordinates: np.ndarray, search_radii: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # every segment closer than the search radius to a point is part of the returned (point, segment) pairs
+        segments_per_point = self.midpoint_tree.query_ball_point(
+            coordinates, r=search_radii + self.half_of_longest_length
+        )
+        number_of_segments_per_point = np.fromiter(map(len, segments_per_point), dtype=np.intp)
+        segment_indices = np.fromiter(chain.from_iterable(segments_per_point), dtype=np.intp)
+        point_indices = np.repeat(np.arange(len(coordinates)), number_of_segments_per_point)
+        return point_indices, segment_indices
+
+    def measure_pairs(
+        self, coordinates: np.ndarray, point_indices: np.ndarray, segment_indices: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # returns the (unclamped) position of the perpendicular foot as fraction of the segment and the distance
+        # from the point to the segment
+        offsets = coordinates[point_indices] - self.start_coordinates[segment_indices]
+        vectors = self.vectors[segment_indices]
+        squared_lengths = self.lengths[segment_indices] ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fractions = np.einsum("ij,ij->i", offsets, vectors) / squared_lengths
+        fractions = np.nan_to_num(fractions, nan=0.0, posinf=0.0, neginf=0.0)
+        closest_offsets = offsets - np.clip(fractions, 0.0, 1.0)[:, None] * vectors
+        return fractions, np.hypot(closest_offsets[:, 0], closest_offsets[:, 1])
+
+    def find_closest_segments(
+        self, coordinates: np.ndarray, number_of_nearest_midpoints: int = 8
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # closest segment, fraction along it and distance for every point. the closest segment is at most as far
+        # away as the closest segment midpoint, so only segments with a midpoint within that distance plus half of
+        # the longest segment can be closer. if the k nearest midpoints already reach beyond that bound they are
+        # the complete candidate set, otherwise the point falls back to a radius query.
+        # ties go to the first segment like in GEOS.
+        number_of_nearest_midpoints = min(number_of_nearest_midpoints, self.number_of_segments)
+        midpoint_distances, nearest_segments = self.midpoint_tree.query(coordinates, k=number_of_nearest_midpoints)
+        midpoint_distances = midpoint_distances.reshape(len(coordinates), -1)
+        nearest_segments = nearest_segments.reshape(len(coordinates), -1)
+        search_bounds = midpoint_distances[:, 0] + self.half_of_longest_length
+        are_nearest_complete = (midpoint_distances[:, -1] > search_bounds) | (
+            number_of_nearest_midpoints == self.number_of_segments
+        )
+        closest_segments = np.empty(len(coordinates), dtype=np.intp)
+        closest_fractions = np.empty(len(coordinates))
+        closest_distances = np.empty(len(coordinates))
+
+        complete_points = np.flatnonzero(are_nearest_complete)
+        segment_indices = nearest_segments[complete_points]
+        fractions, distances = self.measure_pairs(
+            coordinates, np.repeat(complete_points, number_of_nearest_midpoints), segment_indices.ravel()
+        )
+        fractions = fractions.reshape(segment_indices.shape)
+        distances = distances.reshape(segment_indices.shape)
+        is_closest = distances == distances.min(axis=1, initial=np.inf)[:, None]
+        first_closest_segments = np.where(is_closest, segment_indices, self.number_of_segments).min(axis=1)
+        columns_of_closest = np.argmax(segment_indices == first_closest_segments[:, None], axis=1)
+        rows = np.arange(len(complete_points))
+        closest_segments[complete_points] = first_closest_segments
+        closest_fractions[complete_points] = fractions[rows, columns_of_closest]
+        closest_distances[complete_points] = distances[rows, columns_of_closest]
+
+        incomplete_points = np.flatnonzero(~are_nearest_complete)
+        if len(incomplete_points) > 0:
+            point_indices, segment_indices = self.find_candidate_pairs(
+                coordinates[incomplete_points], midpoint_distances[incomplete_points, 0]
+            )
+            fractions, distances = self.measure_pairs(coordinates[incomplete_points], point_indices, segment_indices)
+            order = np.lexsort((segment_indices, distances, point_indices))
+            _, first_of_each_point = np.unique(point_indices[order], return_index=True)
+            closest_pairs = order[first_of_each_point]
+            closest_segments[incomplete_points] = segment_indices[closest_pairs]
+            closest_fractions[incomplete_points] = fractions[closest_pairs]
+            closest_distances[incomplete_points] = distances[closest_pairs]
+        return closest_segments, np.clip(closest_fractions, 0.0, 1.0), closest_distances
+
+    def project(self, coordinates: np.ndarray) -> np.ndarray:
+        # vectorized LineString.project: distance from the line origin to the closest point on the line
+        if len(coordinates) == 0 or self.number_of_segments == 0:
+            return np.zeros(len(coordinates))
+        segment_indices, fractions, _ = self.find_closest_segments(coordinates)
+        return self.start_chainages[segment_indices] + fractions * self.lengths[segment_indices]
+
+    def interpolate(self, chainages: np.ndarray) -> np.ndarray:
+        # vectorized LineString.interpolate for chainages between 0 and the length of the line
+        chainages = np.clip(np.asarray(chainages, dtype=float), 0.0, self.length)
+        segment_indices = np.clip(
+            np.searchsorted(self.start_chainages, chainages, side="right") - 1, 0, self.number_of_segments - 1
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fractions = (chainages - self.start_chainages[segment_indices]) / self.lengths[segment_indices]
+        fractions = np.clip(np.nan_to_num(fractions, nan=0.0), 0.0, 1.0)
+        return self.start_coordinates[segment_indices] + fractions[:, None] * self.vectors[segment_indices]
+
+    def snap(self, coordinates: np.ndarray) -> np.ndarray:
+        return self.interpolate(self.project(coordinates))
@@ -1,20 +1,110 @@
+import glob
+import hashlib
+import os
+import pickle
+from typing import Optional, Sequence
+
+import fiona
 import geopandas as gpd
 
+from utils.raster_sidecar import create_fingerprint_of_source
+
+# parsed layers are cached as pickles in this directory, keyed by the fingerprints of the files of the layer and the
+# filters it was read with. None reads every layer from its source.
+_loading_cache_directory: Optional[str] = None
+
+
+def configure_loading_cache(directory: Optional[str]) -> None:
+    global _loading_cache_directory
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    _loading_cache_directory = directory
+
 
 def check_that_all_geometries_are_set(loaded_data: gpd.GeoDataFrame) -> bool:
-    return all(geom is not None for geom in loaded_data.geometry)
+    return not loaded_data.geometry.isna().any()
 
 
 def check_that_all_geometries_are_the_same(loaded_data: gpd.GeoDataFrame) -> bool:
-    first_geom = loaded_data.geometry[0]
-    return all(isinstance(geom, first_geom.__class__) is not None for geom in loaded_data.geometry)
+    # multi part geometries count as their single part type, as a shapefile layer mixes both
+    return loaded_data.geom_type.str.replace("Multi", "", regex=False).nunique() <= 1
+
+
+def find_files_of_layer(path_to_data: str) -> list[str]:
+    # a shapefile is read together with its .dbf, .shx, .prj and .cpg files
+    if not path_to_data.lower().endswith(".shp"):
+        return [path_to_data]
+    return sorted(glob.glob(f"{glob.escape(os.path.splitext(path_to_data)[0])}.*"))
 
 
-def load_data_with_crs_2056(path_to_data: str) -> gpd.geodataframe:
-    loaded_data = gpd.read_file(path_to_data)
+def create_keys_of_cached_layer(
+    path_to_data: str, columns: Optional[Sequence[str]], bbox: Optional[tuple[float, float, float, float]]
+) -> tuple[str, str]:
+    # the first key identifies the layer and its filters, the second one the state of its files
+    key_of_layer = hashlib.sha256(
+        repr((os.path.abspath(path_to_data), columns, bbox, gpd.__version__)).encode()
+    ).hexdigest()[:16]
+    fingerprints = [
+        (path, sorted(create_fingerprint_of_source(path).items())) for path in find_files_of_layer(path_to_data)
+    ]
+    key_of_files = hashlib.sha256(repr(fingerprints).encode()).hexdigest()[:16]
+    return f"{os.path.basename(path_to_data)}-{key_of_layer}", key_of_files
+
+
+def read_layer(
+    path_to_data: str, columns: Optional[Sequence[str]], bbox: Optional[tuple[float, float, float, float]]
+) -> gpd.GeoDataFrame:
+    # fields that are not asked for are skipped by the reader, asked for columns the layer does not have are left out
+    keyword_arguments = {}
+    if columns is not None:
+        with fiona.open(path_to_data) as layer:
+            keyword_arguments["ignore_fields"] = [name for name in layer.schema["properties"] if name not in columns]
+    loaded_data = gpd.read_file(path_to_data, bbox=bbox, **keyword_arguments)
+    if columns is not None:
+        columns_of_layer = [name for name in columns if name in loaded_data.columns]
+        loaded_data = loaded_data[columns_of_layer + [loaded_data.geometry.name]]
+    return loaded_data
+
+
+def load_data_with_crs_2056(
+    path_to_data: str,
+    columns: Optional[Sequence[str]] = None,
+    bbox: Optional[tuple[float, float, float, float]] = None,
+) -> gpd.GeoDataFrame:
+    # columns None reads all columns, bbox (minx, miny, maxx, maxy) keeps the features whose bounds intersect it
+    if columns is not None:
+        columns = list(columns)
+    if bbox is not None:
+        bbox = tuple(float(bound) for bound in bbox)
+    if _loading_cache_directory is not None:
+        key_of_layer, key_of_files = create_keys_of_cached_layer(path_to_data, columns, bbox)
+        path_to_cached_layer = os.path.join(_loading_cache_directory, f"{key_of_layer}-{key_of_files}.pkl")
+        try:
+            with open(path_to_cached_layer, "rb") as cached_layer_file:
+                return pickle.load(cached_layer_file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+    loaded_data = read_layer(path_to_data, columns, bbox)
     if loaded_data.crs is None:
         loaded_data.crs = 2056
     assert check_that_all_geometries_are_set(loaded_data)
     assert check_that_all_geometries_are_the_same(loaded_data)
     assert loaded_data.crs == 2056
+    if _loading_cache_directory is not None:
+        store_cached_layer(loaded_data, path_to_cached_layer, key_of_layer)
     return loaded_data
+
+
+def store_cached_layer(loaded_data: gpd.GeoDataFrame, path_to_cached_layer: str, key_of_layer: str) -> None:
+    # written to a temporary file first, so concurrent readers never see a partial layer. the layer cached for
+    # previous states of its files is deleted
+    temporary_path_to_cached_layer = f"{path_to_cached_layer}.{os.getpid()}.part"
+    with open(temporary_path_to_cached_layer, "wb") as cached_layer_file:
+        pickle.dump(loaded_data, cached_layer_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path_to_cached_layer, path_to_cached_layer)
+    for path in glob.glob(os.path.join(glob.escape(_loading_cache_directory), f"{glob.escape(key_of_layer)}-*.pkl")):
+        if path != path_to_cached_layer:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
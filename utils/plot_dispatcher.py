@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Iterable, Iterator, Optional
+
+
+class PlotMode(Enum):
+    synchronous = "synchronous"
+    background = "background"
+    disabled = "disabled"
+
+
+@dataclass(frozen=True)
+class PlotJob:
+    # the render function has to be defined at module level and the arguments should be the few arrays the figure
+    # needs, so the job is cheap to send to another process
+    function: Callable[..., None]
+    arguments: tuple
+
+
+def render_plot_job(job: PlotJob) -> None:
+    job.function(*job.arguments)
+
+
+def use_non_interactive_backend() -> None:
+    # figures of background processes are only saved, never shown
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+class PlotDispatcher:
+    # renders figures right away, in background processes or not at all. the plotting functions check is_enabled
+    # before they extract the arrays of a figure, so disabled plots cost nothing.
+    def __init__(self, mode: PlotMode = PlotMode.synchronous, maximal_number_of_workers: int = 1):
+        self.mode = mode
+        self.maximal_number_of_workers = maximal_number_of_workers
+        self.number_of_failed_jobs = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending_futures: list[Future] = []
+        self._collected_jobs: Optional[list[PlotJob]] = None
+        # a forked process inherits the dispatcher, but not the processes and threads behind its executor
+        self._process_id = os.getpid()
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.mode != PlotMode.disabled
+
+    def submit(self, function: Callable[..., None], *arguments) -> None:
+        if not self.is_enabled:
+            return
+        job = PlotJob(function, arguments)
+        if self._collected_jobs is not None:
+            self._collected_jobs.append(job)
+        elif self.mode == PlotMode.synchronous:
+            render_plot_job(job)
+        else:
+            self._pending_futures = [future for future in self._pending_futures if not future.done()]
+            self._pending_futures.append(self._get_executor().submit(render_plot_job, job))
+
+    def submit_jobs(self, jobs: Iterable[PlotJob]) -> None:
+        for job in jobs:
+            self.submit(job.function, *job.arguments)
+
+    @contextmanager
+    def collect_jobs(self) -> Iterator[list[PlotJob]]:
+        # jobs submitted within are kept instead of rendered, e.g. in a worker process that hands them to its parent
+        collected_jobs: list[PlotJob] = []
+        previously_collected_jobs, self._collected_jobs = self._collected_jobs, collected_jobs
+        try:
+            yield collected_jobs
+        finally:
+            self._collected_jobs = previously_collected_jobs
+
+    def wait_for_all(self) -> None:
+        # a failed figure is reported, but does not fail the run whose results are already computed
+        pending_futures, self._pending_futures = self._pending_futures, []
+        for future in wait(pending_futures).done:
+            if future.exception() is not None:
+                self.number_of_failed_jobs += 1
+                print(f"rendering a figure failed: {future.exception()!r}")
+
+    def close(self) -> None:
+        if self._process_id != os.getpid():
+            self._pending_futures, self._executor = [], None
+            return
+        self.wait_for_all()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._process_id != os.getpid():
+            self._pending_futures, self._executor, self._process_id = [], None, os.getpid()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.maximal_number_of_workers, initializer=use_non_interactive_backend
+            )
+        return self._executor
+
+
+_shared_plot_dispatcher: Optional[PlotDispatcher] = None
+
+
+def get_shared_plot_dispatcher() -> PlotDispatcher:
+    global _shared_plot_dispatcher
+    if _shared_plot_dispatcher is None:
+        _shared_plot_dispatcher = PlotDispatcher()
+    return _shared_plot_dispatcher
+
+
+def configure_shared_plot_dispatcher(mode: PlotMode, maximal_number_of_workers: int = 1) -> PlotDispatcher:
+    global _shared_plot_dispatcher
+    if _shared_plot_dispatcher is not None:
+        _shared_plot_dispatcher.close()
+    _shared_plot_dispatcher = PlotDispatcher(mode, maximal_number_of_workers)
+    return _shared_plot_dispatcher
@@ -0,0 +1,184 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Union
+
+import numpy as np
+import rasterio as rio
+from rasterio import DatasetReader
+from rasterio.windows import Window
+
+from utils.raster_sidecar import MemoryMappedRaster, load_memory_mapped_sidecar_if_fresh
+
+BlockKey = tuple[str, int, int, int]
+
+
+@dataclass(frozen=True)
+class BlockCacheStatistics:
+    hits: int
+    misses: int
+    evictions: int
+    bytes_resident: int
+    maximal_bytes_resident: int
+    number_of_open_rasters: int
+    number_of_memory_mapped_bands: int
+
+    @property
+    def hit_rate(self) -> float:
+        number_of_requests = self.hits + self.misses
+        return self.hits / number_of_requests if number_of_requests > 0 else 0.0
+
+
+class CachedRasterReader:
+    # keeps rasters open by path and caches their decoded blocks in a size bounded LRU.
+    # bands with a fresh memory mapped sidecar are read from the sidecar and bypass the LRU.
+    def __init__(self, maximal_cache_size_in_megabytes: float = 512):
+        self._maximal_bytes_resident = int(maximal_cache_size_in_megabytes * 1024**2)
+        self._datasets: dict[str, DatasetReader] = {}
+        self._dataset_locks: dict[str, threading.Lock] = {}
+        self._memory_mapped_bands: dict[tuple[str, int], Optional[MemoryMappedRaster]] = {}
+        self._blocks: OrderedDict[BlockKey, np.ndarray] = OrderedDict()
+        self._bytes_resident = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+
+    def open(self, path_to_raster: str) -> DatasetReader:
+        with self._lock:
+            if path_to_raster not in self._datasets:
+                self._datasets[path_to_raster] = rio.open(path_to_raster)
+                self._dataset_locks[path_to_raster] = threading.Lock()
+            return self._datasets[path_to_raster]
+
+    def open_memory_mapped_band(self, path_to_raster: str, band: int = 1) -> Optional[MemoryMappedRaster]:
+        with self._lock:
+            key = (path_to_raster, band)
+            if key not in self._memory_mapped_bands:
+                self._memory_mapped_bands[key] = load_memory_mapped_sidecar_if_fresh(path_to_raster, band)
+            return self._memory_mapped_bands[key]
+
+    def describe(self, path_to_raster: str, band: int = 1) -> Union[MemoryMappedRaster, DatasetReader]:
+        # both provide transform, height, width and nodata; the sidecar avoids opening the GeoTIFF at all
+        memory_mapped_band = self.open_memory_mapped_band(path_to_raster, band)
+        return memory_mapped_band if memory_mapped_band is not None else self.open(path_to_raster)
+
+    def read_window(self, path_to_raster: str, window: Window, band: int = 1) -> np.ndarray:
+        memory_mapped_band = self.open_memory_mapped_band(path_to_raster, band)
+        if memory_mapped_band is not None:
+            return np.asarray(memory_mapped_band.values[window.toslices()])
+        raster = self.open(path_to_raster)
+        block_height, block_width = raster.block_shapes[band - 1]
+        row_start, column_start = int(window.row_off), int(window.col_off)
+        row_stop, column_stop = row_start + int(window.height), column_start + int(window.width)
+        values_in_window = np.empty((row_stop - row_start, column_stop - column_start), dtype=raster.dtypes[band - 1])
+        if values_in_window.size == 0:
+            return values_in_window
+
+        for block_row in range(row_start // block_height, (row_stop - 1) // block_height + 1):
+            for block_column in range(column_start // block_width, (column_stop - 1) // block_width + 1):
+                block = self._get_block(path_to_raster, raster, band, block_row, block_column)
+                block_row_offset, block_column_offset = block_row * block_height, block_column * block_width
+                rows = slice(max(row_start, block_row_offset), min(row_stop, block_row_offset + block.shape[0]))
+                columns = slice(
+                    max(column_start, block_column_offset), min(column_stop, block_column_offset + block.shape[1])
+                )
+                values_in_window[
+                    rows.start - row_start : rows.stop - row_start,
+                    columns.start - column_start : columns.stop - column_start,
+                ] = block[
+                    rows.start - block_row_offset : rows.stop - block_row_offset,
+                    columns.start - block_column_offset : columns.stop - block_column_offset,
+                ]
+        return values_in_window
+
+    def read_pixels(self, path_to_raster: str, rows: np.ndarray, columns: np.ndarray, band: int = 1) -> np.ndarray:
+        # only the blocks that contain at least one of the (in bounds) pixels are decoded
+        memory_mapped_band = self.open_memory_mapped_band(path_to_raster, band)
+        if memory_mapped_band is not None:
+            return memory_mapped_band.values[rows, columns]
+        raster = self.open(path_to_raster)
+        block_height, block_width = raster.block_shapes[band - 1]
+        number_of_block_columns = -(-raster.width // block_width)
+        block_ids = (rows // block_height) * number_of_block_columns + columns // block_width
+        values = np.empty(len(rows), dtype=raster.dtypes[band - 1])
+        order = np.argsort(block_ids, kind="stable")
+        unique_block_ids, first_positions = np.unique(block_ids[order], return_index=True)
+        for block_id, indices in zip(unique_block_ids, np.split(order, first_positions[1:])):
+            block_row, block_column = divmod(int(block_id), number_of_block_columns)
+            block = self._get_block(path_to_raster, raster, band, block_row, block_column)
+            values[indices] = block[
+                rows[indices] - block_row * block_height, columns[indices] - block_column * block_width
+            ]
+        return values
+
+    def statistics(self) -> BlockCacheStatistics:
+        with self._lock:
+            return BlockCacheStatistics(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                bytes_resident=self._bytes_resident,
+                maximal_bytes_resident=self._maximal_bytes_resident,
+                number_of_open_rasters=len(self._datasets),
+                number_of_memory_mapped_bands=sum(band is not None for band in self._memory_mapped_bands.values()),
+            )
+
+    def resize(self, maximal_cache_size_in_megabytes: float) -> None:
+        with self._lock:
+            self._maximal_bytes_resident = int(maximal_cache_size_in_megabytes * 1024**2)
+            self._evict_until_below_limit()
+
+    def close(self) -> None:
+        with self._lock:
+            for raster in self._datasets.values():
+                raster.close()
+            self._datasets.clear()
+            self._dataset_locks.clear()
+            self._memory_mapped_bands.clear()
+            self._blocks.clear()
+            self._bytes_resident = 0
+
+    def _get_block(
+        self, path_to_raster: str, raster: DatasetReader, band: int, block_row: int, block_column: int
+    ) -> np.ndarray:
+        key = (path_to_raster, band, block_row, block_column)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self._hits += 1
+                return block
+            self._misses += 1
+
+        with self._dataset_locks[path_to_raster]:
+            block = raster.read(band, window=raster.block_window(band, block_row, block_column))
+
+        with self._lock:
+            if key not in self._blocks and block.nbytes <= self._maximal_bytes_resident:
+                self._blocks[key] = block
+                self._bytes_resident += block.nbytes
+                self._evict_until_below_limit()
+        return block
+
+    def _evict_until_below_limit(self) -> None:
+        while self._bytes_resident > self._maximal_bytes_resident and self._blocks:
+            _, evicted_block = self._blocks.popitem(last=False)
+            self._bytes_resident -= evicted_block.nbytes
+            self._evictions += 1
+
+
+_shared_raster_reader: Optional[CachedRasterReader] = None
+
+
+def get_shared_raster_reader() -> CachedRasterReader:
+    global _shared_raster_reader
+    if _shared_raster_reader is None:
+        _shared_raster_reader = CachedRasterReader()
+    return _shared_raster_reader
+
+
+def configure_shared_raster_reader(maximal_cache_size_in_megabytes: float) -> CachedRasterReader:
+    reader = get_shared_raster_reader()
+    reader.resize(maximal_cache_size_in_megabytes)
+    return reader
@@ -0,0 +1,78 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import rasterio as rio
+from affine import Affine
+from rasterio import DatasetReader
+from rasterio.crs import CRS
+
+
+@dataclass(frozen=True)
+class MemoryMappedRaster:
+    values: np.ndarray
+    transform: Affine
+    crs: Optional[CRS]
+    nodata: Optional[float]
+
+    @property
+    def height(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.values.shape[1]
+
+
+def create_sidecar_paths(path_to_raster: str, band: int = 1) -> tuple[str, str]:
+    return f"{path_to_raster}.band{band}.npy", f"{path_to_raster}.band{band}.json"
+
+
+def create_fingerprint_of_source(path_to_raster: str) -> dict[str, int]:
+    status = os.stat(path_to_raster)
+    return {"source_modification_time_ns": status.st_mtime_ns, "source_size_in_bytes": status.st_size}
+
+
+def convert_raster_to_memory_mapped_sidecar(path_to_raster: str, band: int = 1) -> str:
+    path_to_values, path_to_metadata = create_sidecar_paths(path_to_raster, band)
+    temporary_path_to_values = f"{path_to_values}.part.npy"
+    with rio.open(path_to_raster) as raster:
+        raster: DatasetReader
+        values = np.lib.format.open_memmap(
+            temporary_path_to_values, mode="w+", dtype=raster.dtypes[band - 1], shape=(raster.height, raster.width)
+        )
+        for _, window in raster.block_windows(band):
+            row_slice, column_slice = window.toslices()
+            values[row_slice, column_slice] = raster.read(band, window=window)
+        values.flush()
+        del values
+        metadata = {
+            "transform": list(raster.transform)[:6],
+            "crs": raster.crs.to_wkt() if raster.crs is not None else None,
+            "nodata": raster.nodata,
+            **create_fingerprint_of_source(path_to_raster),
+        }
+    os.replace(temporary_path_to_values, path_to_values)
+    # the metadata is written last, so a sidecar without metadata is never considered fresh
+    with open(path_to_metadata, "w") as metadata_file:
+        json.dump(metadata, metadata_file)
+    return path_to_values
+
+
+def load_memory_mapped_sidecar_if_fresh(path_to_raster: str, band: int = 1) -> Optional[MemoryMappedRaster]:
+    path_to_values, path_to_metadata = create_sidecar_paths(path_to_raster, band)
+    if not (os.path.exists(path_to_values) and os.path.exists(path_to_metadata) and os.path.exists(path_to_raster)):
+        return None
+    with open(path_to_metadata) as metadata_file:
+        metadata = json.load(metadata_file)
+    fingerprint = create_fingerprint_of_source(path_to_raster)
+    if any(metadata.get(key) != value for key, value in fingerprint.items()):
+        return None
+    return MemoryMappedRaster(
+        values=np.load(path_to_values, mmap_mode="r"),
+        transform=Affine(*metadata["transform"]),
+        crs=CRS.from_wkt(metadata["crs"]) if metadata["crs"] is not None else None,
+        nodata=metadata["nodata"],
+    )
@@ -1,19 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Mapping, Optional, Union
+
 import geopandas as gpd
-import rasterio as rio
+import numpy as np
+from affine import Affine
 from rasterio import DatasetReader
-from tqdm import tqdm
+
+from utils.raster_cache import CachedRasterReader, get_shared_raster_reader
+from utils.raster_sidecar import MemoryMappedRaster
+from water_surface_preparation.data_classes.enums import InterpolationMode
+
+
+def compute_pixel_indices(transform: Affine, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # same floor convention as DatasetReader.index, but for all coordinates at once
+    columns, rows = ~transform * (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    return np.floor(rows).astype(np.int64), np.floor(columns).astype(np.int64)
+
+
+def mask_nodata_values(values: np.ndarray, nodata) -> np.ndarray:
+    values = values.astype(float)
+    if nodata is not None:
+        is_nodata = np.isnan(values) if np.isnan(nodata) else values == nodata
+        values[is_nodata] = np.nan
+    return values
+
+
+def sample_nearest_pixels(
+    path_to_raster: str,
+    raster: Union[MemoryMappedRaster, DatasetReader],
+    x: np.ndarray,
+    y: np.ndarray,
+    band: int,
+    reader: CachedRasterReader,
+) -> np.ndarray:
+    rows, columns = compute_pixel_indices(raster.transform, x, y)
+    is_inside_raster = (rows >= 0) & (rows < raster.height) & (columns >= 0) & (columns < raster.width)
+    elevations = np.full(len(rows), np.nan)
+    if not is_inside_raster.any():
+        return elevations
+    pixel_values = reader.read_pixels(path_to_raster, rows[is_inside_raster], columns[is_inside_raster], band)
+    elevations[is_inside_raster] = mask_nodata_values(pixel_values, raster.nodata)
+    return elevations
+
+
+def calculate_linear_kernel_weights(fractions: np.ndarray) -> np.ndarray:
+    return np.stack([1 - fractions, fractions], axis=1)
 
 
-def extract_elevation_from_raster(points_to_intersect: gpd.GeoDataFrame, path_to_raster: str) -> gpd.GeoDataFrame:
-    with rio.open(path_to_raster) as raster_to_intersect:
-        raster_to_intersect: DatasetReader
-        points_to_intersect["z_raster"] = 0.0
-        temp_raster = raster_to_intersect.read(1)
+def calculate_cubic_kernel_weights(fractions: np.ndarray, a: float = -0.5) -> np.ndarray:
+    # Keys cubic convolution kernel evaluated at the four pixel centres around each fraction
+    distances = np.abs(fractions[:, None] - np.array([-1, 0, 1, 2]))
+    near = ((a + 2) * distances - (a + 3)) * distances**2 + 1
+    far = ((a * distances - 5 * a) * distances + 8 * a) * distances - 4 * a
+    return np.where(distances <= 1, near, np.where(distances < 2, far, 0.0))
+
+
+def sample_with_interpolation_kernel(
+    path_to_raster: str,
+    raster: Union[MemoryMappedRaster, DatasetReader],
+    x: np.ndarray,
+    y: np.ndarray,
+    band: int,
+    reader: CachedRasterReader,
+    interpolation: InterpolationMode,
+) -> np.ndarray:
+    columns, rows = ~raster.transform * (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    is_inside_raster = (rows >= 0) & (rows < raster.height) & (columns >= 0) & (columns < raster.width)
+    elevations = np.full(len(rows), np.nan)
+    if not is_inside_raster.any():
+        return elevations
+
+    # kernels are evaluated relative to pixel centres, neighbours beyond the edge repeat the edge pixel
+    rows_from_centre, columns_from_centre = rows[is_inside_raster] - 0.5, columns[is_inside_raster] - 0.5
+    first_row, first_column = np.floor(rows_from_centre), np.floor(columns_from_centre)
+    if interpolation == InterpolationMode.bilinear:
+        offsets = np.arange(2)
+        row_weights = calculate_linear_kernel_weights(rows_from_centre - first_row)
+        column_weights = calculate_linear_kernel_weights(columns_from_centre - first_column)
+    else:
+        offsets = np.arange(-1, 3)
+        row_weights = calculate_cubic_kernel_weights(rows_from_centre - first_row)
+        column_weights = calculate_cubic_kernel_weights(columns_from_centre - first_column)
+    kernel_size = len(offsets)
+    neighbour_rows = np.clip(first_row.astype(np.int64)[:, None] + offsets, 0, raster.height - 1)
+    neighbour_columns = np.clip(first_column.astype(np.int64)[:, None] + offsets, 0, raster.width - 1)
+    neighbour_rows = np.repeat(neighbour_rows[:, :, None], kernel_size, axis=2)
+    neighbour_columns = np.repeat(neighbour_columns[:, None, :], kernel_size, axis=1)
+
+    neighbour_values = mask_nodata_values(
+        reader.read_pixels(path_to_raster, neighbour_rows.ravel(), neighbour_columns.ravel(), band), raster.nodata
+    ).reshape(neighbour_rows.shape)
+    weights = row_weights[:, :, None] * column_weights[:, None, :]
+    # a nodata neighbour only invalidates the result if it actually contributes to it
+    weighted_values = np.where(weights != 0, weights * neighbour_values, 0.0)
+    elevations[is_inside_raster] = weighted_values.sum(axis=(1, 2))
+    return elevations
+
+
+def sample_band_at_coordinates(
+    path_to_raster: str,
+    x: np.ndarray,
+    y: np.ndarray,
+    band: int = 1,
+    reader: Optional[CachedRasterReader] = None,
+    interpolation: InterpolationMode = InterpolationMode.nearest,
+) -> np.ndarray:
+    reader = get_shared_raster_reader() if reader is None else reader
+    raster = reader.describe(path_to_raster, band)
+    if interpolation == InterpolationMode.nearest:
+        return sample_nearest_pixels(path_to_raster, raster, x, y, band, reader)
+    return sample_with_interpolation_kernel(path_to_raster, raster, x, y, band, reader, interpolation)
+
+
+def extract_elevation_from_raster(
+    points_to_intersect: gpd.GeoDataFrame,
+    path_to_raster: str,
+    interpolation: InterpolationMode = InterpolationMode.nearest,
+) -> gpd.GeoDataFrame:
+    # points outside the raster or on nodata pixels get NaN instead of a wrapped around or nodata value
+    points_to_intersect["z_raster"] = sample_band_at_coordinates(
+        path_to_raster,
+        points_to_intersect.geometry.x.values,
+        points_to_intersect.geometry.y.values,
+        interpolation=interpolation,
+    )
+    return points_to_intersect
 
-        for ID, row in tqdm(points_to_intersect.iterrows()):
-            longitude = row["geometry"].x
-            latitude = row["geometry"].y
-            row_index, col_index = raster_to_intersect.index(longitude, latitude)
-            points_to_intersect.loc[ID, "z_raster"] = temp_raster[row_index, col_index]
 
+def extract_elevations_from_rasters(
+    points_to_intersect: gpd.GeoDataFrame,
+    paths_to_rasters_per_column: Mapping[str, str],
+    interpolation: InterpolationMode = InterpolationMode.nearest,
+    maximal_number_of_workers: Optional[int] = None,
+) -> gpd.GeoDataFrame:
+    # coordinates are extracted once, every raster is sampled on its own thread (rasterio releases the GIL on reads)
+    x = points_to_intersect.geometry.x.values
+    y = points_to_intersect.geometry.y.values
+    with ThreadPoolExecutor(max_workers=maximal_number_of_workers) as executor:
+        elevations_per_column = executor.map(
+            lambda path_to_raster: sample_band_at_coordinates(path_to_raster, x, y, interpolation=interpolation),
+            paths_to_rasters_per_column.values(),
+        )
+        for column_name, elevations in zip(paths_to_rasters_per_column.keys(), elevations_per_column):
+            points_to_intersect[column_name] = elevations
     return points_to_intersect
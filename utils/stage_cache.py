@@ -0,0 +1,160 @@
+import hashlib
+import os
+import pickle
+import weakref
+from dataclasses import dataclass, fields, is_dataclass
+from enum import Enum
+from typing import Any, Callable, Optional
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from utils import T
+from utils.raster_sidecar import create_fingerprint_of_source
+
+
+@dataclass(frozen=True)
+class SourceFile:
+    # a file that is read by a stage, it is part of the key by its fingerprint and not by its content
+    path: str
+
+
+def update_hash_with(hash_of_inputs: "hashlib._Hash", value: Any) -> None:
+    hash_of_inputs.update(type(value).__qualname__.encode())
+    if isinstance(value, SourceFile):
+        hash_of_inputs.update(repr((value.path, sorted(create_fingerprint_of_source(value.path).items()))).encode())
+    elif isinstance(value, gpd.GeoDataFrame):
+        update_hash_with(hash_of_inputs, pd.DataFrame(value.drop(columns=value.geometry.name)))
+        update_hash_with(hash_of_inputs, value.geometry)
+    elif isinstance(value, gpd.GeoSeries):
+        hash_of_inputs.update(repr((value.name, str(value.crs))).encode())
+        update_hash_with(hash_of_inputs, value.index.to_numpy())
+        for geometry in value.values:
+            hash_of_inputs.update(geometry.wkb if geometry is not None else b"\x00")
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        hash_of_inputs.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        hash_of_inputs.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        if value.dtype == object:
+            update_hash_with(hash_of_inputs, pd.Series(value.ravel()))
+        else:
+            hash_of_inputs.update(repr((value.dtype.str, value.shape)).encode())
+            hash_of_inputs.update(np.ascontiguousarray(value).tobytes())
+    elif is_dataclass(value) and not isinstance(value, type):
+        for field in fields(value):
+            update_hash_with(hash_of_inputs, field.name)
+            update_hash_with(hash_of_inputs, getattr(value, field.name))
+    elif isinstance(value, (list, tuple)):
+        hash_of_inputs.update(str(len(value)).encode())
+        for element in value:
+            update_hash_with(hash_of_inputs, element)
+    elif isinstance(value, dict):
+        update_hash_with(hash_of_inputs, sorted(value.items(), key=repr))
+    elif isinstance(value, (Enum, str, bytes, int, float, bool, type(None))):
+        hash_of_inputs.update(repr(value).encode())
+    else:
+        hash_of_inputs.update(pickle.dumps(value))
+
+
+class StageCache:
+    # memoizes the results of pipeline stages on disk, keyed by a hash of everything the stage depends on.
+    # results returned by the cache are identified by the key of the stage that produced them, so they are not
+    # hashed again when they are passed on to the next stage. they are only referenced weakly, so the cache does not
+    # keep them in memory once the pipeline is done with them.
+    # the least recently used results are deleted as soon as the cache grows beyond its size.
+    # a cache without directory computes every stage and stores nothing.
+    def __init__(self, directory: Optional[str], maximal_size_in_megabytes: float = 2048):
+        self.directory = directory
+        self.maximal_size_in_bytes = int(maximal_size_in_megabytes * 1024**2)
+        self._references_and_keys_per_id: dict[int, tuple[weakref.ref, str]] = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def create_key(self, stage_name: str, *inputs: Any) -> str:
+        hash_of_inputs = hashlib.sha256(stage_name.encode())
+        for value in inputs:
+            reference_and_key = self._references_and_keys_per_id.get(id(value))
+            if reference_and_key is not None and reference_and_key[0]() is value:
+                hash_of_inputs.update(f"result of {reference_and_key[1]}".encode())
+            else:
+                update_hash_with(hash_of_inputs, value)
+        return f"{stage_name}-{hash_of_inputs.hexdigest()}"
+
+    def get_or_compute(self, stage_name: str, compute: Callable[[], T], *inputs: Any) -> T:
+        if self.directory is None:
+            return compute()
+        key = self.create_key(stage_name, *inputs)
+        path_to_result = os.path.join(self.directory, f"{key}.pkl")
+        try:
+            with open(path_to_result, "rb") as result_file:
+                result = pickle.load(result_file)
+            os.utime(path_to_result)
+            print(f"stage {stage_name} loaded from cache")
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            result = compute()
+            self._store(path_to_result, result)
+        self._remember_key_of(result, key)
+        return result
+
+    def _remember_key_of(self, result: Any, key: str) -> None:
+        # the entry is dropped as soon as the result is garbage collected, before its id can be reused by another
+        # object. lists and tuples cannot be referenced weakly, only their elements are remembered
+        if isinstance(result, (list, tuple)):
+            for index, element in enumerate(result):
+                self._remember_key_of(element, f"{key}[{index}]")
+            return
+        try:
+            reference = weakref.ref(result, self._create_callback_to_forget(id(result)))
+        except TypeError:
+            return
+        self._references_and_keys_per_id[id(result)] = (reference, key)
+
+    def _create_callback_to_forget(self, id_of_result: int) -> Callable[[weakref.ref], None]:
+        references_and_keys_per_id = self._references_and_keys_per_id
+
+        def forget(reference: weakref.ref) -> None:
+            reference_and_key = references_and_keys_per_id.get(id_of_result)
+            if reference_and_key is not None and reference_and_key[0] is reference:
+                del references_and_keys_per_id[id_of_result]
+
+        return forget
+
+    def _store(self, path_to_result: str, result: Any) -> None:
+        # written to a temporary file first, so concurrent readers never see a partial result
+        temporary_path_to_result = f"{path_to_result}.{os.getpid()}.part"
+        with open(temporary_path_to_result, "wb") as result_file:
+            pickle.dump(result, result_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path_to_result, path_to_result)
+        self._evict_until_below_limit()
+
+    def _evict_until_below_limit(self) -> None:
+        cached_files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    status = entry.stat()
+                except FileNotFoundError:
+                    continue
+                cached_files.append((status.st_mtime_ns, status.st_size, entry.path))
+        size_in_bytes = sum(size for _, size, _ in cached_files)
+        for _, size, path in sorted(cached_files):
+            if size_in_bytes <= self.maximal_size_in_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size_in_bytes -= size
+
+    def size_in_bytes(self) -> int:
+        if self.directory is None:
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith(".pkl"))
+
+    def clear(self) -> None:
+        if self.directory is None:
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                os.remove(entry.path)
@@ -0,0 +1,123 @@
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+
+@dataclass(frozen=True, eq=False)
+class Task:
+    # tasks are identified by their function and the keys of their arguments, so equal tasks created for different
+    # configurations are computed only once. arguments that are tasks are replaced by their results.
+    function: Callable[..., Any]
+    arguments: tuple = ()
+    # cheap tasks, e.g. selecting a part of a result, run in the process of the graph instead of on the executor, so
+    # only their result and not the whole result they select from is sent to the tasks that depend on them
+    runs_locally: bool = False
+    key: Hashable = field(init=False)
+
+    def __post_init__(self):
+        argument_keys = tuple(argument.key if isinstance(argument, Task) else argument for argument in self.arguments)
+        object.__setattr__(self, "key", (self.function.__module__, self.function.__qualname__, argument_keys))
+
+    @property
+    def dependencies(self) -> list["Task"]:
+        return [argument for argument in self.arguments if isinstance(argument, Task)]
+
+    @property
+    def dependency_keys(self) -> set[Hashable]:
+        return {dependency.key for dependency in self.dependencies}
+
+
+def create_task(function: Callable[..., Any], *arguments: Any) -> Task:
+    return Task(function, arguments)
+
+
+def create_local_task(function: Callable[..., Any], *arguments: Any) -> Task:
+    return Task(function, arguments, runs_locally=True)
+
+
+def collect_all_tasks_in_order_of_dependencies(requested_tasks: Iterable[Task]) -> list[Task]:
+    # every task comes after all of its dependencies, tasks with equal keys are kept once
+    ordered_tasks, visited_keys = [], set()
+
+    def visit(task: Task) -> None:
+        if task.key in visited_keys:
+            return
+        visited_keys.add(task.key)
+        for dependency in task.dependencies:
+            visit(dependency)
+        ordered_tasks.append(task)
+
+    for requested_task in requested_tasks:
+        visit(requested_task)
+    return ordered_tasks
+
+
+def resolve_arguments(task: Task, results_per_key: dict[Hashable, Any]) -> tuple:
+    return tuple(
+        results_per_key[argument.key] if isinstance(argument, Task) else argument for argument in task.arguments
+    )
+
+
+def run_task_graph(
+    requested_tasks: Iterable[Task],
+    executor: Optional[Executor] = None,
+    maximal_number_of_workers: Optional[int] = None,
+) -> dict[Hashable, Any]:
+    # runs every task once all of its dependencies are done and returns the results of the requested tasks per key.
+    # independent tasks run in parallel on the given executor, or on a new process pool with
+    # maximal_number_of_workers. without either, the tasks run one after another.
+    # results that are not requested are dropped as soon as no pending task needs them any more.
+    requested_tasks = list(requested_tasks)
+    requested_keys = {task.key for task in requested_tasks}
+    ordered_tasks = collect_all_tasks_in_order_of_dependencies(requested_tasks)
+    number_of_pending_dependents = {task.key: 0 for task in ordered_tasks}
+    for task in ordered_tasks:
+        for dependency_key in task.dependency_keys:
+            number_of_pending_dependents[dependency_key] += 1
+    results_per_key: dict[Hashable, Any] = {}
+
+    def release_dependencies_of(task: Task) -> None:
+        for dependency_key in task.dependency_keys:
+            number_of_pending_dependents[dependency_key] -= 1
+            if number_of_pending_dependents[dependency_key] == 0 and dependency_key not in requested_keys:
+                del results_per_key[dependency_key]
+
+    if executor is None and maximal_number_of_workers is None:
+        for task in ordered_tasks:
+            results_per_key[task.key] = task.function(*resolve_arguments(task, results_per_key))
+            release_dependencies_of(task)
+        return results_per_key
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=maximal_number_of_workers) as process_pool:
+            return run_task_graph(requested_tasks, process_pool)
+
+    number_of_unfinished_dependencies = {task.key: len(task.dependency_keys) for task in ordered_tasks}
+    dependents_per_key: dict[Hashable, list[Task]] = {task.key: [] for task in ordered_tasks}
+    for task in ordered_tasks:
+        for dependency_key in task.dependency_keys:
+            dependents_per_key[dependency_key].append(task)
+    tasks_per_future: dict[Future, Task] = {}
+
+    def submit(task: Task) -> None:
+        if task.runs_locally:
+            finish(task, task.function(*resolve_arguments(task, results_per_key)))
+        else:
+            tasks_per_future[executor.submit(task.function, *resolve_arguments(task, results_per_key))] = task
+
+    def finish(task: Task, result: Any) -> None:
+        results_per_key[task.key] = result
+        for dependent in dependents_per_key[task.key]:
+            number_of_unfinished_dependencies[dependent.key] -= 1
+            if number_of_unfinished_dependencies[dependent.key] == 0:
+                submit(dependent)
+        release_dependencies_of(task)
+
+    # local tasks finish right away and submit their dependents, so the tasks without dependencies are taken first
+    for task in [task for task in ordered_tasks if number_of_unfinished_dependencies[task.key] == 0]:
+        submit(task)
+    while tasks_per_future:
+        finished_futures, _ = wait(tasks_per_future, return_when=FIRST_COMPLETED)
+        for future in finished_futures:
+            finish(tasks_per_future.pop(future), future.result())
+    return results_per_key
@@ -0,0 +1,97 @@
+from typing import Sequence
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString
+
+from utils.linear_referencing import LineSegments
+from water_surface_preparation.data_classes.points_per_line import PointsPerCenterline
+
+
+class CenterLineIndex:
+    # built once per set of center lines and reused for every point set that has to be assigned to them
+    def __init__(self, center_lines: Sequence[gpd.GeoDataFrame], buffer_distance: float):
+        self.center_lines = list(center_lines)
+        self.buffer_distance = buffer_distance
+        self.buffered_lines = [center_line.buffer(buffer_distance, cap_style=2) for center_line in self.center_lines]
+        self._bounds_of_buffers = np.array([buffered_line.total_bounds for buffered_line in self.buffered_lines])
+        self._segments_per_line = []
+        for center_line in self.center_lines:
+            assert isinstance(center_line.geometry[0], LineString)
+            self._segments_per_line.append(LineSegments.from_line(center_line.geometry[0]))
+
+    def calculate_distances_to_lines(self, coordinates: np.ndarray) -> np.ndarray:
+        # distance of every point to every line, np.inf if the point is outside of the flat capped buffer of the line
+        distances = np.full((len(coordinates), len(self.center_lines)), np.inf)
+        for line_index, (segments, bounds) in enumerate(zip(self._segments_per_line, self._bounds_of_buffers)):
+            is_candidate = (
+                (coordinates[:, 0] >= bounds[0])
+                & (coordinates[:, 1] >= bounds[1])
+                & (coordinates[:, 0] <= bounds[2])
+                & (coordinates[:, 1] <= bounds[3])
+            )
+            candidate_points = np.flatnonzero(is_candidate)
+            if len(candidate_points) == 0 or segments.number_of_segments == 0:
+                continue
+            point_indices, segment_indices = segments.find_candidate_pairs(
+                coordinates[candidate_points], np.full(len(candidate_points), self.buffer_distance)
+            )
+            fractions, distances_to_segments = segments.measure_pairs(
+                coordinates[candidate_points], point_indices, segment_indices
+            )
+            is_inside_buffer = (distances_to_segments <= self.buffer_distance) & self._is_covered_by_segment_or_join(
+                segments, coordinates[candidate_points], point_indices, segment_indices, fractions
+            )
+            minimal_distances = np.full(len(candidate_points), np.inf)
+            np.minimum.at(minimal_distances, point_indices, distances_to_segments)
+            is_inside_any_part_of_buffer = np.zeros(len(candidate_points), dtype=bool)
+            is_inside_any_part_of_buffer[point_indices[is_inside_buffer]] = True
+            distances[candidate_points[is_inside_any_part_of_buffer], line_index] = minimal_distances[
+                is_inside_any_part_of_buffer
+            ]
+        return distances
+
+    @staticmethod
+    def _is_covered_by_segment_or_join(
+        segments: LineSegments,
+        coordinates: np.ndarray,
+        point_indices: np.ndarray,
+        segment_indices: np.ndarray,
+        fractions: np.ndarray,
+    ) -> np.ndarray:
+        # beside the side of a segment, the buffer only covers the round join around an interior vertex in the
+        # wedge that lies beyond the end of the previous and before the start of the next segment.
+        # before the first and beyond the last vertex the flat caps cover nothing.
+        is_covered = (fractions >= 0) & (fractions <= 1)
+        is_before_an_interior_vertex = (fractions < 0) & (segment_indices > 0)
+        previous_fractions, _ = segments.measure_pairs(
+            coordinates, point_indices[is_before_an_interior_vertex], segment_indices[is_before_an_interior_vertex] - 1
+        )
+        is_covered[is_before_an_interior_vertex] = previous_fractions > 1
+        is_beyond_an_interior_vertex = (fractions > 1) & (segment_indices < segments.number_of_segments - 1)
+        next_fractions, _ = segments.measure_pairs(
+            coordinates, point_indices[is_beyond_an_interior_vertex], segment_indices[is_beyond_an_interior_vertex] + 1
+        )
+        is_covered[is_beyond_an_interior_vertex] = next_fractions < 0
+        return is_covered
+
+    def assign_points(self, points: gpd.GeoDataFrame) -> list[PointsPerCenterline]:
+        # every point goes to the closest line whose buffer contains it, points outside of all buffers are dropped
+        is_a_point = (points.geometry.geom_type == "Point").values
+        point_geometries = points.geometry[is_a_point]
+        elevations = points["z_raster"].values[is_a_point] if "z_raster" in points.columns else None
+        coordinates = np.column_stack([point_geometries.x.values, point_geometries.y.values])
+        distances = self.calculate_distances_to_lines(coordinates)
+        matching_indices = np.argmin(distances, axis=1) if len(self.center_lines) > 0 else np.array([], dtype=int)
+        is_inside_of_a_buffer = np.isfinite(distances.min(axis=1, initial=np.inf))
+
+        points_per_center_lines = []
+        for line_index, center_line in enumerate(self.center_lines):
+            is_matched = is_inside_of_a_buffer & (matching_indices == line_index)
+            matched_elevations = elevations[is_matched] if elevations is not None else np.full(is_matched.sum(), np.nan)
+            converted_points = gpd.GeoDataFrame(
+                {"z_raster": matched_elevations, "geometry": point_geometries.values[is_matched]},
+                crs=self.center_lines[0].crs,
+            )
+            points_per_center_lines.append(PointsPerCenterline(points=converted_points, center_line=center_line))
+        return points_per_center_lines
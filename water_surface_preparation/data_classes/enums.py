@@ -11,3 +11,33 @@ class Scenario(Enum):
     af_2021 = "AF_2021"
     af_2020 = "AF_2020"
     bf_2020 = "BF_2020"
+
+
+class OutlierFilterMode(Enum):
+    neighbourhood_median = "neighbourhood_median"
+    along_shore_rolling_median = "along_shore_rolling_median"
+
+
+class ElevationAggregation(Enum):
+    mean = "mean"
+    inverse_distance_weighting = "inverse_distance_weighting"
+    k_nearest = "k_nearest"
+
+
+class SmoothingMethod(Enum):
+    lowess = "lowess"
+    delta_lowess = "delta_lowess"
+    savitzky_golay = "savitzky_golay"
+    gaussian_kernel = "gaussian_kernel"
+    rolling_window = "rolling_window"
+
+
+class ExecutorMode(Enum):
+    serial = "serial"
+    process_pool = "process_pool"
+
+
+class InterpolationMode(Enum):
+    nearest = "nearest"
+    bilinear = "bilinear"
+    bicubic = "bicubic"
@@ -1,17 +1,59 @@
+import os
 from dataclasses import dataclass
+from typing import Optional
 
-from water_surface_preparation.data_classes.enums import Scenario
+from utils.intermediates import ExportFormat
+from utils.plot_dispatcher import PlotMode
+from water_surface_preparation.data_classes.enums import (
+    ElevationAggregation,
+    ExecutorMode,
+    InterpolationMode,
+    OutlierFilterMode,
+    Scenario,
+    SmoothingMethod,
+)
 
 
 @dataclass(frozen=True)
 class ParametersToFilterSamplingPoints:
     buffer_distance: int
     maximal_deviation: float
+    filter_mode: OutlierFilterMode = OutlierFilterMode.neighbourhood_median
+    chunk_size: int = 100_000
 
 
 @dataclass(frozen=True)
 class ParametersToAssignElevationToPoints:
     buffer_distance: int
+    aggregation: ElevationAggregation = ElevationAggregation.mean
+    number_of_nearest_points: int = 8
+    inverse_distance_power: float = 2.0
+
+
+@dataclass(frozen=True)
+class ParametersForSmoothing:
+    method: SmoothingMethod = SmoothingMethod.lowess
+    # lengths are in chainage metres, None derives them from frac times the length of the smoothed part of the line
+    lowess_delta: Optional[float] = None
+    window_length: Optional[float] = None
+    kernel_standard_deviation: Optional[float] = None
+    resampling_distance: float = 1.0
+    polynomial_order: int = 2
+    rolling_window_size: int = 20
+
+
+@dataclass(frozen=True)
+class ParametersForStreaming:
+    # the center lines are processed one after another in chunks of chunk_length chainage metres. every chunk reads
+    # overlap metres beyond both of its ends, widened to what the smoother, the filter and the transects reach.
+    # the smoothing window has to be given in metres (window_length of the parameters for smoothing), as one derived
+    # from frac grows with the length of the line. lowess smooths every chunk with the share of it the window covers
+    chunk_length: float = 2000.0
+    minimal_overlap: float = 100.0
+    # chunks get shorter, down to minimal_chunk_length, as long as the process uses more memory after a chunk.
+    # None does not watch the memory
+    maximal_memory_in_megabytes: Optional[float] = None
+    minimal_chunk_length: float = 250.0
 
 
 @dataclass(frozen=True)
@@ -23,3 +65,32 @@ class ParametersForOneProcess:
     frac: float
     parameters_to_filter_sampling_points: ParametersToFilterSamplingPoints
     parameters_to_assign_elevation_to_points: ParametersToAssignElevationToPoints
+    raster_block_cache_size_in_megabytes: int = 512
+    raster_interpolation: InterpolationMode = InterpolationMode.nearest
+    parameters_for_smoothing: ParametersForSmoothing = ParametersForSmoothing()
+    # the center lines are processed independently of each other, either one after another or in parallel processes
+    executor_mode: ExecutorMode = ExecutorMode.serial
+    maximal_number_of_workers: Optional[int] = None
+    # results of the stages of the pipeline are cached on disk in this directory, None disables the cache
+    stage_cache_directory: Optional[str] = None
+    stage_cache_size_in_megabytes: int = 2048
+    # parsed input layers are cached on disk in this directory until their files change, None disables the cache
+    loading_cache_directory: Optional[str] = None
+    # time and memory of every stage are written to this json file and/or printed, stages are only measured if one
+    # of both is asked for. tracing the memory of python objects slows the pipeline down noticeably
+    path_to_run_report: Optional[str] = None
+    print_run_report: bool = False
+    trace_memory_of_stages: bool = False
+    # figures are rendered right away, in background processes while the pipeline goes on, or not at all
+    plot_mode: PlotMode = PlotMode.synchronous
+    maximal_number_of_plot_workers: int = 1
+    # figures and exported layers are written into this directory
+    output_directory: str = "out"
+    # intermediate layers are written as GeoParquet into this directory, the export to shapefiles or geopackages is
+    # an explicit last step that is skipped without export format
+    intermediates_directory: str = os.path.join("out", "intermediates")
+    export_format: Optional[ExportFormat] = None
+    # shore points are computed chunk by chunk along the center lines and written as they are finished, so the memory
+    # does not grow with the length of the river. None keeps all points of the scenario in memory, as needed for the
+    # figures, which are not rendered in streaming mode
+    parameters_for_streaming: Optional[ParametersForStreaming] = None
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
+from typing import Iterator
 
 import geopandas as gpd
+import numpy as np
 from shapely.geometry import Point, LineString
 
 
@@ -34,3 +36,83 @@ class TransectLinesAtPoint:
     left_line: LineString
     transect_number: int
     elevation: float
+
+
+@dataclass(frozen=True)
+class TransectSet:
+    # all transects of one center line as columns. the transect at index i starts at (origin_x[i], origin_y[i]),
+    # its right side points towards theta_angle + 90 degrees and its left side towards theta_angle - 90 degrees.
+    # geometries are only created on demand, e.g. for plotting or export.
+    origin_x: np.ndarray
+    origin_y: np.ndarray
+    theta_angle: np.ndarray
+    right_lengths: np.ndarray
+    left_lengths: np.ndarray
+    elevations: np.ndarray
+    transect_numbers: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.transect_numbers)
+
+    def __iter__(self) -> Iterator[TransectLinesAtPoint]:
+        return iter(self.to_transect_lines())
+
+    def calculate_end_coordinates(self, rotation_angle: float) -> tuple[np.ndarray, np.ndarray]:
+        bearings = np.radians(self.theta_angle + rotation_angle)
+        lengths = self.right_lengths if rotation_angle > 0 else self.left_lengths
+        return self.origin_x + lengths * np.cos(bearings), self.origin_y + lengths * np.sin(bearings)
+
+    def right_end_coordinates(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.calculate_end_coordinates(rotation_angle=90)
+
+    def left_end_coordinates(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.calculate_end_coordinates(rotation_angle=-90)
+
+    def to_transect_lines(self) -> list[TransectLinesAtPoint]:
+        right_x, right_y = self.right_end_coordinates()
+        left_x, left_y = self.left_end_coordinates()
+        return [
+            TransectLinesAtPoint(
+                point=Point(origin_x, origin_y),
+                right_line=LineString(((origin_x, origin_y), (right_end_x, right_end_y))),
+                left_line=LineString(((origin_x, origin_y), (left_end_x, left_end_y))),
+                transect_number=int(transect_number),
+                elevation=elevation,
+            )
+            for origin_x, origin_y, right_end_x, right_end_y, left_end_x, left_end_y, transect_number, elevation in zip(
+                self.origin_x,
+                self.origin_y,
+                right_x,
+                right_y,
+                left_x,
+                left_y,
+                self.transect_numbers,
+                self.elevations,
+            )
+        ]
+
+    def to_geo_data_frame(self, crs=None) -> gpd.GeoDataFrame:
+        transect_lines = self.to_transect_lines()
+        return gpd.GeoDataFrame(
+            {
+                "transect": np.concatenate([self.transect_numbers, self.transect_numbers]),
+                "side": ["right"] * len(self) + ["left"] * len(self),
+                "z_interp": np.concatenate([self.elevations, self.elevations]),
+            },
+            geometry=[line.right_line for line in transect_lines] + [line.left_line for line in transect_lines],
+            crs=crs,
+        )
+
+
+@dataclass(frozen=True)
+class TransectsAndPointsPerCenterLine:
+    transects: TransectSet
+    interpolated_points: ProcessedPointsPerCenterLine
+
+
+@dataclass(frozen=True)
+class PointsOfOneScenario:
+    shoreline: gpd.GeoDataFrame
+    shoreline_points_per_center_line: list[PointsPerCenterline]
+    gps_points_per_line: list[OrderedProjectedPointsPerCenterLine]
+    points_along_shoreline_per_center_line: list[PointsPerCenterline]
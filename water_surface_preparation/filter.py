@@ -1,20 +1,186 @@
+from bisect import bisect_left, insort
+from collections import deque
+from itertools import chain
+from typing import Hashable, Iterable, Iterator
+
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from water_surface_preparation.data_classes.enums import OutlierFilterMode
+from water_surface_preparation.data_classes.parameters import ParametersToFilterSamplingPoints
+
+
+def calculate_neighbourhood_medians(
+    coordinates: np.ndarray, values: np.ndarray, radius: float, chunk_size: int = 100_000
+) -> np.ndarray:
+    # median of all values within radius (the point itself included), NaN values are skipped like in pandas
+    tree = cKDTree(coordinates)
+    medians = np.empty(len(coordinates))
+    for chunk_start in range(0, len(coordinates), chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, len(coordinates))
+        neighbours_per_point = tree.query_ball_point(coordinates[chunk_start:chunk_stop], r=radius)
+        number_of_neighbours = np.fromiter(map(len, neighbours_per_point), dtype=np.intp)
+        neighbours = np.fromiter(chain.from_iterable(neighbours_per_point), dtype=np.intp)
+        owners = np.repeat(np.arange(chunk_start, chunk_stop), number_of_neighbours)
+        medians_of_chunk = pd.Series(values[neighbours]).groupby(owners).median()
+        medians[chunk_start:chunk_stop] = medians_of_chunk.reindex(np.arange(chunk_start, chunk_stop)).values
+    return medians
 
 
 def filter_outliers_from_elevation_points(
     points_with_elevation: gpd.GeoDataFrame, buffer_distance: int, maximal_deviation: float
 ) -> gpd.GeoDataFrame:
-    do_keep_this_row = []
-    for i, point in points_with_elevation.iterrows():
-        buffer = point.geometry.buffer(buffer_distance)
-        points_in_buffer = gpd.GeoDataFrame(
-            geometry=points_with_elevation.intersection(buffer), crs=points_with_elevation.crs
-        )
-        median_elevation = points_with_elevation[~points_in_buffer.is_empty]["z_raster"].median()
-        is_not_an_outlier = -maximal_deviation < (median_elevation - point["z_raster"]) < maximal_deviation
-        do_keep_this_row.append(True if is_not_an_outlier else False)
-    print(f"filtering removed {sum(not row for row in do_keep_this_row)} of {len(do_keep_this_row)} points")
+    coordinates = np.column_stack([points_with_elevation.geometry.x.values, points_with_elevation.geometry.y.values])
+    elevations = points_with_elevation["z_raster"].values.astype(float)
+    median_elevations = calculate_neighbourhood_medians(coordinates, elevations, buffer_distance)
+    with np.errstate(invalid="ignore"):
+        do_keep_this_row = np.abs(median_elevations - elevations) < maximal_deviation
+    print(f"filtering removed {np.sum(~do_keep_this_row)} of {len(do_keep_this_row)} points")
     filtered = points_with_elevation[do_keep_this_row]
     filtered.reset_index(drop=True, inplace=True)
     assert filtered.__len__() == sum(do_keep_this_row)
     return filtered
+
+
+class AlongShoreRollingMedian:
+    # sliding median over all points of the same line within +- half_window_length chainage.
+    # points have to be pushed ordered by chainage per line; verdicts are returned in push order as soon as
+    # the window of a point is complete, so only the points of one window are held in memory.
+    def __init__(self, half_window_length: float, maximal_deviation: float):
+        self.half_window_length = half_window_length
+        self.maximal_deviation = maximal_deviation
+        self._current_line_id = None
+        self._chainages: deque[float] = deque()
+        self._elevations: deque[float] = deque()
+        self._sorted_window: list[float] = []
+        self._first_index = 0
+        self._next_to_decide = 0
+        self._window_start = 0
+        self._window_stop = 0
+
+    def push(self, line_id: Hashable, chainage: float, elevation: float) -> list[bool]:
+        verdicts = []
+        if line_id != self._current_line_id:
+            verdicts += self.flush()
+            self._current_line_id = line_id
+        self._chainages.append(chainage)
+        self._elevations.append(elevation)
+        while (
+            self._next_to_decide < self._number_of_pushed_points()
+            and self._chainage_at(self._next_to_decide) + self.half_window_length < chainage
+        ):
+            verdicts.append(self._decide_next())
+        return verdicts
+
+    def flush(self) -> list[bool]:
+        verdicts = [self._decide_next() for _ in range(self._next_to_decide, self._number_of_pushed_points())]
+        self._first_index = self._next_to_decide = self._window_start = self._window_stop = 0
+        self._chainages.clear()
+        self._elevations.clear()
+        self._sorted_window.clear()
+        self._current_line_id = None
+        return verdicts
+
+    def _number_of_pushed_points(self) -> int:
+        return self._first_index + len(self._chainages)
+
+    def _chainage_at(self, index: int) -> float:
+        return self._chainages[index - self._first_index]
+
+    def _elevation_at(self, index: int) -> float:
+        return self._elevations[index - self._first_index]
+
+    def _decide_next(self) -> bool:
+        chainage = self._chainage_at(self._next_to_decide)
+        while (
+            self._window_stop < self._number_of_pushed_points()
+            and self._chainage_at(self._window_stop) <= chainage + self.half_window_length
+        ):
+            if not np.isnan(self._elevation_at(self._window_stop)):
+                insort(self._sorted_window, self._elevation_at(self._window_stop))
+            self._window_stop += 1
+        while self._chainage_at(self._window_start) < chainage - self.half_window_length:
+            if not np.isnan(self._elevation_at(self._window_start)):
+                del self._sorted_window[bisect_left(self._sorted_window, self._elevation_at(self._window_start))]
+            self._window_start += 1
+
+        deviation_from_median = self._median_of_window() - self._elevation_at(self._next_to_decide)
+        is_not_an_outlier = abs(deviation_from_median) < self.maximal_deviation
+        self._next_to_decide += 1
+        while self._first_index < min(self._window_start, self._next_to_decide):
+            self._chainages.popleft()
+            self._elevations.popleft()
+            self._first_index += 1
+        return bool(is_not_an_outlier)
+
+    def _median_of_window(self) -> float:
+        number_of_values = len(self._sorted_window)
+        if number_of_values == 0:
+            return np.nan
+        middle = number_of_values // 2
+        if number_of_values % 2 == 1:
+            return self._sorted_window[middle]
+        return (self._sorted_window[middle - 1] + self._sorted_window[middle]) / 2
+
+
+def filter_outliers_along_shore_in_chunks(
+    chunks_of_points: Iterable[gpd.GeoDataFrame], half_window_length: float, maximal_deviation: float
+) -> Iterator[gpd.GeoDataFrame]:
+    # chunks need the line_id and chainage columns of sample_points_along_line and are yielded filtered, in order
+    rolling_median = AlongShoreRollingMedian(half_window_length, maximal_deviation)
+    pending_chunks: deque[gpd.GeoDataFrame] = deque()
+    verdicts: list[bool] = []
+    number_of_points, number_of_kept_points = 0, 0
+
+    def yield_chunks_with_all_verdicts(is_exhausted: bool = False) -> Iterator[gpd.GeoDataFrame]:
+        nonlocal number_of_points, number_of_kept_points
+        while pending_chunks and (is_exhausted or len(verdicts) >= len(pending_chunks[0].index)):
+            oldest_chunk = pending_chunks.popleft()
+            do_keep_this_row = verdicts[: len(oldest_chunk.index)]
+            del verdicts[: len(oldest_chunk.index)]
+            number_of_points += len(do_keep_this_row)
+            number_of_kept_points += sum(do_keep_this_row)
+            yield oldest_chunk[do_keep_this_row]
+
+    for chunk in chunks_of_points:
+        pending_chunks.append(chunk)
+        for line_id, chainage, elevation in zip(
+            chunk["line_id"].values, chunk["chainage"].values, chunk["z_raster"].values
+        ):
+            verdicts.extend(rolling_median.push(line_id, chainage, float(elevation)))
+        yield from yield_chunks_with_all_verdicts()
+    verdicts.extend(rolling_median.flush())
+    yield from yield_chunks_with_all_verdicts(is_exhausted=True)
+    print(f"filtering removed {number_of_points - number_of_kept_points} of {number_of_points} points")
+
+
+def filter_outliers_along_shore(
+    points_with_elevation: gpd.GeoDataFrame, half_window_length: float, maximal_deviation: float, chunk_size: int
+) -> gpd.GeoDataFrame:
+    ordered_points = points_with_elevation.sort_values(by=["line_id", "chainage"], kind="stable")
+    chunks_of_points = (
+        ordered_points.iloc[chunk_start : chunk_start + chunk_size]
+        for chunk_start in range(0, len(ordered_points.index), chunk_size)
+    )
+    filtered_chunks = list(
+        filter_outliers_along_shore_in_chunks(chunks_of_points, half_window_length, maximal_deviation)
+    )
+    if not filtered_chunks:
+        return ordered_points.reset_index(drop=True)
+    filtered = pd.concat(filtered_chunks)
+    filtered.reset_index(drop=True, inplace=True)
+    return filtered
+
+
+def filter_sampling_points(
+    points_with_elevation: gpd.GeoDataFrame, parameters: ParametersToFilterSamplingPoints
+) -> gpd.GeoDataFrame:
+    if parameters.filter_mode == OutlierFilterMode.along_shore_rolling_median:
+        return filter_outliers_along_shore(
+            points_with_elevation, parameters.buffer_distance, parameters.maximal_deviation, parameters.chunk_size
+        )
+    return filter_outliers_from_elevation_points(
+        points_with_elevation, parameters.buffer_distance, parameters.maximal_deviation
+    )
@@ -0,0 +1,76 @@
+from itertools import chain
+
+import geopandas as gpd
+import numpy as np
+from scipy.spatial import cKDTree
+
+from utils.linear_referencing import extract_coordinates
+from water_surface_preparation.data_classes.enums import ElevationAggregation
+from water_surface_preparation.data_classes.points_per_line import PointsPerCenterline
+
+
+def aggregate_elevations_within_radius(
+    tree: cKDTree,
+    elevations: np.ndarray,
+    coordinates: np.ndarray,
+    radius: float,
+    aggregation: ElevationAggregation,
+    inverse_distance_power: float,
+) -> np.ndarray:
+    neighbours_per_point = tree.query_ball_point(coordinates, r=radius)
+    number_of_neighbours = np.fromiter(map(len, neighbours_per_point), dtype=np.intp)
+    neighbours = np.fromiter(chain.from_iterable(neighbours_per_point), dtype=np.intp)
+    owners = np.repeat(np.arange(len(coordinates)), number_of_neighbours)
+    neighbour_elevations = elevations[neighbours]
+    weights = np.isfinite(neighbour_elevations).astype(float)
+    if aggregation == ElevationAggregation.inverse_distance_weighting:
+        distances = np.hypot(*(tree.data[neighbours] - coordinates[owners]).T)
+        weights /= np.maximum(distances, 1e-9) ** inverse_distance_power
+    weighted_elevations = weights * np.nan_to_num(neighbour_elevations)
+    weighted_sums = np.bincount(owners, weights=weighted_elevations, minlength=len(coordinates))
+    sums_of_weights = np.bincount(owners, weights=weights, minlength=len(coordinates))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return weighted_sums / sums_of_weights
+
+
+def average_elevations_of_nearest_points(
+    tree: cKDTree, elevations: np.ndarray, coordinates: np.ndarray, radius: float, number_of_nearest_points: int
+) -> np.ndarray:
+    number_of_nearest_points = min(number_of_nearest_points, tree.n)
+    _, neighbours = tree.query(coordinates, k=number_of_nearest_points, distance_upper_bound=radius)
+    neighbours = neighbours.reshape(len(coordinates), -1)
+    # neighbours outside of the radius are reported with index tree.n
+    neighbour_elevations = np.append(elevations, np.nan)[neighbours]
+    is_valid = np.isfinite(neighbour_elevations)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(is_valid, neighbour_elevations, 0.0).sum(axis=1) / is_valid.sum(axis=1)
+
+
+def interpolate_elevation_from_nearest_points(
+    shoreline_points_per_center_line: PointsPerCenterline,
+    transect_points_with_elevation: gpd.GeoDataFrame,
+    buffer_distance: float,
+    aggregation: ElevationAggregation = ElevationAggregation.mean,
+    number_of_nearest_points: int = 8,
+    inverse_distance_power: float = 2.0,
+    chunk_size: int = 100_000,
+) -> gpd.GeoDataFrame:
+    shoreline_coordinates = extract_coordinates(shoreline_points_per_center_line.points.geometry)
+    elevation_per_point = np.full(len(shoreline_coordinates), np.nan)
+    if len(transect_points_with_elevation.index) > 0:
+        tree = cKDTree(extract_coordinates(transect_points_with_elevation.geometry))
+        elevations = transect_points_with_elevation["z_interpolated"].values.astype(float)
+        for chunk_start in range(0, len(shoreline_coordinates), chunk_size):
+            chunk = slice(chunk_start, chunk_start + chunk_size)
+            if aggregation == ElevationAggregation.k_nearest:
+                elevation_per_point[chunk] = average_elevations_of_nearest_points(
+                    tree, elevations, shoreline_coordinates[chunk], buffer_distance, number_of_nearest_points
+                )
+            else:
+                elevation_per_point[chunk] = aggregate_elevations_within_radius(
+                    tree, elevations, shoreline_coordinates[chunk], buffer_distance, aggregation, inverse_distance_power
+                )
+
+    return gpd.GeoDataFrame(
+        {"z_interpolated": elevation_per_point}, geometry=shoreline_points_per_center_line.points.geometry
+    )
@@ -1,48 +1,142 @@
-from typing import Iterable, Optional
+import os
+from dataclasses import dataclass
+from typing import Optional
 
 import geopandas as gpd
+import numpy as np
 from matplotlib import pyplot as plt
+from matplotlib.collections import LineCollection, PolyCollection
 from plotly import graph_objs as go
 
 from tools import figure_generator
 from tools.figure_generator import create_figure_if_none_given
-from water_surface_preparation.data_classes.points_per_line import TransectLinesAtPoint, ProcessedPointsPerCenterLine
+from utils.plot_dispatcher import get_shared_plot_dispatcher
+from water_surface_preparation.data_classes.points_per_line import ProcessedPointsPerCenterLine, TransectSet
 
+# the public plotting functions only extract the arrays a figure needs and hand them to the shared plot dispatcher.
+# the render functions draw the figure from these arrays, wherever the dispatcher runs them, and save it into the
+# given output directory.
 
-def debug_plot(geo_data_frame: gpd.GeoDataFrame, filename: str) -> None:
-    geo_data_frame.plot()
-    plt.savefig(f"out\\{filename}.jpg")
 
+@dataclass(frozen=True)
+class CompactGeometries:
+    point_coordinates: np.ndarray
+    line_coordinates: list[np.ndarray]
+    polygon_coordinates: list[np.ndarray]
 
-def create_plot_for_transect_lines(transect_lines_and_points: Iterable[TransectLinesAtPoint], i: int) -> None:
-    all_lines = [element.right_line for element in transect_lines_and_points] + [
-        element.left_line for element in transect_lines_and_points
-    ]
-    data_frame_with_all_lines = gpd.GeoDataFrame(geometry=all_lines)
-    debug_plot(data_frame_with_all_lines, f"transect_lines_and_points{i}")
+
+def compact_geometries(geometries: gpd.GeoSeries) -> CompactGeometries:
+    geometries = geometries[~(geometries.isna() | geometries.is_empty)]
+    if (geometries.geom_type == "Point").all():
+        return CompactGeometries(np.column_stack([geometries.x.values, geometries.y.values]), [], [])
+    point_coordinates, line_coordinates, polygon_coordinates = [], [], []
+    for geometry in geometries:
+        for part in getattr(geometry, "geoms", [geometry]):
+            if part.geom_type == "Point":
+                point_coordinates.append(part.coords[0][:2])
+            elif part.geom_type in ("LineString", "LinearRing"):
+                line_coordinates.append(np.asarray(part.coords)[:, :2])
+            elif part.geom_type == "Polygon":
+                polygon_coordinates.append(np.asarray(part.exterior.coords)[:, :2])
+    return CompactGeometries(np.array(point_coordinates).reshape(-1, 2), line_coordinates, polygon_coordinates)
+
+
+def render_geometries(geometries: CompactGeometries, filename: str, output_directory: str) -> None:
+    figure, axes = plt.subplots()
+    if geometries.polygon_coordinates:
+        axes.add_collection(PolyCollection(geometries.polygon_coordinates))
+    if geometries.line_coordinates:
+        axes.add_collection(LineCollection(geometries.line_coordinates))
+    if len(geometries.point_coordinates) > 0:
+        axes.scatter(geometries.point_coordinates[:, 0], geometries.point_coordinates[:, 1], s=10)
+    axes.autoscale()
+    axes.set_aspect("equal")
+    figure.savefig(os.path.join(output_directory, f"{filename}.jpg"))
+    plt.close(figure)
+
+
+def debug_plot(geo_data_frame: gpd.GeoDataFrame, filename: str, output_directory: str = "out") -> None:
+    dispatcher = get_shared_plot_dispatcher()
+    if not dispatcher.is_enabled:
+        return
+    dispatcher.submit(render_geometries, compact_geometries(geo_data_frame.geometry), filename, output_directory)
+
+
+def create_plot_for_transect_lines(
+    transect_lines_and_points: TransectSet, i: int, output_directory: str = "out"
+) -> None:
+    dispatcher = get_shared_plot_dispatcher()
+    if not dispatcher.is_enabled:
+        return
+    origins = np.column_stack([transect_lines_and_points.origin_x, transect_lines_and_points.origin_y])
+    segments = np.concatenate(
+        [
+            np.stack([origins, np.column_stack(transect_lines_and_points.right_end_coordinates())], axis=1),
+            np.stack([origins, np.column_stack(transect_lines_and_points.left_end_coordinates())], axis=1),
+        ]
+    )
+    # the last transect has no direction
+    segments = segments[np.isfinite(segments).all(axis=(1, 2))]
+    dispatcher.submit(
+        render_geometries,
+        CompactGeometries(np.empty((0, 2)), list(segments), []),
+        f"transect_lines_and_points{i}",
+        output_directory,
+    )
+
+
+def extract_columns(points: gpd.GeoDataFrame, *column_names: str) -> tuple[np.ndarray, ...]:
+    return tuple(points[column_name].values for column_name in column_names)
 
 
 def plot_smooth_vs_raster_elevation(
     i: int,
-    processed_center_points: gpd.GeoDataFrame,
+    processed_center_points: ProcessedPointsPerCenterLine,
     interpolated_points_along_center_line_with_center_line: ProcessedPointsPerCenterLine,
-    interpolated_points_along_center_line_with_dsm_value: gpd.GeoDataFrame,
     gps_points_along_center_line: Optional[gpd.GeoDataFrame],
+    output_directory: str = "out",
 ):
+    dispatcher = get_shared_plot_dispatcher()
+    if not dispatcher.is_enabled:
+        return
+    dispatcher.submit(
+        render_smooth_vs_raster_elevation,
+        i,
+        extract_columns(processed_center_points.projected_points, "distance", "z_smooth", "z_raster"),
+        extract_columns(
+            interpolated_points_along_center_line_with_center_line.projected_points, "distance", "z_interpolated"
+        ),
+        (
+            extract_columns(gps_points_along_center_line, "distance", "z_raster")
+            if gps_points_along_center_line is not None
+            else None
+        ),
+        output_directory,
+    )
+
+
+def render_smooth_vs_raster_elevation(
+    i: int,
+    distances_smoothed_and_raster_elevations: tuple[np.ndarray, np.ndarray, np.ndarray],
+    distances_and_interpolated_elevations: tuple[np.ndarray, np.ndarray],
+    distances_and_elevations_of_gps_points: Optional[tuple[np.ndarray, np.ndarray]],
+    output_directory: str,
+) -> None:
+    distances, smoothed_elevations, raster_elevations = distances_smoothed_and_raster_elevations
     figure = create_figure_if_none_given()
     if add_smoothed_points := False:
         figure.add_trace(
             go.Scatter(
-                x=processed_center_points.projected_points["distance"].values,
-                y=processed_center_points.projected_points["z_smooth"].values,
+                x=distances,
+                y=smoothed_elevations,
                 name="smoothed points along centerline",
                 mode="markers",
             )
         )
     figure.add_trace(
         go.Scatter(
-            x=processed_center_points.projected_points["distance"].values,
-            y=processed_center_points.projected_points["z_raster"].values,
+            x=distances,
+            y=raster_elevations,
             name="open shore points extracted from the DSM",
             mode="markers",
             marker_symbol="square",
@@ -50,19 +144,19 @@ def plot_smooth_vs_raster_elevation(
     )
     figure.add_trace(
         go.Scatter(
-            x=interpolated_points_along_center_line_with_center_line.projected_points["distance"].values,
-            y=interpolated_points_along_center_line_with_center_line.projected_points["z_interpolated"].values,
+            x=distances_and_interpolated_elevations[0],
+            y=distances_and_interpolated_elevations[1],
             name="interpolated points along centerline",
             mode="markers",
             marker_symbol="circle",
         )
     )
 
-    if gps_points_along_center_line is not None:
+    if distances_and_elevations_of_gps_points is not None:
         figure.add_trace(
             go.Scatter(
-                x=gps_points_along_center_line["distance"].values,
-                y=gps_points_along_center_line["z_raster"].values,
+                x=distances_and_elevations_of_gps_points[0],
+                y=distances_and_elevations_of_gps_points[1],
                 name="GPS shore points",
                 mode="markers",
                 marker_symbol="cross",
@@ -77,29 +171,43 @@ def plot_smooth_vs_raster_elevation(
         margin=dict(l=1, r=1, b=1, t=1),
         font=dict(size=20),
     )
-    figure.write_html(f"out\\_plot_smooth_vs_raster_elevation{i}.html")
+    figure.write_html(os.path.join(output_directory, f"_plot_smooth_vs_raster_elevation{i}.html"))
     figure.write_image(
-        f"out\\_plot_smooth_vs_raster_elevation_ws{i}.svg", format="svg", width=1200, height=600, scale=2
+        os.path.join(output_directory, f"_plot_smooth_vs_raster_elevation_ws{i}.svg"),
+        format="svg",
+        width=1200,
+        height=600,
+        scale=2,
     )
 
 
 def plot_interpolated_vs_smooth_and_raster_elevation(
-    i, interpolated_points_along_center_line_with_center_line, processed_center_points
+    i, interpolated_points_along_center_line_with_center_line, processed_center_points, output_directory: str = "out"
 ):
-    plt.show(block=False)
-    plt.scatter(
-        x=processed_center_points.projected_points["distance"].values,
-        y=processed_center_points.projected_points["z_smooth"].values,
-        c="orange",
+    dispatcher = get_shared_plot_dispatcher()
+    if not dispatcher.is_enabled:
+        return
+    dispatcher.submit(
+        render_interpolated_vs_smooth_and_raster_elevation,
+        i,
+        extract_columns(
+            interpolated_points_along_center_line_with_center_line.projected_points, "distance", "z_interpolated"
+        ),
+        extract_columns(processed_center_points.projected_points, "distance", "z_smooth", "z_raster"),
+        output_directory,
     )
-    plt.scatter(
-        x=processed_center_points.projected_points["distance"].values,
-        y=processed_center_points.projected_points["z_raster"].values,
-        c="red",
-    )
-    plt.scatter(
-        x=interpolated_points_along_center_line_with_center_line.projected_points["distance"],
-        y=interpolated_points_along_center_line_with_center_line.projected_points["z_interpolated"].values,
-        c="green",
-    )
-    plt.savefig(f"out\\interpolated_vs_smooth_and_raster{i}.jpg")
+
+
+def render_interpolated_vs_smooth_and_raster_elevation(
+    i: int,
+    distances_and_interpolated_elevations: tuple[np.ndarray, np.ndarray],
+    distances_smoothed_and_raster_elevations: tuple[np.ndarray, np.ndarray, np.ndarray],
+    output_directory: str,
+) -> None:
+    distances, smoothed_elevations, raster_elevations = distances_smoothed_and_raster_elevations
+    figure, axes = plt.subplots()
+    axes.scatter(x=distances, y=smoothed_elevations, c="orange")
+    axes.scatter(x=distances, y=raster_elevations, c="red")
+    axes.scatter(x=distances_and_interpolated_elevations[0], y=distances_and_interpolated_elevations[1], c="green")
+    figure.savefig(os.path.join(output_directory, f"interpolated_vs_smooth_and_raster{i}.jpg"))
+    plt.close(figure)
@@ -1,17 +1,54 @@
 import geopandas as gpd
 import numpy as np
-from shapely.geometry import MultiPoint, LineString
-from shapely.ops import substring
+from shapely.geometry import LineString
+
+
+def calculate_sampling_distances(line_length: float, sampling_distance: float) -> np.ndarray:
+    # every sampling_distance from the origin plus the end of the line, as the boundaries of consecutive substrings
+    return np.append(np.arange(0, line_length, sampling_distance), line_length)
+
+
+def interpolate_coordinates_along_line(line: LineString, distances: np.ndarray) -> np.ndarray:
+    coordinates = np.asarray(line.coords)
+    segment_lengths = np.hypot(*np.diff(coordinates[:, :2], axis=0).T)
+    cumulative_lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+    segment_indices = np.searchsorted(cumulative_lengths, distances, side="right") - 1
+    segment_indices = np.clip(segment_indices, 0, len(segment_lengths) - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fractions = (distances - cumulative_lengths[segment_indices]) / segment_lengths[segment_indices]
+    fractions = np.clip(np.nan_to_num(fractions, nan=0.0), 0.0, 1.0)
+    start_coordinates = coordinates[segment_indices]
+    interpolated = start_coordinates + fractions[:, None] * (coordinates[segment_indices + 1] - start_coordinates)
+    # the end of the line is taken as is, so that touching lines share exactly the same endpoint
+    interpolated[distances >= cumulative_lengths[-1]] = coordinates[-1]
+    return interpolated
 
 
 def sample_points_along_line(open_shore_shoreline: gpd.GeoDataFrame, sampling_distance: float) -> gpd.GeoDataFrame:
-    multi_point = MultiPoint()
-    for line in (geom for geom in open_shore_shoreline.geometry if isinstance(geom, LineString)):
-        if np.isnan(line.length):
+    coordinates_per_line, line_ids_per_line, chainages_per_line = [], [], []
+    for line_id, line in open_shore_shoreline.geometry.items():
+        if not isinstance(line, LineString) or np.isnan(line.length) or line.length == 0:
             continue
-        for i in np.arange(0, line.length, sampling_distance):
-            s = substring(line, i, i + sampling_distance)
-            multi_point = multi_point.union(s.boundary)
+        chainages = calculate_sampling_distances(line.length, sampling_distance)
+        coordinates_per_line.append(interpolate_coordinates_along_line(line, chainages))
+        line_ids_per_line.append(np.full(len(chainages), line_id))
+        chainages_per_line.append(chainages)
+
+    if not coordinates_per_line:
+        return gpd.GeoDataFrame({"line_id": [], "chainage": []}, geometry=[], crs=open_shore_shoreline.crs)
+
+    number_of_dimensions = min(coordinates.shape[1] for coordinates in coordinates_per_line)
+    coordinates = np.concatenate([coordinates[:, :number_of_dimensions] for coordinates in coordinates_per_line])
+    # shared endpoints (e.g. touching shoreline segments) are kept once, at their first occurrence.
+    # rounding to a nanometre merges points that only differ by floating point noise.
+    _, first_occurrences = np.unique(np.round(coordinates, 9), axis=0, return_index=True)
+    first_occurrences.sort()
+    coordinates = coordinates[first_occurrences]
     return gpd.GeoDataFrame(
-        geometry=(gpd.GeoSeries(point_series for point_series in multi_point)), crs=open_shore_shoreline.crs
+        {
+            "line_id": np.concatenate(line_ids_per_line)[first_occurrences],
+            "chainage": np.concatenate(chainages_per_line)[first_occurrences],
+        },
+        geometry=gpd.points_from_xy(*coordinates.T),
+        crs=open_shore_shoreline.crs,
     )
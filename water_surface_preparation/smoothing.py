@@ -1,23 +1,157 @@
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from scipy.signal import fftconvolve, savgol_filter
 from statsmodels import api as sm
 
+from water_surface_preparation.data_classes.enums import SmoothingMethod
+from water_surface_preparation.data_classes.parameters import ParametersForSmoothing
 from water_surface_preparation.data_classes.points_per_line import (
     OrderedProjectedPointsPerCenterLine,
     ProcessedPointsPerCenterLine,
 )
 
 
+def smooth_with_lowess(
+    chainages: np.ndarray, elevations: np.ndarray, frac: float, parameters: ParametersForSmoothing
+) -> np.ndarray:
+    return sm.nonparametric.lowess(elevations, chainages, frac=frac)[:, 1]
+
+
+def smooth_with_delta_lowess(
+    chainages: np.ndarray, elevations: np.ndarray, frac: float, parameters: ParametersForSmoothing
+) -> np.ndarray:
+    # local fits are only done every lowess_delta metres and interpolated linearly in between, which makes the
+    # cost linear in the number of points. the default delta of 1% of the range is the one statsmodels recommends.
+    delta = parameters.lowess_delta
+    if delta is None:
+        delta = 0.01 * (chainages.max() - chainages.min())
+    return sm.nonparametric.lowess(elevations, chainages, frac=frac, delta=delta, is_sorted=True)[:, 1]
+
+
+def calculate_window_length(chainages: np.ndarray, frac: float, parameters: ParametersForSmoothing) -> float:
+    if parameters.window_length is not None:
+        return parameters.window_length
+    return frac * (chainages.max() - chainages.min())
+
+
+def create_regular_chainages(chainages: np.ndarray, resampling_distance: float) -> np.ndarray:
+    number_of_steps = int(np.ceil((chainages.max() - chainages.min()) / resampling_distance))
+    return chainages.min() + np.arange(number_of_steps + 1) * resampling_distance
+
+
+def smooth_with_savitzky_golay(
+    chainages: np.ndarray, elevations: np.ndarray, frac: float, parameters: ParametersForSmoothing
+) -> np.ndarray:
+    # the points are resampled linearly on a regular chainage grid, so unevenly spaced points are weighted by the
+    # length they cover and not by their number
+    regular_chainages = create_regular_chainages(chainages, parameters.resampling_distance)
+    resampled_elevations = np.interp(regular_chainages, chainages, elevations)
+    window_size = int(calculate_window_length(chainages, frac, parameters) / parameters.resampling_distance)
+    window_size = min(window_size + (window_size + 1) % 2, len(regular_chainages) - (len(regular_chainages) + 1) % 2)
+    if window_size <= parameters.polynomial_order:
+        return np.interp(chainages, regular_chainages, resampled_elevations)
+    smoothed_elevations = savgol_filter(resampled_elevations, window_size, parameters.polynomial_order, mode="interp")
+    return np.interp(chainages, regular_chainages, smoothed_elevations)
+
+
+def smooth_with_gaussian_kernel(
+    chainages: np.ndarray, elevations: np.ndarray, frac: float, parameters: ParametersForSmoothing
+) -> np.ndarray:
+    # gaussian weighted local linear regression like lowess, so a sloped water surface is not biased at the ends
+    # of the line. the points are binned linearly onto a regular chainage grid and all weighted sums are
+    # convolutions of the binned weights and elevations with the kernel (times its offset), done via fft.
+    # the default standard deviation is a fifth of the window, close to the one of the tricube kernel of lowess.
+    standard_deviation = parameters.kernel_standard_deviation
+    if standard_deviation is None:
+        standard_deviation = calculate_window_length(chainages, frac, parameters) / 5
+    regular_chainages = create_regular_chainages(chainages, parameters.resampling_distance)
+    positions_on_grid = (chainages - regular_chainages[0]) / parameters.resampling_distance
+    lower_indices = np.clip(np.floor(positions_on_grid).astype(np.intp), 0, max(len(regular_chainages) - 2, 0))
+    upper_fractions = np.clip(positions_on_grid - lower_indices, 0.0, 1.0)
+    upper_indices = np.minimum(lower_indices + 1, len(regular_chainages) - 1)
+    weights = np.bincount(lower_indices, 1 - upper_fractions, minlength=len(regular_chainages)) + np.bincount(
+        upper_indices, upper_fractions, minlength=len(regular_chainages)
+    )
+    weighted_elevations = np.bincount(
+        lower_indices, (1 - upper_fractions) * elevations, minlength=len(regular_chainages)
+    ) + np.bincount(upper_indices, upper_fractions * elevations, minlength=len(regular_chainages))
+
+    half_kernel_size = max(int(np.ceil(4 * standard_deviation / parameters.resampling_distance)), 1)
+    kernel_offsets = np.arange(half_kernel_size, -half_kernel_size - 1, -1) * parameters.resampling_distance
+    kernel = np.exp(-0.5 * (kernel_offsets / max(standard_deviation, np.finfo(float).tiny)) ** 2)
+    sum_of_weights = fftconvolve(weights, kernel, mode="same")
+    sum_of_weighted_offsets = fftconvolve(weights, kernel * kernel_offsets, mode="same")
+    sum_of_weighted_squared_offsets = fftconvolve(weights, kernel * kernel_offsets**2, mode="same")
+    sum_of_weighted_elevations = fftconvolve(weighted_elevations, kernel, mode="same")
+    sum_of_weighted_offset_elevations = fftconvolve(weighted_elevations, kernel * kernel_offsets, mode="same")
+    determinants = sum_of_weights * sum_of_weighted_squared_offsets - sum_of_weighted_offsets**2
+
+    # fft round off leaves tiny non-zero sums far away from all points, where there is no estimate.
+    # where the points do not span a slope (e.g. only one point within the kernel) the weighted mean is taken.
+    has_support = sum_of_weights > 1e-9 * kernel.sum()
+    has_slope = has_support & (determinants > 1e-9 * sum_of_weights * sum_of_weighted_squared_offsets)
+    smoothed_elevations = np.full(len(regular_chainages), np.nan)
+    smoothed_elevations[has_support] = sum_of_weighted_elevations[has_support] / sum_of_weights[has_support]
+    smoothed_elevations[has_slope] = (
+        sum_of_weighted_squared_offsets[has_slope] * sum_of_weighted_elevations[has_slope]
+        - sum_of_weighted_offsets[has_slope] * sum_of_weighted_offset_elevations[has_slope]
+    ) / determinants[has_slope]
+    return np.interp(chainages, regular_chainages[has_support], smoothed_elevations[has_support])
+
+
+def smooth_with_rolling_window(
+    chainages: np.ndarray, elevations: np.ndarray, frac: float, parameters: ParametersForSmoothing
+) -> np.ndarray:
+    rolling_mean = pd.Series(elevations).rolling(window=parameters.rolling_window_size, min_periods=1, center=True)
+    return rolling_mean.mean().values
+
+
+smoothers_per_method: dict[
+    SmoothingMethod, Callable[[np.ndarray, np.ndarray, float, ParametersForSmoothing], np.ndarray]
+] = {
+    SmoothingMethod.lowess: smooth_with_lowess,
+    SmoothingMethod.delta_lowess: smooth_with_delta_lowess,
+    SmoothingMethod.savitzky_golay: smooth_with_savitzky_golay,
+    SmoothingMethod.gaussian_kernel: smooth_with_gaussian_kernel,
+    SmoothingMethod.rolling_window: smooth_with_rolling_window,
+}
+
+
+def smooth_elevations(
+    chainages: np.ndarray, elevations: np.ndarray, frac: float, parameters: ParametersForSmoothing
+) -> np.ndarray:
+    # chainages have to be ordered ascending, the smoothed elevations are returned in the same order.
+    # points without elevation get the smoothed elevation interpolated from their neighbours
+    is_valid = np.isfinite(elevations)
+    if not is_valid.any():
+        return np.full(len(chainages), np.nan)
+    smooth = smoothers_per_method[parameters.method]
+    if is_valid.all():
+        return smooth(chainages, elevations, frac, parameters)
+    return np.interp(
+        chainages, chainages[is_valid], smooth(chainages[is_valid], elevations[is_valid], frac, parameters)
+    )
+
+
 def apply_rolling_window_smoothing(
     projected_points: OrderedProjectedPointsPerCenterLine,
 ) -> ProcessedPointsPerCenterLine:
-    rolling_mean = projected_points.projected_points["z_raster"].rolling(window=20, min_periods=1, center=True).mean()
-    projected_points.projected_points["z_smooth"] = rolling_mean.values
-    return ProcessedPointsPerCenterLine(projected_points.projected_points, projected_points.center_line)
-
-
-def smooth_elevations_along_line(ordered_projected_points, frac):
-    ordered_projected_points.projected_points["z_smooth"] = sm.nonparametric.lowess(
-        ordered_projected_points.projected_points["z_raster"].values,
-        ordered_projected_points.projected_points["distance"].values,
-        frac=frac,
-    )[:, 1]
-    return ordered_projected_points
+    return smooth_elevations_along_line(
+        projected_points, frac=0.0, parameters=ParametersForSmoothing(method=SmoothingMethod.rolling_window)
+    )
+
+
+def smooth_elevations_along_line(
+    ordered_projected_points: OrderedProjectedPointsPerCenterLine,
+    frac: float,
+    parameters: ParametersForSmoothing = ParametersForSmoothing(),
+) -> ProcessedPointsPerCenterLine:
+    ordered_projected_points.projected_points["z_smooth"] = smooth_elevations(
+        ordered_projected_points.projected_points["distance"].values.astype(float),
+        ordered_projected_points.projected_points["z_raster"].values.astype(float),
+        frac,
+        parameters,
+    )
+    return ProcessedPointsPerCenterLine(ordered_projected_points.projected_points, ordered_projected_points.center_line)
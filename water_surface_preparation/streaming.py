@@ -0,0 +1,175 @@
+import gc
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import geopandas as gpd
+import numpy as np
+from shapely import ops
+from shapely.geometry import LineString, Polygon
+
+from utils.instrumentation import measure_resident_memory_in_megabytes
+from water_surface_preparation.data_classes.enums import SmoothingMethod
+from water_surface_preparation.data_classes.parameters import (
+    ParametersForOneProcess,
+    ParametersForSmoothing,
+    ParametersForStreaming,
+)
+
+
+@dataclass(frozen=True)
+class ChunkOfCenterLine:
+    # the points of a chunk are computed from everything between the chainages with overlap, but only the ones
+    # between start_chainage (included) and end_chainage (excluded, unless it is the end of the line) are kept
+    center_line_id: int
+    start_chainage: float
+    end_chainage: float
+    start_chainage_with_overlap: float
+    end_chainage_with_overlap: float
+    is_last_chunk: bool
+    center_line: gpd.GeoDataFrame
+    region: Polygon
+
+    def is_in_core(self, chainages: np.ndarray) -> np.ndarray:
+        is_beyond_start = chainages >= self.start_chainage
+        if self.is_last_chunk:
+            return is_beyond_start
+        return is_beyond_start & (chainages < self.end_chainage)
+
+
+@dataclass(frozen=True)
+class FinishedPointsOfChunk:
+    # only the points in the core of the chunk, with their chainage on the whole center line
+    filtered_points: gpd.GeoDataFrame
+    points_along_center_line: gpd.GeoDataFrame
+    shore_points_with_elevation: gpd.GeoDataFrame
+
+
+class MemoryCeiling:
+    # shortens the chunks while the process uses more memory than allowed after a chunk. freed memory is not always
+    # given back to the system, so the ceiling is a target and not a guarantee
+    def __init__(self, parameters: ParametersForStreaming):
+        self.maximal_memory_in_megabytes = parameters.maximal_memory_in_megabytes
+        self.minimal_chunk_length = parameters.minimal_chunk_length
+        self.chunk_length = parameters.chunk_length
+
+    def check_after_chunk(self) -> None:
+        if self.maximal_memory_in_megabytes is None:
+            return
+        gc.collect()
+        resident_memory = measure_resident_memory_in_megabytes()
+        if resident_memory is None or resident_memory <= self.maximal_memory_in_megabytes:
+            return
+        if self.chunk_length > self.minimal_chunk_length:
+            self.chunk_length = max(self.chunk_length / 2, self.minimal_chunk_length)
+            print(
+                f"{resident_memory:.0f} MB in use, more than {self.maximal_memory_in_megabytes:.0f} MB, "
+                f"the next chunks are {self.chunk_length:.0f} m long"
+            )
+
+
+def calculate_smoothing_window_length(
+    parameters_for_smoothing: ParametersForSmoothing, sampling_distance: float
+) -> float:
+    # chainage metres the smoother reaches from a point. a window derived from frac would grow with the length of the
+    # line and so would the overlap of the chunks, which is why streaming needs a window in metres
+    if parameters_for_smoothing.method == SmoothingMethod.rolling_window:
+        return parameters_for_smoothing.rolling_window_size * sampling_distance
+    if parameters_for_smoothing.kernel_standard_deviation is not None:
+        return 5 * parameters_for_smoothing.kernel_standard_deviation
+    if parameters_for_smoothing.window_length is not None:
+        return parameters_for_smoothing.window_length
+    raise ValueError(
+        f"streaming needs a smoothing window in metres, set the window_length of the parameters for smoothing with "
+        f"method {parameters_for_smoothing.method.value} instead of deriving it from frac and the length of the line"
+    )
+
+
+def calculate_overlap_of_chunks(parameters: ParametersForOneProcess) -> float:
+    # the reaches add up: the filter decides on the points the smoother uses, the transects of the smoothed points
+    # along the center line are trimmed against their neighbours and the shore points take the elevation of the
+    # transect points within the buffer distance
+    reach_of_smoother = calculate_smoothing_window_length(
+        parameters.parameters_for_smoothing, parameters.sampling_distance
+    )
+    reach_of_filter = parameters.parameters_to_filter_sampling_points.buffer_distance
+    reach_of_transects = max(2 * parameters.line_length, parameters.buffer_distance + parameters.line_length)
+    return max(
+        parameters.parameters_for_streaming.minimal_overlap, reach_of_smoother + reach_of_filter + reach_of_transects
+    )
+
+
+def calculate_frac_of_chunk(
+    parameters_for_smoothing: ParametersForSmoothing, sampling_distance: float, length_of_chunk: float
+) -> float:
+    # the window in metres is the same for every chunk. lowess takes it as frac, a share of the points of the chunk
+    window_length = calculate_smoothing_window_length(parameters_for_smoothing, sampling_distance)
+    return min(window_length / length_of_chunk, 1.0) if length_of_chunk > 0 else 1.0
+
+
+def round_up_to_multiple(value: float, step: float) -> float:
+    return float(np.ceil(value / step) * step)
+
+
+def split_center_line_into_chunks(
+    center_line: gpd.GeoDataFrame,
+    center_line_id: int,
+    memory_ceiling: MemoryCeiling,
+    overlap: float,
+    sampling_distance: float,
+    buffer_distance: float,
+) -> Iterator[ChunkOfCenterLine]:
+    # the chainages of the chunks are multiples of the sampling distance, so the points sampled along the chunks
+    # are the ones sampled along the whole line. the chunk length is read anew for every chunk
+    line = center_line.geometry.iloc[0]
+    length_of_line = line.length
+    overlap = round_up_to_multiple(overlap, sampling_distance)
+    start_chainage = 0.0
+    while True:
+        chunk_length = max(round_up_to_multiple(memory_ceiling.chunk_length, sampling_distance), sampling_distance)
+        end_chainage = start_chainage + chunk_length
+        # a rest shorter than the overlap is added to the last chunk
+        is_last_chunk = end_chainage + overlap >= length_of_line
+        if is_last_chunk:
+            end_chainage = length_of_line
+        start_chainage_with_overlap = max(start_chainage - overlap, 0.0)
+        end_chainage_with_overlap = min(end_chainage + overlap, length_of_line)
+        part_of_line = ops.substring(line, start_chainage_with_overlap, end_chainage_with_overlap)
+        yield ChunkOfCenterLine(
+            center_line_id=center_line_id,
+            start_chainage=start_chainage,
+            end_chainage=end_chainage,
+            start_chainage_with_overlap=start_chainage_with_overlap,
+            end_chainage_with_overlap=end_chainage_with_overlap,
+            is_last_chunk=is_last_chunk,
+            center_line=gpd.GeoDataFrame(geometry=[part_of_line], crs=center_line.crs),
+            region=part_of_line.buffer(buffer_distance, cap_style=2),
+        )
+        if is_last_chunk:
+            return
+        start_chainage = end_chainage
+
+
+def clip_lines_to_region(lines: gpd.GeoDataFrame, region: Polygon) -> gpd.GeoDataFrame:
+    # the parts of the lines within the region as single line strings, with the attributes of their line. only the
+    # lines whose bounds intersect the region are tested, the spatial index is built once per data frame
+    lines = lines.iloc[np.sort(lines.sindex.query(region))]
+    lines = lines[lines.intersects(region)]
+    clipped_geometries = lines.geometry.intersection(region)
+    parts_of_lines, indices_of_lines = [], []
+    for index, geometry in clipped_geometries.items():
+        for part in getattr(geometry, "geoms", [geometry]):
+            if isinstance(part, LineString) and not part.is_empty:
+                parts_of_lines.append(part)
+                indices_of_lines.append(index)
+    return gpd.GeoDataFrame(
+        lines.drop(columns=lines.geometry.name).loc[indices_of_lines].reset_index(drop=True),
+        geometry=parts_of_lines,
+        crs=lines.crs,
+    )
+
+
+def select_points_within_bounds(points: Optional[gpd.GeoDataFrame], region: Polygon) -> Optional[gpd.GeoDataFrame]:
+    if points is None:
+        return None
+    minimal_x, minimal_y, maximal_x, maximal_y = region.bounds
+    return points.cx[minimal_x:maximal_x, minimal_y:maximal_y]
@@ -1,164 +1,118 @@
-import math
-from dataclasses import replace
-from itertools import combinations
-from typing import Sequence, Iterable
+import dataclasses
 
 import geopandas as gpd
-import numpy
-from shapely.geometry import LineString, Point
-
-from water_surface_preparation.sampling import sample_points_along_line
-from utils import pairwise
-from utils.angle_calculation import angle_between_two_points
-from water_surface_preparation.data_classes.points_per_line import TransectLinesAtPoint
-
-
-def create_one_side_of_transect(point, theta, line_length: float, rotation_angle: float) -> LineString:
-    bearing = math.radians(theta + rotation_angle)
-    x = point.x + line_length * math.cos(bearing)
-    y = point.y + line_length * math.sin(bearing)
-    return LineString(((point.x, point.y), (x, y)))
-
-
-def calculate_transects(
-    points_to_calculate_transects_on: gpd.GeoDataFrame, line_length: int
-) -> list[TransectLinesAtPoint]:
-    points_to_calculate_transects_on["theta_angle"] = numpy.nan
-    for i, (first_point, second_point) in enumerate(pairwise(points_to_calculate_transects_on.geometry)):
-        points_to_calculate_transects_on.loc[i, "theta_angle"] = angle_between_two_points(first_point, second_point)
-
-    transect_lines_and_points = []
-    for i, (index, row) in enumerate(points_to_calculate_transects_on.iterrows()):
-        right_line = create_one_side_of_transect(
-            row.geometry, theta=row["theta_angle"], line_length=line_length, rotation_angle=90
-        )
-        left_line = create_one_side_of_transect(
-            row.geometry, theta=row["theta_angle"], line_length=line_length, rotation_angle=-90
-        )
-        transect_lines_and_points.append(
-            TransectLinesAtPoint(row.geometry, right_line, left_line, i, row["z_interpolated"])
-        )
-
-    return transect_lines_and_points
-
-
-def cut_line_at_points(line: LineString, points: Sequence[Point]) -> list[LineString]:
-    # First coords of line
-    coords = list(line.coords)
-
-    # Keep list coords where to cut (cuts = 1)
-    cuts = [0] * len(coords)
-    cuts[0] = 1
-    cuts[-1] = 1
-
-    # Add the coords from the points
-    coords += [list(p.coords)[0] for p in points]
-    cuts += [1] * len(points)
-
-    # Calculate the distance along the line for each point
-    dists = [line.project(Point(p)) for p in coords]
-    coords = [p for (d, p) in sorted(zip(dists, coords))]
-    cuts = [p for (d, p) in sorted(zip(dists, cuts))]
-
-    lines = []
-
-    for i in range(len(coords) - 1):
-        if cuts[i] == 1:
-            # find next element in cuts == 1 starting from index i + 1
-            j = cuts.index(1, i + 1)
-            lines.append(LineString(coords[i : j + 1]))
-
-    return lines
-
-
-def trim_intersecting_parts_of_transects(
-    transects_per_point_on_center_line: list[TransectLinesAtPoint],
-) -> list[TransectLinesAtPoint]:
-    trimmed_transects_per_point_on_center_line: dict[int, TransectLinesAtPoint] = {
-        transects_with_point.transect_number: transects_with_point
-        for transects_with_point in transects_per_point_on_center_line
-    }
-    for first_transect, second_transect in combinations(transects_per_point_on_center_line, 2):
-        first_transect: TransectLinesAtPoint
-        second_transect: TransectLinesAtPoint
-        intersection_result = first_transect.left_line.intersection(second_transect.left_line)
-        lines_do_intersect = isinstance(intersection_result, Point)
-        if lines_do_intersect:
-            first_trimmed_lines = cut_line_at_points(first_transect.left_line, [intersection_result])
-            first_trimmed_line = get_line_that_originates_at_center_point(first_transect, first_trimmed_lines)
-            update_transect_left_line_if_its_shorter(
-                first_transect, first_trimmed_line, trimmed_transects_per_point_on_center_line
-            )
-            second_trimmed_lines = cut_line_at_points(second_transect.left_line, [intersection_result])
-            second_trimmed_line = get_line_that_originates_at_center_point(second_transect, second_trimmed_lines)
-            update_transect_left_line_if_its_shorter(
-                second_transect, second_trimmed_line, trimmed_transects_per_point_on_center_line
-            )
-        intersection_result = first_transect.right_line.intersection(second_transect.right_line)
-        lines_do_intersect = isinstance(intersection_result, Point)
-        if lines_do_intersect:
-            first_trimmed_lines = cut_line_at_points(first_transect.right_line, [intersection_result])
-            first_trimmed_line = get_line_that_originates_at_center_point(first_transect, first_trimmed_lines)
-            update_transect_right_line_if_its_shorter(
-                first_transect, first_trimmed_line, trimmed_transects_per_point_on_center_line
-            )
-            second_trimmed_lines = cut_line_at_points(second_transect.right_line, [intersection_result])
-            second_trimmed_line = get_line_that_originates_at_center_point(second_transect, second_trimmed_lines)
-            update_transect_right_line_if_its_shorter(
-                second_transect, second_trimmed_line, trimmed_transects_per_point_on_center_line
-            )
-
-    return list(trimmed_transects_per_point_on_center_line.values())
-
-
-def get_line_that_originates_at_center_point(
-    transect: TransectLinesAtPoint, trimmed_lines: Iterable[LineString]
-) -> LineString:
-    matching_line = None
-    for line in trimmed_lines:
-        if transect.point.intersects(line):
-            matching_line = line
-            break
-    assert matching_line is not None
-    return matching_line
-
-
-def update_transect_left_line_if_its_shorter(
-    transect: TransectLinesAtPoint,
-    trimmed_line: LineString,
-    trimmed_transects_per_point_on_center_line: dict[int, TransectLinesAtPoint],
-):
-    first_transect_lines_with_point = trimmed_transects_per_point_on_center_line[transect.transect_number]
-    current_trimmed_line = first_transect_lines_with_point.left_line
-    if current_trimmed_line.length > trimmed_line.length:
-        trimmed_transects_per_point_on_center_line[transect.transect_number] = replace(
-            first_transect_lines_with_point, left_line=trimmed_line
-        )
-
-
-def update_transect_right_line_if_its_shorter(
-    transect: TransectLinesAtPoint,
-    trimmed_line: LineString,
-    trimmed_transects_per_point_on_center_line: dict[int, TransectLinesAtPoint],
-):
-    first_transect_lines_with_point = trimmed_transects_per_point_on_center_line[transect.transect_number]
-    current_trimmed_line = first_transect_lines_with_point.right_line
-    if current_trimmed_line.length > trimmed_line.length:
-        trimmed_transects_per_point_on_center_line[transect.transect_number] = replace(
-            first_transect_lines_with_point, right_line=trimmed_line
-        )
+import numpy as np
+from scipy.spatial import cKDTree
+
+from utils.angle_calculation import angles_between_points
+from water_surface_preparation.data_classes.points_per_line import TransectSet
+
+
+def calculate_transects(points_to_calculate_transects_on: gpd.GeoDataFrame, line_length: int) -> TransectSet:
+    # the direction at each point is the one towards the next point, the last point has no direction.
+    # the points are only read, so the result does not depend on whether it was computed or taken from a cache
+    x = points_to_calculate_transects_on.geometry.x.values
+    y = points_to_calculate_transects_on.geometry.y.values
+    theta_angle = np.append(angles_between_points(x[:-1], y[:-1], x[1:], y[1:]), np.nan) if len(x) > 0 else x
+    return TransectSet(
+        origin_x=x,
+        origin_y=y,
+        theta_angle=theta_angle,
+        right_lengths=np.full(len(x), float(line_length)),
+        left_lengths=np.full(len(x), float(line_length)),
+        elevations=points_to_calculate_transects_on["z_interpolated"].values.astype(float),
+        transect_numbers=np.arange(len(x)),
+    )
+
+
+def calculate_intersection_distances(
+    origins: np.ndarray, vectors: np.ndarray, first_indices: np.ndarray, second_indices: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    # distance from each origin to the crossing of the segments origin + s * vector of every pair, np.inf if they do
+    # not cross. parallel segments are treated as not crossing.
+    offsets = origins[second_indices] - origins[first_indices]
+    first_vectors, second_vectors = vectors[first_indices], vectors[second_indices]
+    denominators = first_vectors[:, 0] * second_vectors[:, 1] - first_vectors[:, 1] * second_vectors[:, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first_fractions = (offsets[:, 0] * second_vectors[:, 1] - offsets[:, 1] * second_vectors[:, 0]) / denominators
+        second_fractions = (offsets[:, 0] * first_vectors[:, 1] - offsets[:, 1] * first_vectors[:, 0]) / denominators
+    do_cross = (first_fractions >= 0) & (first_fractions <= 1) & (second_fractions >= 0) & (second_fractions <= 1)
+    first_distances = np.where(do_cross, first_fractions * np.hypot(*first_vectors.T), np.inf)
+    second_distances = np.where(do_cross, second_fractions * np.hypot(*second_vectors.T), np.inf)
+    return first_distances, second_distances
+
+
+def trim_one_side_of_transects(origins: np.ndarray, end_coordinates: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    # two segments can only cross if their midpoints are at most half of both lengths apart, so only those pairs
+    # are tested. every segment is cut back to its closest crossing with another one. the given lengths are kept.
+    lengths = lengths.copy()
+    is_defined = np.isfinite(end_coordinates).all(axis=1) & np.isfinite(origins).all(axis=1)
+    defined_indices = np.flatnonzero(is_defined)
+    if len(defined_indices) < 2:
+        return lengths
+    vectors = end_coordinates[defined_indices] - origins[defined_indices]
+    midpoints = origins[defined_indices] + vectors / 2
+    candidate_pairs = cKDTree(midpoints).query_pairs(r=np.hypot(*vectors.T).max(), output_type="ndarray")
+    if len(candidate_pairs) == 0:
+        return lengths
+    first_distances, second_distances = calculate_intersection_distances(
+        origins[defined_indices], vectors, candidate_pairs[:, 0], candidate_pairs[:, 1]
+    )
+    trimmed_lengths = lengths[defined_indices]
+    np.minimum.at(trimmed_lengths, candidate_pairs[:, 0], first_distances)
+    np.minimum.at(trimmed_lengths, candidate_pairs[:, 1], second_distances)
+    lengths[defined_indices] = trimmed_lengths
+    return lengths
+
+
+def trim_intersecting_parts_of_transects(transects: TransectSet) -> TransectSet:
+    # left sides are trimmed against left sides and right sides against right sides. the given transects are kept,
+    # the trimmed ones are returned as a new set
+    origins = np.column_stack([transects.origin_x, transects.origin_y])
+    return dataclasses.replace(
+        transects,
+        left_lengths=trim_one_side_of_transects(
+            origins, np.column_stack(transects.left_end_coordinates()), transects.left_lengths
+        ),
+        right_lengths=trim_one_side_of_transects(
+            origins, np.column_stack(transects.right_end_coordinates()), transects.right_lengths
+        ),
+    )
 
 
 def sample_points_for_along_all_transects(
-    transects_per_center_line: list[TransectLinesAtPoint], sampling_distance: float
+    transects_per_center_line: TransectSet, sampling_distance: float
 ) -> gpd.GeoDataFrame:
-    all_points = gpd.GeoDataFrame()
-    for transect in transects_per_center_line:
-        left_samples = sample_points_along_line(gpd.GeoDataFrame({"geometry": [transect.left_line]}), sampling_distance)
-        right_samples = sample_points_along_line(
-            gpd.GeoDataFrame({"geometry": [transect.right_line]}), sampling_distance
-        )
-        combined = left_samples.append(right_samples, ignore_index=True)
-        combined["z_interpolated"] = transect.elevation
-        all_points = all_points.append(combined)
-    return all_points
+    # for every transect the left and then the right side is sampled every sampling_distance from the origin on,
+    # plus the end of the side. sides of zero or undefined length have no samples.
+    number_of_transects = len(transects_per_center_line)
+    side_lengths = np.column_stack(
+        [transects_per_center_line.left_lengths, transects_per_center_line.right_lengths]
+    ).ravel()
+    side_bearings = np.radians(
+        np.column_stack([transects_per_center_line.theta_angle - 90, transects_per_center_line.theta_angle + 90])
+    ).ravel()
+    is_sampled = np.isfinite(side_lengths) & np.isfinite(side_bearings) & (side_lengths > 0)
+    number_of_samples_per_side = np.zeros(2 * number_of_transects, dtype=np.intp)
+    number_of_samples_per_side[is_sampled] = np.ceil(side_lengths[is_sampled] / sampling_distance).astype(np.intp) + 1
+
+    side_of_each_sample = np.repeat(np.arange(2 * number_of_transects), number_of_samples_per_side)
+    first_sample_of_each_side = np.cumsum(number_of_samples_per_side) - number_of_samples_per_side
+    sample_index_on_side = np.arange(len(side_of_each_sample)) - first_sample_of_each_side[side_of_each_sample]
+    chainages = np.minimum(sample_index_on_side * sampling_distance, side_lengths[side_of_each_sample])
+    transect_of_each_sample = side_of_each_sample // 2
+    x = transects_per_center_line.origin_x[transect_of_each_sample] + chainages * np.cos(
+        side_bearings[side_of_each_sample]
+    )
+    y = transects_per_center_line.origin_y[transect_of_each_sample] + chainages * np.sin(
+        side_bearings[side_of_each_sample]
+    )
+    return gpd.GeoDataFrame(
+        {
+            "transect": transects_per_center_line.transect_numbers[transect_of_each_sample],
+            "side": np.where(side_of_each_sample % 2 == 0, "left", "right"),
+            "chainage": chainages,
+            "z_interpolated": transects_per_center_line.elevations[transect_of_each_sample],
+        },
+        geometry=gpd.points_from_xy(x, y),
+    )